@@ -0,0 +1,195 @@
+# Aggregate the predictions of many fits one fit at a time
+#
+# Rather than concatenating the predictions of every (screened) fit into one
+# long data frame with a row for each (house, fit) pair and then computing
+# groupby("house")["pred"].mean() (or the quantiles for the prediction
+# intervals), the predictions of each fit are folded into a
+# PredictionAggregator as they are computed. The aggregator only keeps a few
+# arrays with one entry for each house:
+#   - the number of predictions, their mean and the sum of squared deviations
+#     from the mean (updated with Welford's/Chan et al.'s algorithm), and the
+#     minimum and maximum prediction
+#   - a histogram of the predictions with fixed bins (n_bins for each house),
+#     from which the quantiles are interpolated (to within one bin width, and
+#     never outside the observed range)
+# so that the memory used doesn't grow with the number of perturbation x
+# bootstrap fits. For binary (0/1) predictions, the majority vote is
+# mean >= 0.5.
+import numpy as np
+import pandas as pd
+
+
+class PredictionAggregator:
+
+  def __init__(self, n_houses=None, n_bins=1000, bin_edges=None, index=None):
+    # n_houses: the number of houses (taken from the first predictions if None)
+    # n_bins: the number of histogram bins used for the quantiles
+    # bin_edges: the (increasing) histogram bin edges. If None, n_bins equal
+    #   bins are used that span the range of the first predictions, extended by
+    #   that range on each side (predictions outside of the bins are counted in
+    #   the first or last bin)
+    # index: the index of the summary data frame (e.g., the house IDs)
+    self.n_houses = n_houses
+    self.bin_edges = None if bin_edges is None else np.asarray(bin_edges, dtype=float)
+    self.n_bins = n_bins if bin_edges is None else len(self.bin_edges) - 1
+    self.index = index
+    self.n_fits = 0
+    if n_houses is not None:
+      self._initialize(n_houses)
+
+
+  def _initialize(self, n_houses):
+    self.n_houses = n_houses
+    self.count = np.zeros(n_houses, dtype=np.int64)
+    self.mean = np.zeros(n_houses)
+    self.m2 = np.zeros(n_houses)
+    self.min = np.full(n_houses, np.inf)
+    self.max = np.full(n_houses, -np.inf)
+    self.bin_counts = np.zeros((n_houses, self.n_bins), dtype=np.int64)
+
+
+  # add the predictions of one fit (an array with one prediction for each
+  # house) or of several fits (an (n_fits x n_houses) array, e.g., the
+  # predictions of each bootstrap sample from bootstrap_perturbations()).
+  # Missing (NaN) predictions are ignored.
+  def update(self, preds):
+    preds = np.asarray(preds, dtype=float)
+    preds = preds.reshape(-1, preds.shape[-1])
+    if self.n_houses is None:
+      self._initialize(preds.shape[1])
+    if preds.shape[1] != self.n_houses:
+      raise ValueError("Expected predictions for %d houses, but got %d"
+                       % (self.n_houses, preds.shape[1]))
+    observed = ~np.isnan(preds)
+    if self.bin_edges is None:
+      if not observed.any():
+        return self
+      low, high = preds[observed].min(), preds[observed].max()
+      width = high - low if high > low else max(abs(low), 1)
+      self.bin_edges = np.linspace(low - width, high + width, self.n_bins + 1)
+
+    # the moments of this batch of fits, combined with the running moments
+    batch_count = observed.sum(axis=0)
+    batch_sum = np.where(observed, preds, 0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      batch_mean = np.where(batch_count > 0, batch_sum / batch_count, 0)
+    batch_m2 = (np.where(observed, preds - batch_mean, 0) ** 2).sum(axis=0)
+    self._combine(batch_count, batch_mean, batch_m2,
+                  np.where(observed, preds, np.inf).min(axis=0),
+                  np.where(observed, preds, -np.inf).max(axis=0))
+
+    # add the predictions to the histogram of each house
+    fit_ids, house_ids = np.nonzero(observed)
+    bins = np.clip(np.searchsorted(self.bin_edges, preds[fit_ids, house_ids], side="right") - 1,
+                   0, self.n_bins - 1)
+    np.add.at(self.bin_counts.reshape(-1), house_ids * self.n_bins + bins, 1)
+    self.n_fits += preds.shape[0]
+    return self
+
+
+  # combine the running moments with those of another set of predictions
+  def _combine(self, count, mean, m2, minimum, maximum):
+    total = self.count + count
+    with np.errstate(invalid="ignore", divide="ignore"):
+      delta = np.where(total > 0, mean - self.mean, 0)
+      self.m2 = self.m2 + m2 + np.where(total > 0, delta ** 2 * self.count * count / total, 0)
+      self.mean = np.where(total > 0, self.mean + delta * count / total, 0)
+    self.count = total
+    self.min = np.minimum(self.min, minimum)
+    self.max = np.maximum(self.max, maximum)
+
+
+  # add the predictions aggregated by another aggregator (e.g., one for each
+  # parallel worker). The histograms can only be added if both aggregators
+  # use the same bins, so aggregators that will be merged need to be created
+  # with the same explicit `bin_edges` (the default bins depend on the first
+  # predictions that each aggregator sees)
+  def merge(self, other):
+    if other.n_houses is None:
+      return self
+    if self.n_houses is None:
+      self._initialize(other.n_houses)
+    if other.n_houses != self.n_houses:
+      raise ValueError("Can only merge aggregators with the same number of houses (%d, not %d)"
+                       % (self.n_houses, other.n_houses))
+    if self.bin_edges is None and other.bin_edges is not None:
+      # (self hasn't seen any predictions yet, so it takes the bins of other)
+      if self.count.any():
+        raise ValueError("Can't merge into an aggregator that has predictions but no bins")
+      self.bin_edges = other.bin_edges
+      self.n_bins = other.n_bins
+      self.bin_counts = np.zeros((self.n_houses, self.n_bins), dtype=np.int64)
+    elif self.bin_edges is not None and other.bin_edges is not None \
+        and not np.array_equal(other.bin_edges, self.bin_edges):
+      raise ValueError("Can only merge aggregators with the same bins: create the aggregators "
+                       "with the same explicit bin_edges")
+    self._combine(other.count, other.mean, other.m2, other.min, other.max)
+    if other.bin_edges is not None:
+      # (other has no bins if it hasn't seen any predictions)
+      self.bin_counts += other.bin_counts
+    self.n_fits += other.n_fits
+    return self
+
+
+  # the approximate q-th quantile (0 <= q <= 1) of the predictions of each
+  # house, interpolated linearly between the two closest order statistics (as
+  # in pandas' quantile()), where the order statistics are approximated from the
+  # histogram
+  def quantile(self, q):
+    if self.n_houses is None:
+      raise ValueError("No predictions have been added")
+    cumulative_counts = np.cumsum(self.bin_counts, axis=1)
+    position = q * np.maximum(self.count - 1, 0)
+    lower = self._order_statistic(np.floor(position), cumulative_counts)
+    upper = self._order_statistic(np.ceil(position), cumulative_counts)
+    quantiles = lower + (position - np.floor(position)) * (upper - lower)
+    return np.where(self.count > 0, quantiles, np.nan)
+
+
+  # the approximate k-th smallest prediction (from 0) of each house, assuming
+  # that the predictions in each histogram bin are evenly spread across the bin
+  # (restricted to the observed range of the house)
+  def _order_statistic(self, k, cumulative_counts):
+    bins = np.minimum((cumulative_counts <= k[:, np.newaxis]).sum(axis=1), self.n_bins - 1)
+    houses = np.arange(self.n_houses)
+    bin_count = np.maximum(self.bin_counts[houses, bins], 1)
+    low = np.maximum(self.bin_edges[bins], self.min)
+    high = np.maximum(np.minimum(self.bin_edges[bins + 1], self.max), low)
+    rank_in_bin = k - (cumulative_counts[houses, bins] - bin_count)
+    values = low + (rank_in_bin + 0.5) / bin_count * (high - low)
+    # the smallest and largest predictions are known exactly
+    values = np.where(k <= 0, self.min, values)
+    return np.where(k >= self.count - 1, self.max, values)
+
+
+  # a data frame with a row for each house, containing the number of
+  # predictions, the ensemble (mean) prediction, the SD, minimum, median and
+  # maximum of the predictions, and the bounds of the central `coverage`
+  # interval of the predictions (lower, upper)
+  def summary(self, coverage=0.9):
+    if self.n_houses is None:
+      raise ValueError("No predictions have been added")
+    observed = self.count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+      sd = np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+    return pd.DataFrame({"count": self.count,
+                         "mean": np.where(observed, self.mean, np.nan),
+                         "sd": sd,
+                         "min": np.where(observed, self.min, np.nan),
+                         "lower": self.quantile((1 - coverage) / 2),
+                         "median": self.quantile(0.5),
+                         "upper": self.quantile((1 + coverage) / 2),
+                         "max": np.where(observed, self.max, np.nan)},
+                        index=self.index)
+
+
+
+# fold an iterable of predictions (each with one prediction for each house, or
+# an (n_fits x n_houses) array) into a PredictionAggregator, e.g.,
+#   aggregate_predictions(fit.predict(X) for fit, X in zip(fits, X_list))
+# the other arguments are passed to PredictionAggregator()
+def aggregate_predictions(preds_iter, **kwargs):
+  aggregator = PredictionAggregator(**kwargs)
+  for preds in preds_iter:
+    aggregator.update(preds)
+  return aggregator
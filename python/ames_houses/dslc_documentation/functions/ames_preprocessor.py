@@ -0,0 +1,186 @@
+# A fit/transform version of preprocess_ames_data()
+#
+# `fit()` runs preprocess_ames_data() once on the training data and compiles
+# the resulting columns into a plan: one recipe per output column describing
+# which raw columns it is built from. `transform()` then builds just those
+# columns straight from the raw (cleaned) data, without copying the full frame
+# or creating the intermediate columns that are later dropped. The recipes use
+# the recoding tables defined in preprocess_ames_data.py (e.g., numeric_mappings),
+# which the stages of preprocess_ames_data() use too.
+#
+# transform(df) gives exactly the same result as
+#   preprocess_ames_data(df, column_selection=..., neighborhood_levels=..., ...)
+# with the column selection and neighborhood levels learned from the training
+# data. Note that, just like preprocess_ames_data(), the lot frontage median and
+# the categorical modes are computed from the data being transformed.
+import pandas as pd
+import numpy as np
+
+from functions.preprocess_ames_data import preprocess_ames_data, build_column, fill_values, \
+  simplify_recipes, simplify_less_recipes, lump_mappings, dummy_vars, numeric_mappings, \
+  simplified_dummy_recipes
+
+
+# a faster equivalent of Series.replace(mapping) that maps all of the levels at
+# once and then infers the resulting dtype (as replace() does)
+def replace_values(values, mapping):
+  to_replace = values.isin(list(mapping.keys())).to_numpy()
+  if not to_replace.any():
+    return values
+  replaced = values.to_numpy(dtype=object, copy=True)
+  replaced[to_replace] = values[to_replace].map(mapping).to_numpy(dtype=object)
+  return pd.Series(replaced, index=values.index, name=values.name).infer_objects()
+
+
+
+class AmesPreprocessor:
+  """Fit preprocess_ames_data() on the training data, then transform new data.
+
+  The arguments are the same as for preprocess_ames_data(), except for
+  `column_selection` and `neighborhood_levels`, which are learned by `fit()`.
+  """
+
+  def __init__(self,
+               max_identical_thresh=0.8,
+               max_missing_thresh=0.5,
+               n_neighborhoods=10,
+               neighborhood_dummy=True,
+               impute_missing_categorical="other",
+               simplify_vars=True,
+               log_transform_predictors=None,
+               transform_response="none",
+               cor_feature_selection_threshold=None,
+               convert_categorical="numeric"):
+    self.options = dict(max_identical_thresh=max_identical_thresh,
+                        max_missing_thresh=max_missing_thresh,
+                        n_neighborhoods=n_neighborhoods,
+                        neighborhood_dummy=neighborhood_dummy,
+                        impute_missing_categorical=impute_missing_categorical,
+                        simplify_vars=simplify_vars,
+                        log_transform_predictors=log_transform_predictors,
+                        transform_response=transform_response,
+                        cor_feature_selection_threshold=cor_feature_selection_threshold,
+                        convert_categorical=convert_categorical)
+    self.column_selection = None
+    self.neighborhood_levels = None
+    self.plan = None
+
+
+  def fit(self, ames_data_clean):
+    self.fit_transform(ames_data_clean)
+    return self
+
+
+  def fit_transform(self, ames_data_clean):
+    # preprocess the training data exactly as preprocess_ames_data() does
+    ames_data_preprocessed = preprocess_ames_data(ames_data_clean, **self.options)
+
+    self.column_selection = list(ames_data_preprocessed.columns)
+    # extract the neighborhoods included in the training data
+    if self.options["neighborhood_dummy"]:
+      neighborhood_cols = ames_data_preprocessed.filter(regex="neighborhood").columns
+      self.neighborhood_levels = [x.replace("neighborhood_", "") for x in neighborhood_cols]
+    elif "neighborhood" in ames_data_preprocessed.columns:
+      neighborhoods = ames_data_preprocessed["neighborhood"].unique()
+      self.neighborhood_levels = [x for x in neighborhoods if x != "other"]
+    else:
+      self.neighborhood_levels = []
+
+    self.plan = [(column, self._compile_column(column))
+                 for column in self.column_selection
+                 if column not in ["date", "order", "ms_subclass"]]
+
+    return ames_data_preprocessed
+
+
+  def transform(self, ames_data_clean):
+    if self.plan is None:
+      raise ValueError("AmesPreprocessor has not been fit. Call fit() first.")
+
+    # each raw variable is imputed at most once and shared between recipes
+    base_columns = {}
+    def base(column):
+      if column not in base_columns:
+        base_columns[column] = self._impute_column(ames_data_clean, column)
+      return base_columns[column]
+
+    log_transform_predictors = self.options["log_transform_predictors"] or []
+    transform_response = self.options["transform_response"]
+
+    ames_data_preprocessed = {}
+    for column, recipe in self.plan:
+      values = self._run_recipe(recipe, base, ames_data_clean.index)
+      if column == "saleprice" and transform_response == "log":
+        values = np.log(values)
+      elif column == "saleprice" and transform_response == "sqrt":
+        values = np.sqrt(values)
+      if column in log_transform_predictors:
+        values = np.log(values)
+      ames_data_preprocessed[column] = values
+
+    return pd.DataFrame(ames_data_preprocessed, index=ames_data_clean.index)
+
+
+  #----------------------------- Helpers -------------------------------------#
+
+  def _compile_column(self, column):
+    # identify how a single output column is built from the raw variables
+    convert_categorical = self.options["convert_categorical"]
+    simplify = simplify_recipes if self.options["simplify_vars"] else simplify_less_recipes
+
+    if column in simplify:
+      return simplify[column]
+    if column == "neighborhood":
+      return ("neighborhood",)
+    if self.options["neighborhood_dummy"] and column.startswith("neighborhood_"):
+      return ("neighborhood_dummy", column.replace("neighborhood_", "", 1))
+
+    if convert_categorical == "numeric" and column in numeric_mappings:
+      source, mapping = numeric_mappings[column]
+      return ("replace", source, mapping)
+    if convert_categorical == "simplified_dummy" and column in simplified_dummy_recipes:
+      return simplified_dummy_recipes[column]
+    if convert_categorical in ["dummy", "none"] and column in lump_mappings:
+      return ("replace", column, lump_mappings[column])
+    if convert_categorical == "dummy":
+      # match the longest prefix since some variable names are nested
+      for source in sorted(dummy_vars, key=len, reverse=True):
+        if column.startswith(source + "_"):
+          return ("dummy", source, lump_mappings.get(source), column[len(source) + 1:])
+
+    return ("column", column)
+
+
+  def _impute_column(self, ames_data_clean, column):
+    values = ames_data_clean[column]
+    if not values.hasnans:
+      return values
+    if column in fill_values:
+      fill_value = fill_values[column]
+      if fill_value == "median":
+        fill_value = values.median()
+      return values.fillna(fill_value)
+    if values.dtype == object:
+      if self.options["impute_missing_categorical"] == "other":
+        return values.fillna("other")
+      mode = values.mode()
+      return values.fillna(mode.iloc[0]) if len(mode) > 0 else values
+    return values
+
+
+  def _run_recipe(self, recipe, base, index):
+    kind = recipe[0]
+    if kind == "column":
+      return base(recipe[1])
+    if kind == "replace":
+      return replace_values(base(recipe[1]), recipe[2])
+    if kind == "neighborhood":
+      neighborhood = base("neighborhood")
+      return neighborhood.where(neighborhood.isin(self.neighborhood_levels), "other")
+    if kind == "neighborhood_dummy":
+      return base("neighborhood") == recipe[1]
+    if kind == "dummy":
+      _, source, mapping, level = recipe
+      values = base(source) if mapping is None else replace_values(base(source), mapping)
+      return values == level
+    return build_column(recipe, base, index)
@@ -0,0 +1,108 @@
+# Fit models to bootstrap samples of each of a list of (perturbed) datasets in
+# parallel
+#
+# Rather than creating a resampled copy of each data frame with
+# df.sample(replace=True) and keeping every fitted model:
+#   - each dataset is converted to NumPy arrays and written to a temporary folder
+#     once, and is then loaded by the workers as a memory map (as in
+#     fit_perturbations.py)
+#   - each bootstrap sample is an array of row indices, which is generated from
+#     (seed, dataset, bootstrap sample) so that the samples are reproducible,
+#     don't depend on how the work is split up, and are the same for every model
+#   - only the predictions for the new data (e.g., the validation set) of each
+#     fit are kept (or its coefficients, if there is no new data), so the memory
+#     used by the results doesn't grow with the size of the fits
+#   - each (dataset, model, batch of bootstrap samples) is a separate task
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+
+
+# the row indices of bootstrap sample `boot_id` of dataset `data_id`
+def bootstrap_indices(n_obs, seed, data_id, boot_id):
+  rng = np.random.default_rng([seed, data_id, boot_id])
+  return rng.integers(0, n_obs, size=n_obs)
+
+
+
+# the coefficients (with the intercept first) of a linear model fit, or the
+# feature importances of a tree-based fit
+def fit_coefs(fit):
+  if hasattr(fit, "coef_"):
+    return np.append(fit.intercept_, fit.coef_)
+  return fit.feature_importances_
+
+
+
+# fit a model to several bootstrap samples of a dataset (in a worker)
+def bootstrap_task(data_path, data_id, model_name, model, batch_id, boot_ids, seed,
+                   inner_n_jobs):
+  X, y, X_new = joblib.load(data_path, mmap_mode="r")
+  results = []
+  with parallel_config(n_jobs=inner_n_jobs):
+    for boot_id in boot_ids:
+      ids = bootstrap_indices(len(y), seed, data_id, boot_id)
+      fit = clone(model).fit(X[ids], y[ids])
+      results.append(fit.predict(X_new) if X_new is not None else fit_coefs(fit))
+  return data_id, model_name, batch_id, np.stack(results)
+
+
+
+# fit each model to `n_boot` bootstrap samples of each dataset, returning a dict
+# with a list for each model that contains a (n_boot x n_new) array of the
+# predictions (or a (n_boot x n_coefs) array of the coefficients) for each
+# dataset (in the same order as data_list)
+#   data_list: a list of data frames
+#   models: a dict of (unfitted) sklearn estimators, e.g.,
+#     {"ls": LinearRegression(), "lad": LADRegression()}
+#   response: the name of the response column
+#   new_data_list: a list of data frames (one for each dataset in data_list,
+#     e.g., the perturbed validation sets) to compute the predictions for. If
+#     None, the coefficients of each fit (see fit_coefs()) are returned instead
+#   n_boot: the number of bootstrap samples of each dataset
+#   seed: the random seed for the bootstrap samples
+#   n_jobs, inner_n_jobs, temp_folder: see fit_perturbations_iter()
+#   batch_size: the number of bootstrap samples fit in each task
+def bootstrap_perturbations(data_list, models, response, new_data_list=None, n_boot=100,
+                            seed=0, n_jobs=-1, inner_n_jobs=1, batch_size=10,
+                            temp_folder=None):
+  if n_jobs < 0:
+    n_jobs = joblib.cpu_count() + 1 + n_jobs
+  outer_n_jobs = max(1, n_jobs // inner_n_jobs)
+
+  data_folder = tempfile.mkdtemp(prefix="bootstrap_perturbations_", dir=temp_folder)
+  try:
+    # write the arrays for each dataset once
+    data_paths = []
+    for data_id, data in enumerate(data_list):
+      X = data.drop(columns=response).to_numpy(dtype=float)
+      y = data[response].to_numpy(dtype=float)
+      X_new = None
+      if new_data_list is not None:
+        X_new = new_data_list[data_id].drop(columns=response, errors="ignore") \
+          .to_numpy(dtype=float)
+      data_paths.append(os.path.join(data_folder, "data_%d.joblib" % data_id))
+      joblib.dump((X, y, X_new), data_paths[-1])
+
+    batches = [range(start, min(start + batch_size, n_boot))
+               for start in range(0, n_boot, batch_size)]
+    batch_results = {model_name: [[None] * len(batches) for _ in data_list]
+                     for model_name in models}
+    with parallel_config(backend="loky", inner_max_num_threads=inner_n_jobs):
+      fits = Parallel(n_jobs=outer_n_jobs, return_as="generator_unordered")(
+        delayed(bootstrap_task)(data_paths[data_id], data_id, model_name, model,
+                                batch_id, list(boot_ids), seed, inner_n_jobs)
+        for data_id in range(len(data_list))
+        for model_name, model in models.items()
+        for batch_id, boot_ids in enumerate(batches))
+      for data_id, model_name, batch_id, results in fits:
+        batch_results[model_name][data_id][batch_id] = results
+  finally:
+    shutil.rmtree(data_folder, ignore_errors=True)
+  return {model_name: [np.concatenate(data_results) for data_results in model_results]
+          for model_name, model_results in batch_results.items()}
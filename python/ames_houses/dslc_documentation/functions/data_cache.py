@@ -0,0 +1,309 @@
+# A columnar on-disk cache for cleaned and preprocessed data frames
+#
+# DataCache.cached(fun, *args, files=[...], **kwargs) returns fun(*args, **kwargs),
+# computing it only if it isn't already in the cache. Each entry is keyed by a
+# hash of the function name, the source file that defines it, the arguments
+# (data frame arguments are hashed by their contents) and the contents of the
+# `files` (e.g., the data file that is loaded and the source files of the
+# cleaning/preprocessing functions that it calls), so that an entry is
+# automatically recomputed when any of these change.
+#
+# The cached value can be a data frame or a list of data frames. Each column is
+# stored as a NumPy .npy file (string and categorical columns are stored as
+# integer codes and their unique values or categories). Numeric columns are
+# memory-mapped (copy-on-write) when loaded, and the loaded data frames use the
+# memory-mapped arrays without copying them into memory. Column files are
+# named by a hash of their contents, so that a column that appears in several
+# data frames (e.g., in the perturbed versions of the same dataset) is only
+# stored once. When the total size of the column files exceeds `max_size`
+# bytes, the least recently used entries are removed.
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# hash the contents of a file
+def hash_file(path):
+  file_hash = hashlib.sha1()
+  with open(path, "rb") as f:
+    for block in iter(lambda: f.read(1 << 20), b""):
+      file_hash.update(block)
+  return file_hash.hexdigest()
+
+
+# load a .npy file, memory-mapping it if possible (arrays of Python objects,
+# e.g., the unique values of a column with mixed types, can't be memory-mapped).
+# The mapping is copy-on-write, so changes to the loaded array aren't written
+# back to the file
+def load_array(path, mmap):
+  if mmap:
+    with open(path, "rb") as f:
+      version = np.lib.format.read_magic(f)
+      read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) \
+        else np.lib.format.read_array_header_2_0
+      dtype = read_header(f)[2]
+    mmap = not dtype.hasobject
+  return np.load(path, mmap_mode="c" if mmap else None, allow_pickle=True)
+
+
+
+# encode a column as a list of numpy arrays that can be saved to .npy files,
+# along with a description of how to decode it
+def encode_column(values):
+  dtype = values.dtype
+  if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+    return [values.to_numpy()], {"encoding": "values", "dtype": str(dtype)}
+  # store categorical columns as codes into their categories (including unused
+  # categories), along with whether the categories are ordered
+  if isinstance(dtype, pd.CategoricalDtype):
+    categories = dtype.categories.to_numpy()
+    if categories.dtype == object and all(isinstance(value, str) for value in categories):
+      categories = categories.astype(str)
+    return [values.cat.codes.to_numpy().astype(np.int32), categories], \
+      {"encoding": "categories", "dtype": str(dtype), "ordered": bool(dtype.ordered)}
+  # store all other columns as codes into their unique values (missing values
+  # have code -1)
+  codes, uniques = pd.factorize(values)
+  uniques = np.asarray(uniques, dtype=object)
+  if all(isinstance(value, str) for value in uniques):
+    uniques = uniques.astype(str)
+  return [codes.astype(np.int32), uniques], {"encoding": "codes", "dtype": str(dtype)}
+
+
+# decode a column encoded by encode_column()
+def decode_column(arrays, column_info):
+  if column_info["encoding"] == "values":
+    return arrays[0]
+  if column_info["encoding"] == "categories":
+    codes, categories = arrays
+    return pd.Categorical.from_codes(
+      codes, dtype=pd.CategoricalDtype(categories, ordered=column_info["ordered"]))
+  # (the unique values are empty if all of the values are missing)
+  codes, uniques = arrays
+  values = np.full(len(codes), np.nan, dtype=object)
+  present = codes != -1
+  values[present] = np.asarray(uniques, dtype=object)[codes[present]]
+  if column_info["dtype"] != "object":
+    values = pd.Series(values).astype(column_info["dtype"]).array
+  return values
+
+
+
+class DataCache:
+
+  def __init__(self, cache_dir, max_size=2e9, mmap=True):
+    # cache_dir: the directory in which the cache is stored (created if needed)
+    # max_size: the maximum total size of the cached columns in bytes
+    # mmap: whether to memory-map the cached columns when loading them
+    self.cache_dir = cache_dir
+    self.max_size = max_size
+    self.mmap = mmap
+    self.entry_dir = os.path.join(cache_dir, "entries")
+    self.column_dir = os.path.join(cache_dir, "columns")
+    os.makedirs(self.entry_dir, exist_ok=True)
+    os.makedirs(self.column_dir, exist_ok=True)
+
+
+  # return fun(*args, **kwargs), loading it from the cache if possible
+  def cached(self, fun, *args, files=(), **kwargs):
+    key = self.key(fun, args, kwargs, files)
+    data = self.load(key)
+    if data is None:
+      data = fun(*args, **kwargs)
+      self.save(key, data)
+    return data
+
+
+  # the key of an entry: a hash of the function, the source file it is defined
+  # in, its arguments and the files
+  def key(self, fun, args, kwargs, files):
+    key_hash = hashlib.sha1()
+    key_hash.update(("%s.%s" % (fun.__module__, fun.__qualname__)).encode())
+    try:
+      source_file = inspect.getsourcefile(fun)
+    except TypeError:
+      # (built-in functions)
+      source_file = None
+    if source_file is not None and os.path.exists(source_file):
+      key_hash.update(hash_file(source_file).encode())
+    key_hash.update(self.hash_argument(list(args)).encode())
+    key_hash.update(self.hash_argument(kwargs).encode())
+    for path in files:
+      key_hash.update(hash_file(path).encode())
+    return key_hash.hexdigest()
+
+
+  def hash_argument(self, arg):
+    if isinstance(arg, pd.DataFrame):
+      return self.hash_data(arg)
+    if isinstance(arg, pd.Series):
+      return self.hash_data(arg.to_frame())
+    if isinstance(arg, (list, tuple)):
+      return repr([self.hash_argument(x) for x in arg])
+    if isinstance(arg, dict):
+      return repr(sorted((repr(k), self.hash_argument(v)) for k, v in arg.items()))
+    if isinstance(arg, np.ndarray) and arg.dtype != object:
+      return hashlib.sha1(str(arg.dtype).encode() + arg.tobytes()).hexdigest()
+    if isinstance(arg, np.ndarray):
+      return repr(arg.tolist())
+    return repr(arg)
+
+
+  # hash a data frame from the hashes of its encoded columns and index
+  def hash_data(self, data):
+    data_hash = hashlib.sha1()
+    data_hash.update(repr(list(data.columns)).encode())
+    data_hash.update(self.hash_column(data.index.to_series())[0].encode())
+    for col in range(data.shape[1]):
+      data_hash.update(self.hash_column(data.iloc[:, col])[0].encode())
+    return data_hash.hexdigest()
+
+
+  # encode a column and hash its encoded contents
+  def hash_column(self, values):
+    arrays, column_info = encode_column(values)
+    column_hash = hashlib.sha1(json.dumps(column_info).encode())
+    for array in arrays:
+      column_hash.update(str(array.dtype).encode())
+      column_hash.update(array.tobytes())
+    return column_hash.hexdigest(), arrays, column_info
+
+
+  def entry_path(self, key):
+    return os.path.join(self.entry_dir, key + ".json")
+
+
+  def column_path(self, column_hash, i):
+    return os.path.join(self.column_dir, "%s_%d.npy" % (column_hash, i))
+
+
+  # load an entry, returning None if it isn't in the cache
+  def load(self, key):
+    try:
+      with open(self.entry_path(key)) as f:
+        entry = json.load(f)
+      # columns that are shared by several data frames are only loaded once
+      loaded_columns = {}
+      data_list = [self.load_data(data_info, loaded_columns) for data_info in entry["data"]]
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+      # (a missing, partially written or unreadable entry, which is recomputed)
+      return None
+    # record the time that the entry was used (for evicting the least
+    # recently used entries)
+    os.utime(self.entry_path(key))
+    if entry["is_list"]:
+      return data_list
+    return data_list[0]
+
+
+  def load_data(self, data_info, loaded_columns):
+    columns = {}
+    for i, column_info in enumerate(data_info["columns"]):
+      columns[i] = self.load_column(column_info, loaded_columns)
+    if "range" in data_info:
+      index = pd.RangeIndex(*data_info["range"])
+    else:
+      index = self.load_column(data_info["index"], loaded_columns)
+    # (copy=False keeps the memory-mapped columns memory-mapped)
+    data = pd.DataFrame(columns, index=index, copy=False)
+    data.columns = pd.Index(data_info["column_names"], dtype=data_info["column_names_dtype"])
+    data.index.name = data_info["index_name"]
+    return data
+
+
+  def load_column(self, column_info, loaded_columns):
+    if column_info["hash"] not in loaded_columns:
+      arrays = [load_array(self.column_path(column_info["hash"], i), self.mmap)
+                for i in range(column_info["n_arrays"])]
+      loaded_columns[column_info["hash"]] = decode_column(arrays, column_info)
+    return loaded_columns[column_info["hash"]]
+
+
+  # save an entry, and then remove the least recently used entries if the cache
+  # is too large
+  def save(self, key, data):
+    is_list = isinstance(data, list)
+    data_list = data if is_list else [data]
+    entry = {"is_list": is_list,
+             "data": [self.save_data(data) for data in data_list]}
+    tmp_path = self.entry_path(key) + ".tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(entry, f)
+    os.replace(tmp_path, self.entry_path(key))
+    self.evict(keep=key)
+
+
+  def save_data(self, data):
+    data_info = {"column_names": data.columns.tolist(),
+                 "column_names_dtype": str(data.columns.dtype),
+                 "columns": [self.save_column(data.iloc[:, col]) for col in range(data.shape[1])],
+                 "index_name": data.index.name}
+    if isinstance(data.index, pd.RangeIndex):
+      data_info["range"] = [data.index.start, data.index.stop, data.index.step]
+    else:
+      data_info["index"] = self.save_column(data.index.to_series())
+    return data_info
+
+
+  def save_column(self, values):
+    column_hash, arrays, column_info = self.hash_column(values)
+    for i, array in enumerate(arrays):
+      path = self.column_path(column_hash, i)
+      # identical columns are only written once
+      if not os.path.exists(path):
+        np.save(path + ".tmp.npy", array, allow_pickle=array.dtype == object)
+        os.replace(path + ".tmp.npy", path)
+    return {**column_info, "hash": column_hash, "n_arrays": len(arrays)}
+
+
+  # remove the least recently used entries (other than `keep`) until the
+  # columns fit in max_size bytes
+  def evict(self, keep=None):
+    entries = []
+    for file in os.listdir(self.entry_dir):
+      if file.endswith(".json"):
+        path = os.path.join(self.entry_dir, file)
+        entries.append((os.path.getmtime(path), file[:-len(".json")]))
+    entries.sort()
+
+    while self.size() > self.max_size:
+      keys = [key for _, key in entries if key != keep]
+      if len(keys) == 0:
+        break
+      os.remove(self.entry_path(keys[0]))
+      entries = [(t, key) for t, key in entries if key != keys[0]]
+      self.remove_unused_columns()
+
+
+  # remove the column files that aren't used by any entry
+  def remove_unused_columns(self):
+    used_files = set()
+    for file in os.listdir(self.entry_dir):
+      if file.endswith(".json"):
+        with open(os.path.join(self.entry_dir, file)) as f:
+          entry = json.load(f)
+        for data_info in entry["data"]:
+          for column_info in data_info["columns"] + [data_info.get("index")]:
+            if column_info is None:
+              continue
+            used_files.update(os.path.basename(self.column_path(column_info["hash"], i))
+                              for i in range(column_info["n_arrays"]))
+    for file in os.listdir(self.column_dir):
+      if file not in used_files:
+        os.remove(os.path.join(self.column_dir, file))
+
+
+  # the total size of the column files in bytes
+  def size(self):
+    return sum(entry.stat().st_size for entry in os.scandir(self.column_dir))
+
+
+  # remove all entries from the cache
+  def clear(self):
+    for file in os.listdir(self.entry_dir):
+      os.remove(os.path.join(self.entry_dir, file))
+    self.remove_unused_columns()
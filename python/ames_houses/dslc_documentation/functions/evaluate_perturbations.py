@@ -0,0 +1,90 @@
+# Evaluate the predictions of many models fit to many perturbed datasets at once
+#
+# Rather than computing each metric with one list comprehension per model, the
+# predictions for a split are stacked into a single (n_models x n_perturbations
+# x n_houses) array, the response transformations are undone for all of the
+# perturbations with the same transformation at once, and each metric is
+# computed for every (model, perturbation) pair with a single NumPy reduction
+# over the last axis.
+import numpy as np
+import pandas as pd
+
+
+# stack a dict of predictions, e.g., {"ls": ls_pred, "rf": rf_pred}, where each
+# value is a list with the predictions for each perturbation, into a single
+# (n_models x n_perturbations x n_houses) array
+def stack_predictions(pred_dict):
+  n_obs = {len(pred) for preds in pred_dict.values() for pred in preds}
+  if len(n_obs) > 1:
+    raise ValueError("the predictions must all be for the same houses, "
+                     "but have lengths %s" % sorted(n_obs))
+  return np.stack([np.stack([np.asarray(pred, dtype=float) for pred in preds])
+                   for preds in pred_dict.values()])
+
+
+
+# undo the response transformation of each perturbation
+#   preds: a (... x n_perturbations x n_houses) array of predictions
+#   transform_response: the transform_response option ('none', 'log' or 'sqrt')
+#     of each perturbation (e.g., perturb_options['transform_response'])
+def inverse_transform_response(preds, transform_response):
+  transform_response = np.asarray(transform_response)
+  preds = np.array(preds, dtype=float)
+  log_ids = np.flatnonzero(transform_response == 'log')
+  sqrt_ids = np.flatnonzero(transform_response == 'sqrt')
+  preds[..., log_ids, :] = np.exp(preds[..., log_ids, :])
+  preds[..., sqrt_ids, :] = preds[..., sqrt_ids, :] ** 2
+  return preds
+
+
+
+# compute the rmse, mae and correlation of every set of predictions
+#   y: the observed responses (an array of length n_houses, or any array that
+#     can be broadcast against preds)
+#   preds: a (... x n_houses) array of predictions
+# returns a dict of (...) arrays, one for each metric
+def regression_metrics(y, preds):
+  y = np.asarray(y, dtype=float)
+  preds = np.asarray(preds, dtype=float)
+  residuals = y - preds
+  y_centered = y - y.mean(axis=-1, keepdims=True)
+  preds_centered = preds - preds.mean(axis=-1, keepdims=True)
+  corr = np.sum(y_centered * preds_centered, axis=-1) / \
+    np.sqrt(np.sum(y_centered ** 2, axis=-1) * np.sum(preds_centered ** 2, axis=-1))
+  return {'rmse': np.sqrt(np.mean(residuals ** 2, axis=-1)),
+          'mae': np.mean(np.abs(residuals), axis=-1),
+          'corr': corr}
+
+
+
+# create a tidy data frame with a row for each (model, perturbation) pair,
+# containing the perturbation options, the model name and each metric (in the
+# same order as melting a data frame with a column for each model)
+#   metrics: a dict of (n_models x n_perturbations) arrays
+def metrics_frame(metrics, model_names, perturb_options):
+  n_models = len(model_names)
+  n_perturbations = perturb_options.shape[0]
+  results = perturb_options.iloc[np.tile(np.arange(n_perturbations), n_models)] \
+    .reset_index(drop=True)
+  results['model'] = np.repeat(list(model_names), n_perturbations)
+  for metric, values in metrics.items():
+    results[metric] = np.asarray(values).ravel()
+  return results
+
+
+
+# evaluate the predictions of each model for each perturbation
+#   pred_dict: a dict of lists of predictions, e.g., {"ls": ls_pred, "rf": rf_pred},
+#     where ls_pred[i] are the predictions of the LS fit to the ith perturbation
+#   y: the observed (untransformed) responses
+#   perturb_options: the perturbation options (one row per perturbation)
+#   transform_response: whether to undo the response transformation of each
+#     perturbation (from perturb_options['transform_response']) first
+# returns a tidy data frame with the perturbation options, the model, and the
+# rmse, mae and corr of each fit
+def evaluate_perturbations(pred_dict, y, perturb_options, transform_response=True):
+  preds = stack_predictions(pred_dict)
+  if transform_response:
+    preds = inverse_transform_response(preds, perturb_options['transform_response'])
+  metrics = regression_metrics(y, preds)
+  return metrics_frame(metrics, pred_dict.keys(), perturb_options)
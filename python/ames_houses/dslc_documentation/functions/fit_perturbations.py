@@ -0,0 +1,92 @@
+# Fit several models to each of a list of (perturbed) datasets in parallel
+#
+# Rather than fitting every model to a dataset in a single task, each
+# (dataset, model) pair is a separate task, so that the work can be spread
+# evenly across many cores:
+#   - each dataset is written to a temporary folder once, and is then loaded by
+#     the workers as a memory map (so the workers share a single copy of the
+#     data, rather than each task receiving its own pickled copy)
+#   - the tasks are dispatched from the most to the least expensive (estimated
+#     from the relative cost of each model and the size of the dataset), so that
+#     an expensive fit doesn't end up running alone at the end
+#   - each task can use `inner_n_jobs` cores (e.g., for fitting a random forest
+#     with n_jobs=None, or for BLAS), and the number of tasks that run at the
+#     same time is reduced accordingly, so that the nested parallelism doesn't
+#     oversubscribe the cores
+#   - the fits are returned as soon as they finish
+import os
+import shutil
+import tempfile
+
+import joblib
+from joblib import Parallel, delayed, parallel_config
+
+
+# load a dataset and fit a model to it (in a worker)
+def fit_task(data_path, data_id, model_name, model_fun, inner_n_jobs):
+  data = joblib.load(data_path, mmap_mode="r")
+  # estimators whose n_jobs is None (e.g., RandomForestRegressor()) use
+  # inner_n_jobs cores
+  with parallel_config(n_jobs=inner_n_jobs):
+    return data_id, model_name, model_fun(data)
+
+
+
+# fit each model to each dataset, yielding (data_id, model_name, fit) tuples
+# in the order in which the fits finish, where data_id is the position of the
+# dataset in data_list
+#   data_list: a list of data frames
+#   model_funs: a dict of functions that each take a data frame and return a
+#     fitted model, e.g., {"ls": fit_ls, "rf": fit_rf}
+#   n_jobs: the total number of cores to use (-1 for all of the cores)
+#   inner_n_jobs: the number of cores used by each task
+#   model_costs: a dict of the approximate relative cost of fitting each model
+#     (e.g., {"ls": 1, "rf": 100}), which is multiplied by the size of each
+#     dataset to estimate the cost of each task (models that are not included
+#     have a cost of 1)
+def fit_perturbations_iter(data_list, model_funs, n_jobs=-1, inner_n_jobs=1,
+                           model_costs=None, temp_folder=None):
+  if model_costs is None:
+    model_costs = {}
+  if n_jobs < 0:
+    n_jobs = joblib.cpu_count() + 1 + n_jobs
+  outer_n_jobs = max(1, n_jobs // inner_n_jobs)
+
+  data_folder = tempfile.mkdtemp(prefix="fit_perturbations_", dir=temp_folder)
+  try:
+    # write each dataset once
+    data_paths = []
+    for data_id, data in enumerate(data_list):
+      data_paths.append(os.path.join(data_folder, "data_%d.joblib" % data_id))
+      joblib.dump(data, data_paths[-1])
+
+    tasks = [(model_costs.get(model_name, 1) * data.size, data_id, model_name)
+             for data_id, data in enumerate(data_list)
+             for model_name in model_funs]
+    tasks.sort(key=lambda task: -task[0])
+
+    # limit the number of threads used by BLAS/OpenMP in each worker
+    with parallel_config(backend="loky", inner_max_num_threads=inner_n_jobs):
+      fits = Parallel(n_jobs=outer_n_jobs, return_as="generator_unordered")(
+        delayed(fit_task)(data_paths[data_id], data_id, model_name,
+                          model_funs[model_name], inner_n_jobs)
+        for _, data_id, model_name in tasks)
+      yield from fits
+  finally:
+    shutil.rmtree(data_folder, ignore_errors=True)
+
+
+
+# fit each model to each dataset, returning a dict with a list of the fits for
+# each model (in the same order as data_list). The arguments are the same as
+# for fit_perturbations_iter().
+def fit_perturbations(data_list, model_funs, n_jobs=-1, inner_n_jobs=1,
+                      model_costs=None, temp_folder=None):
+  fits = {model_name: [None] * len(data_list) for model_name in model_funs}
+  for data_id, model_name, fit in fit_perturbations_iter(data_list, model_funs,
+                                                         n_jobs=n_jobs,
+                                                         inner_n_jobs=inner_n_jobs,
+                                                         model_costs=model_costs,
+                                                         temp_folder=temp_folder):
+    fits[model_name][data_id] = fit
+  return fits
@@ -0,0 +1,137 @@
+# Judgment call perturbations of preprocess_ames_data() with shared stages
+#
+# preprocess_ames_data() is a sequence of stages, and each stage only depends on
+# a few of the judgment call options. When computing a grid of perturbations,
+# perturb_ames_data() treats the stages as a tree: each distinct prefix of
+# stage options is computed once and its output is cached, so that a stage is
+# only re-run when an option that it depends on actually changes.
+#
+# The i-th data frame returned is identical to calling preprocess_ames_data()
+# with the options in the i-th row of `perturb_options`. Note that perturbations
+# that share all of their stages share the same data frame object, so the
+# returned data frames should not be modified in place.
+import inspect
+
+from functions.preprocess_ames_data import preprocess_ames_data, \
+  remove_missing_columns, impute_missing_values, lump_neighborhoods, \
+  simplify_variables, convert_categorical_variables, remove_identical_columns, \
+  transform_variables, select_correlated_columns, tidy_columns, column_statistics
+
+
+# the default values of the preprocess_ames_data() arguments
+default_options = {name: parameter.default for name, parameter
+                   in inspect.signature(preprocess_ames_data).parameters.items()
+                   if parameter.default is not inspect.Parameter.empty}
+
+
+def perturb_ames_data(ames_data_clean,
+                      perturb_options,
+                      train_perturbations=None,
+                      stage_cache=None):
+  # perturb_options: a data frame (or list of dicts) with one row per
+  #   perturbation, whose columns are preprocess_ames_data() arguments. Any
+  #   argument that is not provided takes its default value.
+  # train_perturbations: when preprocessing the validation or test data, the
+  #   list of perturbed training datasets (one per row of perturb_options).
+  #   The columns and neighborhoods of each perturbed validation/test dataset
+  #   will match the corresponding training dataset.
+  # stage_cache: an optional dict that is used to store the output of each
+  #   distinct stage (e.g., to inspect how many stages were actually computed).
+
+  if hasattr(perturb_options, "to_dict"):
+    perturb_options = perturb_options.to_dict("records")
+  if train_perturbations is not None and len(train_perturbations) != len(perturb_options):
+    raise ValueError("train_perturbations must contain one data frame per row of perturb_options")
+  if stage_cache is None:
+    stage_cache = {}
+
+  # run a stage if it hasn't already been run for the same prefix of options
+  def run_stage(key, stage, ames_data, *args):
+    if key not in stage_cache:
+      stage_cache[key] = stage(ames_data, *args)
+    return stage_cache[key]
+
+  # run a stage that removes columns: different thresholds that keep the same
+  # columns yield the same data, so the following stages are keyed by the
+  # columns that were kept rather than by the threshold. Since the other stages
+  # compute each remaining column in the same way regardless of which other 
+  # columns were removed, the columns kept by an earlier filter stage are 
+  # also dropped from the key (e.g., two perturbations whose identical-value
+  # filters differ but whose correlation filters keep the same columns will
+  # share the same data frame)
+  #
+  # The column statistics that a filter stage thresholds (see
+  # column_statistics()) are computed once for each distinct input data frame,
+  # so that a different threshold only re-filters the columns.
+  column_stats_cache = {}
+  def run_filter_stage(key, stage, ames_data, *args):
+    if key not in stage_cache:
+      if key[:-1] not in column_stats_cache:
+        column_stats_cache[key[:-1]] = column_statistics(ames_data)
+      stage_cache[key] = stage(ames_data, *args, column_stats=column_stats_cache[key[:-1]])
+    ames_data_filtered = stage_cache[key]
+    key = tuple(stage_key for stage_key in key[:-1] if stage_key[0] != "columns") + \
+      (("columns", tuple(ames_data_filtered.columns)),)
+    return key, stage_cache.setdefault(key, ames_data_filtered)
+
+  ames_jc_perturb = []
+  for i, options in enumerate(perturb_options):
+    options = {**default_options, **options}
+    log_transform_predictors = options["log_transform_predictors"]
+    if log_transform_predictors is not None:
+      log_transform_predictors = list(log_transform_predictors)
+
+    if train_perturbations is None:
+      column_selection = []
+      neighborhood_levels = []
+    else:
+      # extract the columns and neighborhoods from the relevant training data
+      column_selection = list(train_perturbations[i].columns)
+      train_neighborhood_cols = train_perturbations[i].filter(regex="neighborhood").columns
+      neighborhood_levels = [x.replace("neighborhood_", "") for x in train_neighborhood_cols]
+
+    key = ()
+    ames_data = ames_data_clean
+
+    if len(column_selection) == 0:
+      key += (("missing", options["max_missing_thresh"]),)
+      key, ames_data = run_filter_stage(key, remove_missing_columns, ames_data,
+                                        options["max_missing_thresh"])
+
+    key += (("impute", options["impute_missing_categorical"]),)
+    ames_data = run_stage(key, impute_missing_values, ames_data,
+                          options["impute_missing_categorical"])
+
+    key += (("neighborhood", tuple(neighborhood_levels), options["n_neighborhoods"]),)
+    ames_data = run_stage(key, lump_neighborhoods, ames_data,
+                          neighborhood_levels, options["n_neighborhoods"])
+
+    key += (("simplify", options["simplify_vars"]),)
+    ames_data = run_stage(key, simplify_variables, ames_data, options["simplify_vars"])
+
+    key += (("categorical", options["convert_categorical"]),)
+    ames_data = run_stage(key, convert_categorical_variables, ames_data,
+                          options["convert_categorical"])
+
+    if len(column_selection) == 0:
+      key += (("identical", options["max_identical_thresh"]),)
+      key, ames_data = run_filter_stage(key, remove_identical_columns, ames_data,
+                                        options["max_identical_thresh"])
+
+    key += (("transform", options["transform_response"],
+             None if log_transform_predictors is None else tuple(log_transform_predictors)),)
+    ames_data = run_stage(key, transform_variables, ames_data,
+                          options["transform_response"], log_transform_predictors)
+
+    if (options["cor_feature_selection_threshold"] != None) & (len(column_selection) == 0):
+      key += (("correlation", options["cor_feature_selection_threshold"]),)
+      key, ames_data = run_filter_stage(key, select_correlated_columns, ames_data,
+                                        options["cor_feature_selection_threshold"])
+
+    key += (("tidy", options["neighborhood_dummy"], tuple(column_selection)),)
+    ames_data = run_stage(key, tidy_columns, ames_data,
+                          options["neighborhood_dummy"], column_selection)
+
+    ames_jc_perturb.append(ames_data)
+
+  return ames_jc_perturb
@@ -0,0 +1,472 @@
+# A local HTTP scoring service for the final Ames sale price model
+#
+# The final fit of 07_prediction_combine (LAD on the preprocess_ames_data()
+# version with max_identical_thresh=0.95, n_neighborhoods=20, mode imputation,
+# simplify_vars=False, numeric categorical variables and a sqrt response) is
+# wrapped in a ScoringModel: the fitted AmesPreprocessor plan and the model,
+# saved to (and loaded from) one joblib file. ScoringModel.predict() takes raw
+# AmesHousing.txt-shaped records (a data frame with the original column names,
+# e.g., "Lot Area"), runs clean_ames_data() and the preprocessing plan, predicts
+# and undoes the response transformation, returning sale prices in dollars.
+#
+# Unlike AmesPreprocessor.transform(), which imputes the lot frontage median and
+# the categorical modes from the data being transformed, a ScoringModel imputes
+# the missing values with the medians/modes of the training data, so that the
+# prediction for a house doesn't depend on which other houses are scored with
+# it (or on how the requests are batched).
+#
+# The service is an asyncio HTTP/1.1 server (using only the standard library):
+#   POST /predict          a JSON record, a list of records, or
+#                          {"records": [...]}; returns {"predictions": [...]}
+#   GET /metrics           p50/p99 latency, throughput and batch sizes
+#   POST /metrics/reset    restart the metrics (e.g., after a warm up)
+#   GET /health
+# Concurrent requests are micro-batched: the records of all of the requests that
+# arrive while a batch is being predicted (or within max_wait_ms of the first
+# request, up to max_batch_size records) are predicted with one vectorized
+# transform + predict call. The model is only ever used in one (worker) thread,
+# so the event loop keeps accepting requests while a batch is predicted.
+#
+# Fit and save the model (see 07_prediction_combine), then run from the
+# dslc_documentation directory with, e.g.,
+#   python -m functions.prediction_service --model ../data/models/ames_scoring_model.joblib
+# (the model is fit on ../data/train_val_test/ames_train.csv first if the file
+# doesn't exist yet)
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from functions.clean_ames_data import clean_ames_data
+from functions.ames_preprocessor import AmesPreprocessor, fill_values
+from functions.evaluate_perturbations import inverse_transform_response
+
+
+# the judgment calls of the final (single "best") fit in 07_prediction_combine
+selected_options = dict(max_identical_thresh=0.95,
+                        n_neighborhoods=20,
+                        impute_missing_categorical="mode",
+                        simplify_vars=False,
+                        transform_response="sqrt",
+                        cor_feature_selection_threshold=0,
+                        convert_categorical="numeric")
+
+
+
+#------------------------------- Scoring model -------------------------------#
+
+class ScoringModel:
+  """The fitted preprocessing plan and model, predicting from raw Ames records.
+
+  `model` is any regression model with a `predict()` method. The other
+  arguments are the preprocess_ames_data() options (see AmesPreprocessor).
+  """
+
+  def __init__(self, model, **options):
+    self.model = model
+    self.preprocessor = AmesPreprocessor(**options)
+    self.raw_columns = None
+    self.numeric_columns = None
+    self.impute_values = None
+    self.feature_columns = None
+
+
+  def fit(self, ames_data, fit_model=True):
+    # ames_data: the raw (uncleaned) training data
+    # fit_model: if False, `model` has already been fit to the preprocessed
+    #   training data
+    self.raw_columns = list(ames_data.columns)
+    self.numeric_columns = [column for column in self.raw_columns
+                            if pd.api.types.is_numeric_dtype(ames_data[column])]
+    ames_data_clean = clean_ames_data(ames_data)
+    ames_data_preprocessed = self.preprocessor.fit_transform(ames_data_clean)
+
+    # the training data medians/modes used in place of the batch medians/modes
+    self.impute_values = {column: ames_data_clean[column].median()
+                          for column, value in fill_values.items() if value == "median"}
+    if self.preprocessor.options["impute_missing_categorical"] == "mode":
+      for column in ames_data_clean.columns[ames_data_clean.dtypes == object]:
+        mode = ames_data_clean[column].mode()
+        if len(mode) > 0:
+          self.impute_values[column] = mode.iloc[0]
+
+    X = ames_data_preprocessed.drop(columns="saleprice")
+    self.feature_columns = list(X.columns)
+    if fit_model:
+      self.model.fit(X=X, y=ames_data_preprocessed["saleprice"])
+    return self
+
+
+  def conform(self, ames_data):
+    # put the raw records in the training data format: the training columns (in
+    # order, adding any missing ones, e.g., SalePrice), with numeric types
+    ames_data = ames_data.reindex(columns=self.raw_columns)
+    for column in self.numeric_columns:
+      if not pd.api.types.is_numeric_dtype(ames_data[column]):
+        ames_data[column] = pd.to_numeric(ames_data[column], errors="coerce")
+    return ames_data
+
+
+  def predict(self, ames_data):
+    # ames_data: a data frame of raw records (with the AmesHousing.txt column names)
+    # returns an array of the predicted sale prices
+    if self.feature_columns is None:
+      raise ValueError("ScoringModel has not been fit. Call fit() first.")
+    ames_data_clean = clean_ames_data(self.conform(ames_data))
+    ames_data_clean = ames_data_clean.fillna(self.impute_values)
+    X = self.preprocessor.transform(ames_data_clean)[self.feature_columns]
+    missing = X.isna().any()
+    if missing.any():
+      raise ValueError("Missing values for %s" % ", ".join(missing.index[missing]))
+    preds = self.model.predict(X)
+    transform_response = [self.preprocessor.options["transform_response"]]
+    return inverse_transform_response(np.asarray(preds)[np.newaxis], transform_response)[0]
+
+
+  def save(self, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    joblib.dump(self, path)
+
+
+def load_scoring_model(path):
+  return joblib.load(path)
+
+
+# fit the final model of 07_prediction_combine (LAD with the selected judgment
+# calls) on the raw training data
+def fit_selected_model(ames_train, model=None):
+  if model is None:
+    from sklego.linear_model import LADRegression
+    model = LADRegression()
+  return ScoringModel(model, **selected_options).fit(ames_train)
+
+
+
+#---------------------------------- Metrics ----------------------------------#
+
+class ServiceMetrics:
+
+  def __init__(self, window=10000):
+    # window: the number of most recent requests and batches that the latency
+    #   and batch size statistics are computed from
+    self.window = window
+    self.reset()
+
+
+  def reset(self):
+    self.latencies = deque(maxlen=self.window)
+    self.batch_records = deque(maxlen=self.window)
+    self.batch_times = deque(maxlen=self.window)
+    self.n_requests = 0
+    self.n_records = 0
+    self.n_errors = 0
+    self.n_batches = 0
+    self.first_start = None
+    self.last_end = None
+
+
+  def record_request(self, start, end, n_records, error=False):
+    # start/end: the (time.perf_counter()) times the request was received and answered
+    self.latencies.append(end - start)
+    self.n_requests += 1
+    self.n_records += n_records
+    self.n_errors += error
+    self.first_start = start if self.first_start is None else min(self.first_start, start)
+    self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+
+  def record_batch(self, n_records, time_s):
+    self.n_batches += 1
+    self.batch_records.append(n_records)
+    self.batch_times.append(time_s)
+
+
+  def snapshot(self):
+    # throughput over the time from the first request received to the last
+    # request answered (so that idle time after a load test isn't counted)
+    elapsed = self.last_end - self.first_start if self.n_requests > 0 else 0
+    latencies = np.array(self.latencies) * 1e3
+    percentile = lambda values, q: float(np.percentile(values, q)) if len(values) > 0 else None
+    return {"requests": self.n_requests,
+            "records": self.n_records,
+            "errors": self.n_errors,
+            "batches": self.n_batches,
+            "elapsed_s": elapsed,
+            "requests_per_s": self.n_requests / elapsed if elapsed > 0 else None,
+            "records_per_s": self.n_records / elapsed if elapsed > 0 else None,
+            "latency_ms": {"p50": percentile(latencies, 50),
+                           "p99": percentile(latencies, 99),
+                           "mean": float(latencies.mean()) if len(latencies) > 0 else None,
+                           "max": float(latencies.max()) if len(latencies) > 0 else None},
+            "batch_records": {"mean": float(np.mean(self.batch_records)) if self.n_batches > 0 else None,
+                              "max": int(np.max(self.batch_records)) if self.n_batches > 0 else None},
+            "batch_predict_ms": {"mean": float(np.mean(self.batch_times)) * 1e3
+                                 if self.n_batches > 0 else None}}
+
+
+
+#------------------------------- Micro-batching ------------------------------#
+
+class MicroBatcher:
+  """Collect the records of concurrent requests into batches for one predict call.
+
+  `predict` takes a data frame of records and returns an array of predictions.
+  A batch is predicted as soon as it has max_batch_size records, or when no more
+  requests arrive within max_wait_ms of its first request (the requests queued
+  while the previous batch was predicted are always included).
+  """
+
+  def __init__(self, predict, max_batch_size=64, max_wait_ms=2, metrics=None):
+    self.predict_records = predict
+    self.max_batch_size = max_batch_size
+    self.max_wait_s = max_wait_ms / 1e3
+    self.metrics = metrics
+    self.queue = None
+    self.task = None
+    # a single worker thread, so the model is only used by one batch at a time
+    self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+  def start(self):
+    self.queue = asyncio.Queue()
+    self.task = asyncio.get_running_loop().create_task(self._run())
+
+
+  async def stop(self):
+    self.task.cancel()
+    try:
+      await self.task
+    except asyncio.CancelledError:
+      pass
+    self.executor.shutdown()
+
+
+  async def predict(self, records):
+    # records: a list of dicts, one for each house
+    # returns a list of the predictions
+    future = asyncio.get_running_loop().create_future()
+    await self.queue.put((records, future))
+    return await future
+
+
+  async def _next_batch(self):
+    batch = [await self.queue.get()]
+    n_records = len(batch[0][0])
+    deadline = time.perf_counter() + self.max_wait_s
+    while n_records < self.max_batch_size:
+      if self.queue.empty():
+        timeout = deadline - time.perf_counter()
+        if timeout <= 0:
+          break
+        try:
+          item = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+          break
+      else:
+        item = self.queue.get_nowait()
+      batch.append(item)
+      n_records += len(item[0])
+    return batch
+
+
+  def _predict_batch(self, batch, record_metrics=True):
+    # predict all of the records of a batch at once. If that fails (e.g., a
+    # record has an unusable value), predict each request separately so that
+    # only the requests with bad records fail (the retries are counted as part
+    # of the one batch in the metrics).
+    # returns a list with the predictions (or exception) for each request
+    start = time.perf_counter()
+    records = [record for request_records, _ in batch for record in request_records]
+    try:
+      preds = self.predict_records(pd.DataFrame.from_records(records))
+      ends = np.cumsum([len(request_records) for request_records, _ in batch])
+      results = [list(map(float, request_preds)) for request_preds in np.split(preds, ends[:-1])]
+    except Exception as error:
+      if len(batch) == 1:
+        results = [error]
+      else:
+        results = [self._predict_batch([request], record_metrics=False)[0] for request in batch]
+    if record_metrics and self.metrics is not None:
+      self.metrics.record_batch(len(records), time.perf_counter() - start)
+    return results
+
+
+  async def _run(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      batch = await self._next_batch()
+      results = await loop.run_in_executor(self.executor, self._predict_batch, batch)
+      for (_, future), result in zip(batch, results):
+        if future.cancelled():
+          continue
+        if isinstance(result, Exception):
+          future.set_exception(result)
+        else:
+          future.set_result(result)
+
+
+
+#---------------------------------- HTTP server ------------------------------#
+
+status_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class PredictionService:
+  """Serve the predictions of a ScoringModel over HTTP with micro-batching."""
+
+  def __init__(self, scoring_model, max_batch_size=64, max_wait_ms=2, max_body_bytes=16 * 2**20):
+    self.scoring_model = scoring_model
+    self.metrics = ServiceMetrics()
+    self.batcher = MicroBatcher(scoring_model.predict, max_batch_size=max_batch_size,
+                                max_wait_ms=max_wait_ms, metrics=self.metrics)
+    self.max_body_bytes = max_body_bytes
+    self.server = None
+
+
+  async def start(self, host="127.0.0.1", port=8000):
+    self.batcher.start()
+    self.server = await asyncio.start_server(self.handle_connection, host, port)
+    return self.server.sockets[0].getsockname()[:2]
+
+
+  async def stop(self):
+    self.server.close()
+    await self.server.wait_closed()
+    await self.batcher.stop()
+
+
+  async def handle_connection(self, reader, writer):
+    # read requests from the connection (kept alive for HTTP/1.1) until the
+    # client closes it
+    try:
+      while True:
+        request_line = await reader.readline()
+        if not request_line.strip():
+          break
+        start = time.perf_counter()
+        method, target, version = request_line.decode("latin-1").split(maxsplit=2)
+        headers = {}
+        while True:
+          line = await reader.readline()
+          if line in (b"\r\n", b"\n", b""):
+            break
+          name, _, value = line.decode("latin-1").partition(":")
+          headers[name.strip().lower()] = value.strip()
+        content_length = int(headers.get("content-length", 0))
+        if content_length > self.max_body_bytes:
+          await self.respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+          break
+        body = await reader.readexactly(content_length)
+
+        status, payload = await self.route(method, target.split("?")[0], body, start)
+        keep_alive = (version.strip() == "HTTP/1.1" and
+                      headers.get("connection", "").lower() != "close")
+        await self.respond(writer, status, payload, keep_alive)
+        if not keep_alive:
+          break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+      pass
+    finally:
+      writer.close()
+
+
+  async def route(self, method, path, body, start):
+    routes = {"/predict": ("POST", self.handle_predict),
+              "/metrics": ("GET", lambda body, start: (200, self.metrics.snapshot())),
+              "/metrics/reset": ("POST", self.handle_reset),
+              "/health": ("GET", lambda body, start: (200, {"status": "ok"}))}
+    if path not in routes:
+      return 404, {"error": "unknown path %s" % path}
+    route_method, handler = routes[path]
+    if method != route_method:
+      return 405, {"error": "use %s for %s" % (route_method, path)}
+    result = handler(body, start)
+    return await result if asyncio.iscoroutine(result) else result
+
+
+  async def handle_predict(self, body, start):
+    try:
+      request = json.loads(body)
+      records = request["records"] if isinstance(request, dict) and "records" in request else request
+      records = [records] if isinstance(records, dict) else records
+      if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise ValueError("expected a record, a list of records or {\"records\": [...]}")
+    except (ValueError, TypeError) as error:
+      self.metrics.record_request(start, time.perf_counter(), 0, error=True)
+      return 400, {"error": str(error)}
+    if len(records) == 0:
+      return 200, {"predictions": []}
+
+    try:
+      preds = await self.batcher.predict(records)
+    except (ValueError, KeyError, TypeError) as error:
+      self.metrics.record_request(start, time.perf_counter(), len(records), error=True)
+      return 400, {"error": "%s: %s" % (type(error).__name__, error)}
+    except Exception as error:
+      self.metrics.record_request(start, time.perf_counter(), len(records), error=True)
+      return 500, {"error": "%s: %s" % (type(error).__name__, error)}
+    self.metrics.record_request(start, time.perf_counter(), len(records))
+    return 200, {"predictions": preds}
+
+
+  def handle_reset(self, body, start):
+    self.metrics.reset()
+    return 200, {"status": "reset"}
+
+
+  async def respond(self, writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = ("HTTP/1.1 %d %s\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: %d\r\n"
+            "Connection: %s\r\n\r\n" % (status, status_reasons[status], len(body),
+                                        "keep-alive" if keep_alive else "close"))
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(scoring_model, host="127.0.0.1", port=8000, max_batch_size=64, max_wait_ms=2):
+  service = PredictionService(scoring_model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+  host, port = await service.start(host, port)
+  # (the benchmark waits for this line)
+  print("Serving Ames sale price predictions on http://%s:%d" % (host, port), flush=True)
+  try:
+    await service.server.serve_forever()
+  finally:
+    await service.stop()
+
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Local HTTP scoring service for the Ames sale price model")
+  parser.add_argument("--model", default="../data/models/ames_scoring_model.joblib",
+                      help="the saved ScoringModel (fit on the training data if it doesn't exist)")
+  parser.add_argument("--train", default="../data/train_val_test/ames_train.csv")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8000)
+  parser.add_argument("--max-batch-size", type=int, default=64,
+                      help="the maximum number of records predicted at once (1 = no batching)")
+  parser.add_argument("--max-wait-ms", type=float, default=2,
+                      help="how long to wait for more requests before predicting a batch")
+  args = parser.parse_args()
+
+  if not os.path.exists(args.model):
+    ames_train = pd.read_csv(args.train, na_values=["", "NA"], keep_default_na=False)
+    fit_selected_model(ames_train).save(args.model)
+  scoring_model = load_scoring_model(args.model)
+  try:
+    asyncio.run(serve(scoring_model, args.host, args.port, args.max_batch_size, args.max_wait_ms))
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
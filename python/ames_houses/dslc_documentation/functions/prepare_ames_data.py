@@ -5,12 +5,35 @@ import datetime
 
 from functions.clean_ames_data import clean_ames_data
 from functions.preprocess_ames_data import preprocess_ames_data
+from functions.ames_preprocessor import AmesPreprocessor
+from functions.data_cache import DataCache
 
 
+# the loaded, cleaned and preprocessed data frames are cached in ../data/cache,
+# so that they are only recomputed when the data files or the
+# cleaning/preprocessing code change
+ames_cache = DataCache("../data/cache")
+cleaning_files = ["functions/clean_ames_data.py"]
+preprocessing_files = ["functions/prepare_ames_data.py", "functions/preprocess_ames_data.py",
+                       "functions/ames_preprocessor.py"]
+
+
+# fit the preprocessing on the training data and apply it to the training,
+# validation and test data
+def preprocess_train_val_test(ames_train_clean, ames_val_clean, ames_test_clean):
+  # the fitted preprocessor stores the training columns and neighborhood levels
+  # so that the validation and test sets have the same variables and only 
+  # include the same neighborhoods as the training data
+  ames_preprocessor = AmesPreprocessor()
+  return [ames_preprocessor.fit_transform(ames_train_clean),
+          ames_preprocessor.transform(ames_val_clean),
+          ames_preprocessor.transform(ames_test_clean)]
+
 
 ## load in the original data
-ames_orig = pd.read_table("../data/AmesHousing.txt", sep="\t", header=0, 
-                          na_values=["", "NA"], keep_default_na=False)
+ames_orig = ames_cache.cached(pd.read_table, "../data/AmesHousing.txt", sep="\t", header=0,
+                              na_values=["", "NA"], keep_default_na=False,
+                              files=["../data/AmesHousing.txt"])
 
 
 ## The following code would define the training, validation, and test set equivalent to what was done in R:
@@ -41,36 +64,25 @@ ames_orig = pd.read_table("../data/AmesHousing.txt", sep="\t", header=0,
 ## Since we want to use the same training, validation, test set that was used in the book, we will 
 ## instead load the versions of the training, validation, and test sets that were computed in R
 ## so that our results match the book as closely as possible
-ames_train = pd.read_csv("../data/train_val_test/ames_train.csv",
-                         na_values=["", "NA"], keep_default_na=False)
-ames_val = pd.read_csv("../data/train_val_test/ames_val.csv",
-                       na_values=["", "NA"], keep_default_na=False)
-ames_test = pd.read_csv("../data/train_val_test/ames_test.csv",
-                        na_values=["", "NA"], keep_default_na=False)
+ames_train = ames_cache.cached(pd.read_csv, "../data/train_val_test/ames_train.csv",
+                               na_values=["", "NA"], keep_default_na=False,
+                               files=["../data/train_val_test/ames_train.csv"])
+ames_val = ames_cache.cached(pd.read_csv, "../data/train_val_test/ames_val.csv",
+                             na_values=["", "NA"], keep_default_na=False,
+                             files=["../data/train_val_test/ames_val.csv"])
+ames_test = ames_cache.cached(pd.read_csv, "../data/train_val_test/ames_test.csv",
+                              na_values=["", "NA"], keep_default_na=False,
+                              files=["../data/train_val_test/ames_test.csv"])
 
 # clean the original data
-ames_train_clean = clean_ames_data(ames_train)
-ames_val_clean = clean_ames_data(ames_val)
-ames_test_clean = clean_ames_data(ames_test)
-
-ames_train_preprocessed = preprocess_ames_data(ames_train_clean)
-
-# extract the neighborhoods included in the training data
-# this is to ensure that the validation and test sets only include the 
-# same neighborhoods as the training data
-neighborhood_cols = list(ames_train_preprocessed.filter(regex="neighborhood").columns)
-train_neighborhoods = [x.replace("neighborhood_", "") for x in neighborhood_cols]
-
-# create preprocessed validation set
-ames_val_preprocessed = preprocess_ames_data(
-    ames_val_clean,
-    column_selection=list(ames_train_preprocessed.columns),
-    neighborhood_levels=train_neighborhoods
-)
-
-# create preprocessed test set
-ames_test_preprocessed = preprocess_ames_data(
-    ames_test_clean,
-    column_selection=list(ames_train_preprocessed.columns),
-    neighborhood_levels=train_neighborhoods
-)
\ No newline at end of file
+ames_train_clean = ames_cache.cached(clean_ames_data, ames_train, files=cleaning_files)
+ames_val_clean = ames_cache.cached(clean_ames_data, ames_val, files=cleaning_files)
+ames_test_clean = ames_cache.cached(clean_ames_data, ames_test, files=cleaning_files)
+
+# create the preprocessed training, validation and test sets
+ames_train_preprocessed, ames_val_preprocessed, ames_test_preprocessed = \
+  ames_cache.cached(preprocess_train_val_test, ames_train_clean, ames_val_clean, ames_test_clean,
+                    files=preprocessing_files)
+# the neighborhoods that were kept in the training data
+train_neighborhoods = [x.replace("neighborhood_", "") 
+                       for x in ames_train_preprocessed.filter(regex="neighborhood").columns]
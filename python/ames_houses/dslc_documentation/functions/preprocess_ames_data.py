@@ -1,6 +1,212 @@
 import pandas as pd
 import numpy as np
 
+from functions.stage_trace import record_stages
+
+
+
+#---------------------------- Recoding tables --------------------------------#
+
+# The variables created and recoded by the stages below are defined by these
+# tables, which are also used by AmesPreprocessor (ames_preprocessor.py) to
+# build the same columns directly. A new variable is defined by a recipe:
+#   ("indicator", sources, levels): 1 if any of the source variables is one of
+#     the levels, 0 otherwise
+#   ("weighted_sum", [(source, weight), ...])
+#   ("any_nonzero", sources): 1 if any of the source variables is not 0
+#   ("zeros",): always 0
+
+# numeric variables with a fixed imputation value ("median" = the column median)
+# assume that missing basement bathrooms and mas_vnr_area is 0, and impute lot
+# frontage with the median lot frontage
+fill_values = {"bsmt_full_bath": 0,
+               "bsmt_half_bath": 0,
+               "full_bath": 0,
+               "half_bath": 0,
+               "mas_vnr_area": 0,
+               "lot_frontage": "median"}
+
+porch_vars = ["open_porch_sf", "enclosed_porch", "3ssn_porch", "screen_porch"]
+
+exterior_levels = {"vinyl": "VinylSd", "metal": "MetalSd", "hardboard": "HdBoard",
+                   "wood": "Wd Sdng", "plywood": "Plywood", "cement": "CemntBd",
+                   "brick": "BrkFace", "wood_shing": "WdShing"}
+
+# simplify_vars=True: manually simplify variables with many (rare) levels, and
+# combine the 1st and 2nd exterior, bathroom and porch variables
+simplify_recipes = {
+  "gable_roof": ("indicator", ["roof_style"], ["Gable"]),
+  "masonry_veneer_brick": ("indicator", ["mas_vnr_type"], ["BrkFace", "BrkCmn"]),
+  "foundation_cinder": ("indicator", ["foundation"], ["CBlock"]),
+  "foundation_concrete": ("indicator", ["foundation"], ["PConc"]),
+  "electrical_standard": ("indicator", ["electrical"], ["SBrkr"]),
+  "garage_attached": ("indicator", ["garage_type"], ["Attchd", "BuiltIn", "2Types", "Basement"]),
+  "lot_inside": ("indicator", ["lot_config"], ["Inside"]),
+  "no_proximity": ("indicator", ["condition_1"], ["Norm"]),
+  "single_family_house": ("indicator", ["bldg_type"], ["1Fam"]),
+  **{"exterior_" + name: ("indicator", ["exterior_1st", "exterior_2nd"], [exterior_levels[name]])
+     for name in ["vinyl", "metal", "hardboard", "wood"]},
+  "bathrooms": ("weighted_sum", [("full_bath", 1), ("half_bath", 0.5),
+                                 ("bsmt_full_bath", 1), ("bsmt_half_bath", 0.5)]),
+  "porch": ("any_nonzero", porch_vars)
+}
+# the variables that are no longer needed
+simplify_drop_columns = ["roof_style", "mas_vnr_type", "foundation", "electrical", "garage_type",
+                         "lot_config", "condition_1", "bldg_type", "exterior_1st", "exterior_2nd",
+                         "bsmt_full_bath", "bsmt_half_bath", "full_bath", "half_bath"] + porch_vars + \
+                        [# remove basement SF sub-variables if simplifying
+                         "bsmt_unf_sf", "bsmtfin_sf_1",
+                         # remove general SF sub-variables if simplifying
+                         "1st_flr_sf", "2nd_flr_sf", "low_qual_fin_sf"]
+
+# simplify_vars=False: still simplify, but simplify less
+simplify_less_recipes = {
+  "gable_roof": ("indicator", ["roof_style"], ["Gable"]),
+  "hip_roof": ("indicator", ["roof_style"], ["Hip"]),
+  "masonry_veneer_brick_face": ("indicator", ["mas_vnr_type"], ["BrkFace"]),
+  "masonry_veneer_none": ("indicator", ["mas_vnr_type"], ["BrkCmn"]),
+  "masonry_veneer_stone": ("indicator", ["mas_vnr_type"], ["Stone"]),
+  "foundation_brick": ("indicator", ["foundation"], ["BrkTil"]),
+  "foundation_cinder": ("indicator", ["foundation"], ["CBlock"]),
+  "foundation_concrete": ("indicator", ["foundation"], ["PConc"]),
+  "electrical_standard": ("indicator", ["electrical"], ["SBrkr"]),
+  "garage_attached": ("indicator", ["garage_type"], ["Attchd"]),
+  "garage_detached": ("indicator", ["garage_type"], ["Detchd"]),
+  "lot_inside": ("indicator", ["lot_config"], ["Inside"]),
+  "lot_corner": ("indicator", ["lot_config"], ["Corner"]),
+  "railroad_adjacent": ("indicator", ["condition_1"], ["RRAe", "RRAn", "RRNe", "RRNn"]),
+  "main_street_adjacent": ("indicator", ["condition_1"], ["Artery", "Feedr"]),
+  "positive_adjacent": ("indicator", ["condition_1"], ["PosA", "PosN"]),
+  "single_family_house": ("indicator", ["bldg_type"], ["1Fam"]),
+  "townhouse": ("indicator", ["bldg_type"], ["Twnhs", "TwnhsE"]),
+  **{"exterior1_" + name: ("indicator", ["exterior_1st"], [level])
+     for name, level in exterior_levels.items()},
+  **{"exterior2_" + name: ("indicator", ["exterior_2nd"], [level])
+     for name, level in exterior_levels.items()},
+  "porch_area": ("weighted_sum", [(var, 1) for var in porch_vars])
+}
+simplify_less_drop_columns = ["roof_style", "mas_vnr_type", "foundation", "electrical",
+                              "garage_type", "lot_config", "condition_1", "bldg_type",
+                              "exterior_1st", "exterior_2nd", "bsmt_full_bath", "bsmt_half_bath",
+                              "full_bath", "half_bath"] + porch_vars + \
+                             [# or remove just one of the sub-SF variables
+                              "bsmt_unf_sf", "low_qual_fin_sf"]
+
+# convert_categorical="dummy" or "none": simplify the uncommon levels to ensure
+# that the validation set doesn't have levels that aren't in the training set
+quality_mapping = {"Ex": "excellent", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"}
+lump_mappings = {
+  "ms_zoning": {"FV": "other", "RH": "other", "RL": "low_density", "RM": "medium_density"},
+  "lot_shape": {"IR1": "irregular", "IR2": "irregular", "IR3": "irregular", "Reg": "regular"},
+  "functional": {"Typ": "typical", "Maj1": "atypical", "Maj2": "atypical", "Min1": "atypical",
+                 "Min2": "atypical", "Mod": "atypical"},
+  "exter_qual": {"Ex": "good", "Gd": "good", "Fa": "average", "TA": "average"},
+  "exter_cond": {"Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"},
+  "heating_qc": quality_mapping,
+  "house_style": {"1.5Fin": "floors1.5", "1.5Unf": "floors1.5", "SFoyer": "floors1.5",
+                  "1Story": "floors1", "2.5Fin": "floors2", "2.5Unf": "floors2",
+                  "2Story": "floors2", "SLvl": "floors2"},
+  "kitchen_qual": quality_mapping,
+  "paved_drive": {"Y": "yes", "N": "no", "P": "no"},
+  "garage_finish": {"Fin": "finish", "RFn": "finish", "Unf": "unfinished"},
+  "bsmt_qual": quality_mapping,
+  "garage_qual": {"Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "good"},
+  "garage_cond": {"Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "good"},
+  "fireplace_qu": {"Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"}
+}
+
+# convert_categorical="dummy": the variables passed to pd.get_dummies()
+dummy_vars = ["functional", "exter_qual", "exter_cond", "lot_shape", "heating_qc",
+              "ms_zoning", "kitchen_qual", "bsmtfin_type_1", "garage_qual",
+              "garage_cond", "fireplace_qu", "bsmt_exposure", "bsmt_cond",
+              "bsmt_qual", "house_style", "bsmtfin_type_2"]
+
+# convert_categorical="numeric": output variable -> (source variable, mapping)
+rating_mapping = {"Ex": 5, "Gd": 4, "TA": 3, "Fa": 2, "Po": 1, "other": 0}
+bsmtfin_type_mapping = {"GLQ": 6, "ALQ": 5, "Rec": 4, "BLQ": 3, "LwQ": 2, "Unf": 1, "other": 0}
+numeric_mappings = {
+  "residential_density": ("ms_zoning", {"RH": 3, "RM": 2, "RL": 1, "FV": 0}),
+  "irregular_lot_shape": ("lot_shape", {"Reg": 0, "IR1": 1, "IR2": 2, "IR3": 3}),
+  "functional": ("functional", {"Typ": 8, "Min1": 7, "Min2": 6, "Mod": 5, "Maj1": 4,
+                                "Maj2": 3, "Sev": 2, "Sal": 1}),
+  "house_floors": ("house_style", {"1Story": 1, "SFoyer": 1, "SLvl": 1, "1.5Fin": 1.5,
+                                   "1.5Unf": 1.5, "2Story": 2, "2.5Fin": 2.5, "2.5Unf": 2.5}),
+  "paved_drive": ("paved_drive", {"Y": 1, "P": 0, "N": -1}),
+  "garage_finish": ("garage_finish", {"Fin": 3, "RFn": 2, "Unf": 1, "other": 0}),
+  "bsmt_exposure": ("bsmt_exposure", {"Gd": 4, "Av": 3, "Mn": 2, "No": 1, "other": 0}),
+  "basement_finished_rating": ("bsmtfin_type_1", bsmtfin_type_mapping),
+  "basement_finished_rating2": ("bsmtfin_type_2", bsmtfin_type_mapping),
+  **{column: (column, rating_mapping)
+     for column in ["exter_qual", "exter_cond", "heating_qc", "kitchen_qual",
+                    "bsmt_qual", "bsmt_cond", "garage_qual", "garage_cond", "fireplace_qu"]}
+}
+numeric_drop_columns = ["lot_shape", "ms_zoning", "bsmtfin_type_1", "house_style", "bsmtfin_type_2"]
+
+# convert_categorical="simplified_dummy": create the dummy variables manually
+simplified_dummy_recipes = {
+  "residential_density_high": ("indicator", ["ms_zoning"], ["RH"]),
+  "residential_density_mid": ("indicator", ["ms_zoning"], ["RM"]),
+  "residential_density_low": ("indicator", ["ms_zoning"], ["RL"]),
+  "residential_density_floating": ("indicator", ["ms_zoning"], ["FV"]),
+  "irregular_lot_shape": ("indicator", ["lot_shape"], ["IR1", "IR2", "IR3"]),
+  "home_functional": ("indicator", ["functional"], ["Typ"]),
+  "exter_qual_good": ("indicator", ["exter_qual"], ["Gd", "Ex"]),
+  "exter_cond_good": ("indicator", ["exter_cond"], ["Gd", "Ex"]),
+  "heating_qc_ex": ("indicator", ["heating_qc"], ["Ex"]),
+  "heating_qc_good": ("indicator", ["heating_qc"], ["Gd"]),
+  "house_1half_story": ("indicator", ["house_style"], ["1.5Fin", "1.5Unf"]),
+  "house_2story": ("indicator", ["house_style"], ["2Story"]),
+  "house_2half_story": ("indicator", ["house_style"], ["2.5Fin", "2.5Unf"]),
+  "kitchen_qual_good": ("indicator", ["kitchen_qual"], ["Gd", "Ex"]),
+  "paved_drive": ("indicator", ["paved_drive"], ["Y"]),
+  "garage_finish": ("indicator", ["garage_finish"], ["Fin"]),
+  # this was computed from the already-binarized garage_finish variable, so it
+  # is always 0
+  "garage_rough_finish": ("zeros",),
+  "bsmt_qual_good": ("indicator", ["bsmt_qual"], ["Ex", "Gd"]),
+  "bsmt_cond_good": ("indicator", ["bsmt_cond"], ["Ex", "Gd"]),
+  "bsmt_exposure_good": ("indicator", ["bsmt_exposure"], ["Gd"]),
+  "bsmt_exposure_avg": ("indicator", ["bsmt_exposure"], ["Av"]),
+  "bsmt_exposure_min": ("indicator", ["bsmt_exposure"], ["Mn"]),
+  "basement_finished_good": ("indicator", ["bsmtfin_type_1"], ["GLQ", "ALQ"]),
+  "basement_finished_rec": ("indicator", ["bsmtfin_type_1"], ["Rec"]),
+  "basement_finished_low": ("indicator", ["bsmtfin_type_1"], ["LwQ", "BLQ"]),
+  "garage_qual_typical": ("indicator", ["garage_qual"], ["TA"]),
+  "garage_cond_typical": ("indicator", ["garage_cond"], ["TA"]),
+  "fireplace_qu_good": ("indicator", ["fireplace_qu"], ["Ex", "Gd"])
+}
+simplified_dummy_drop_columns = ["functional", "exter_qual", "exter_cond", "lot_shape",
+                                 "heating_qc", "ms_zoning", "kitchen_qual", "bsmtfin_type_1",
+                                 "garage_qual", "garage_cond", "fireplace_qu", "bsmt_exposure",
+                                 "bsmt_cond", "bsmt_qual", "house_style", "bsmtfin_type_2"]
+
+
+# build a variable from its recipe, where base(column) returns a (source) column
+def build_column(recipe, base, index):
+  kind = recipe[0]
+  if kind == "indicator":
+    _, sources, levels = recipe
+    indicator = base(sources[0]).isin(levels)
+    for source in sources[1:]:
+      indicator = indicator | base(source).isin(levels)
+    return pd.Series(np.where(indicator, 1, 0), index=index)
+  if kind == "weighted_sum":
+    total = None
+    for source, weight in recipe[1]:
+      term = base(source) if weight == 1 else weight * base(source)
+      total = term if total is None else total + term
+    return total
+  if kind == "any_nonzero":
+    nonzero = base(recipe[1][0]) != 0
+    for source in recipe[1][1:]:
+      nonzero = nonzero | (base(source) != 0)
+    return pd.Series(np.where(nonzero, 1, 0), index=index)
+  if kind == "zeros":
+    return pd.Series(np.zeros(len(index), dtype=int), index=index)
+  raise ValueError("Unknown recipe: %s" % kind)
+
+
+
 def preprocess_ames_data(ames_data_clean,
                          column_selection=[],
                          max_identical_thresh=0.8,
@@ -27,8 +233,23 @@ def preprocess_ames_data(ames_data_clean,
   convert_categorical_options = ["numeric", "simplified_dummy", "dummy", "none"]
   if convert_categorical not in convert_categorical_options:
     raise ValueError("Invalid convert_categorical. Expected one of: %s" % convert_categorical_options)
-  
-  ames_data_preprocessed = ames_data_clean.copy()
+
+  # record the time and memory of each stage (only inside trace_stages(), see
+  # stage_trace.py)
+  stages = record_stages("preprocess_ames_data", ames_data_clean,
+                         max_identical_thresh=max_identical_thresh,
+                         max_missing_thresh=max_missing_thresh,
+                         n_neighborhoods=n_neighborhoods,
+                         neighborhood_dummy=neighborhood_dummy,
+                         impute_missing_categorical=impute_missing_categorical,
+                         simplify_vars=simplify_vars,
+                         log_transform_predictors=log_transform_predictors,
+                         transform_response=transform_response,
+                         cor_feature_selection_threshold=cor_feature_selection_threshold,
+                         convert_categorical=convert_categorical,
+                         column_selection=len(column_selection) > 0)
+
+  ames_data_preprocessed = ames_data_clean
   
   
   #------------------------- Handle missing values ---------------------------#
@@ -36,25 +257,89 @@ def preprocess_ames_data(ames_data_clean,
   if len(column_selection) == 0:
     # if we have not specified which columns to keep
     # remove variables with more than max_missing_thresh missing proportion
+    ames_data_preprocessed = remove_missing_columns(ames_data_preprocessed, max_missing_thresh)
+    stages.mark("remove_missing_columns", ames_data_preprocessed)
+
+  ames_data_preprocessed = impute_missing_values(ames_data_preprocessed, impute_missing_categorical)
+  stages.mark("impute_missing_values", ames_data_preprocessed)
+  
+  
+  #--------------------- Neighborhood levels ---------------------------------#
+  
+  ames_data_preprocessed = lump_neighborhoods(ames_data_preprocessed, neighborhood_levels, n_neighborhoods)
+  stages.mark("lump_neighborhoods", ames_data_preprocessed)
+  
+  
+  #------------------------ Simplify variables -------------------------------#
+  
+  ames_data_preprocessed = simplify_variables(ames_data_preprocessed, simplify_vars)
+  stages.mark("simplify_variables", ames_data_preprocessed)
+  
+  
+  #-------------------- Categorical to numeric -------------------------------#
+  
+  ames_data_preprocessed = convert_categorical_variables(ames_data_preprocessed, convert_categorical)
+  stages.mark("convert_categorical_variables", ames_data_preprocessed)
+  
+  
+  #------------------------ Handle identical values --------------------------#
+  
+  if len(column_selection) == 0:
+    ames_data_preprocessed = remove_identical_columns(ames_data_preprocessed, max_identical_thresh)
+    stages.mark("remove_identical_columns", ames_data_preprocessed)
+
+  
+  #------------------------- Transformations ---------------------------------#
+  
+  ames_data_preprocessed = transform_variables(ames_data_preprocessed, transform_response, log_transform_predictors)
+  stages.mark("transform_variables", ames_data_preprocessed)
+  
+  
+  #----------------------- Correlation feature selection ---------------------#
+
+  # select only features that are at least 0.5 correlated with response
+  if (cor_feature_selection_threshold != None) & (len(column_selection) == 0):
+    ames_data_preprocessed = select_correlated_columns(ames_data_preprocessed, cor_feature_selection_threshold)
+    stages.mark("select_correlated_columns", ames_data_preprocessed)
+  
+  
+  #--------------------------------- Tidying up ------------------------------#
+  
+  # create the neighborhood dummy variables and select the columns
+  ames_data_preprocessed = tidy_columns(ames_data_preprocessed, neighborhood_dummy, column_selection)
+  stages.mark("tidy_columns", ames_data_preprocessed)
     
-    # identify the proportion of missing values for each column
-    prop_missing = pd.isna(ames_data_preprocessed).sum() / len(ames_data_preprocessed.index)
-    vars_to_keep = prop_missing < max_missing_thresh
-    
-    # remove the variables above the threshold
-    ames_data_preprocessed = ames_data_preprocessed.loc[:,vars_to_keep]
+  return stages.finish(ames_data_preprocessed)
+
 
+
+#------------------------------ Stages ---------------------------------------#
+
+# Each stage of preprocess_ames_data() is defined as a separate function so 
+# that the stages can also be run one at a time (e.g., by perturb_ames_data()).
+# The stages never modify the data frame that they are given.
+
+
+def remove_missing_columns(ames_data_preprocessed, max_missing_thresh, column_stats=None):
+  # identify the proportion of missing values for each column (column_stats can
+  # be given to reuse the statistics computed by column_statistics())
+  if column_stats is None:
+    prop_missing = pd.isna(ames_data_preprocessed).sum() / len(ames_data_preprocessed.index)
+  else:
+    prop_missing = column_stats["prop_missing"]
+  vars_to_keep = prop_missing < max_missing_thresh
   
+  # remove the variables above the threshold
+  ames_data_preprocessed = ames_data_preprocessed.loc[:,vars_to_keep]
   
-  # assume that missing basement bathrooms and mas_vnr_area is 0
-  # impute lot frontage with median lot frontage
+  return ames_data_preprocessed
+
+
+def impute_missing_values(ames_data_preprocessed, impute_missing_categorical):
+  # impute the numeric variables with a fixed value (or the median, see fill_values)
   ames_data_preprocessed = ames_data_preprocessed.fillna(
-      {"bsmt_full_bath": 0, 
-       "bsmt_half_bath": 0, 
-       "full_bath": 0,
-       "half_bath": 0,
-       "mas_vnr_area": 0, 
-       "lot_frontage": ames_data_preprocessed.lot_frontage.median()}
+      {column: ames_data_preprocessed[column].median() if value == "median" else value
+       for column, value in fill_values.items() if column in ames_data_preprocessed.columns}
   )
 
 
@@ -68,8 +353,11 @@ def preprocess_ames_data(ames_data_clean,
       # fill each missing value with the mode for the column
       ames_data_preprocessed.loc[:,str_columns] = ames_data_preprocessed.loc[:,str_columns].fillna(ames_mode)
   
-  
-  #--------------------- Neighborhood levels ---------------------------------#
+  return ames_data_preprocessed
+
+
+def lump_neighborhoods(ames_data_preprocessed, neighborhood_levels=[], n_neighborhoods=10):
+  ames_data_preprocessed = ames_data_preprocessed.copy()
   
   # if cleaning validation or testing data, you want the levels to match
   # the training data
@@ -94,333 +382,51 @@ def preprocess_ames_data(ames_data_clean,
     # convert excluded neighborhoods to other
     ames_data_preprocessed.loc[excluded_neighborhoods_index, "neighborhood"] = "other"
   
+  return ames_data_preprocessed
+
+
+def simplify_variables(ames_data_preprocessed, simplify_vars=True):
+  ames_data_preprocessed = ames_data_preprocessed.copy()
   
-  #------------------------ Simplify variables -------------------------------#
-  
-  # manually simplify several variables with rare levels
+  # manually simplify several variables with rare levels (see simplify_recipes
+  # and simplify_less_recipes)
   if simplify_vars == True:
-    # if simplify_vars == True, simplify more
-    # manually simplify variables with many levels
-    ames_data_preprocessed["gable_roof"] = np.where(ames_data_preprocessed["roof_style"] == "Gable", 1, 0)
-    ames_data_preprocessed["masonry_veneer_brick"] = np.where(ames_data_preprocessed["mas_vnr_type"].isin(["BrkFace", "BrkCmn"]), 1, 0)
-    ames_data_preprocessed["foundation_cinder"] = np.where(ames_data_preprocessed["foundation"] == "CBlock", 1, 0)
-    ames_data_preprocessed["foundation_concrete"] = np.where(ames_data_preprocessed["foundation"] == "PConc", 1, 0)
-    ames_data_preprocessed["electrical_standard"] = np.where(ames_data_preprocessed["electrical"] == "SBrkr", 1, 0)
-    ames_data_preprocessed["garage_attached"] = np.where(ames_data_preprocessed["garage_type"].isin(["Attchd", "BuiltIn", "2Types", "Basement"]), 1, 0)
-    ames_data_preprocessed["lot_inside"] = np.where(ames_data_preprocessed["lot_config"] == "Inside", 1, 0)
-    ames_data_preprocessed["no_proximity"] = np.where(ames_data_preprocessed["condition_1"] == "Norm", 1, 0)
-    ames_data_preprocessed["single_family_house"] = np.where(ames_data_preprocessed["bldg_type"] == "1Fam", 1, 0)
-    # combine 1st and 2nd floor variables
-    ames_data_preprocessed["exterior_vinyl"] = np.where(
-      (ames_data_preprocessed["exterior_1st"] == "VinylSd") | (ames_data_preprocessed["exterior_2nd"] == "VinylSd"), 
-      1, 0
-    )
-    ames_data_preprocessed["exterior_metal"] = np.where(
-      (ames_data_preprocessed["exterior_1st"] == "MetalSd") | (ames_data_preprocessed["exterior_2nd"] == "MetalSd"), 
-      1, 0
-    )
-    ames_data_preprocessed["exterior_hardboard"] = np.where(
-      (ames_data_preprocessed["exterior_1st"] == "HdBoard") | (ames_data_preprocessed["exterior_2nd"] == "HdBoard"), 
-      1, 0
-    )
-    ames_data_preprocessed["exterior_wood"] = np.where(
-      (ames_data_preprocessed["exterior_1st"] == "Wd Sdng") | (ames_data_preprocessed["exterior_2nd"] == "Wd Sdng"), 
-      1, 0
-    )
-    # combine bathroom variables
-    ames_data_preprocessed["bathrooms"] = ames_data_preprocessed["full_bath"] + 0.5*ames_data_preprocessed["half_bath"] + ames_data_preprocessed["bsmt_full_bath"] + 0.5*ames_data_preprocessed["bsmt_half_bath"]
-    # combine porch variables
-    ames_data_preprocessed["porch"] = np.where(
-      # if any porch variable is not equal to 0
-      (ames_data_preprocessed["open_porch_sf"] != 0) | 
-      (ames_data_preprocessed["enclosed_porch"] != 0) | 
-      (ames_data_preprocessed["3ssn_porch"] != 0) |
-      (ames_data_preprocessed["screen_porch"] != 0),
-      1, 0
-    )
-    # remove the variables we no longer need
-    ames_data_preprocessed = ames_data_preprocessed.drop(
-       columns=["roof_style",
-                "mas_vnr_type",
-                "foundation",
-                "electrical",
-                "garage_type",
-                "lot_config",
-                "condition_1",
-                "bldg_type",
-                "exterior_1st",
-                "exterior_2nd",
-                "bsmt_full_bath",
-                "bsmt_half_bath",
-                "full_bath",
-                "half_bath",
-                "open_porch_sf",
-                "enclosed_porch",
-                "3ssn_porch",
-                "screen_porch",
-                # remove basement SF sub-variables if simplifying
-                "bsmt_unf_sf",
-                "bsmtfin_sf_1",
-                "bsmtfin_sf_1",
-                # remove general SF sub-variables if simplifying
-                "1st_flr_sf", 
-                "2nd_flr_sf", 
-                "low_qual_fin_sf"])
+    recipes, drop_columns = simplify_recipes, simplify_drop_columns
   else:
-    # if simplify_vars == FALSE, still simplify, but simplify less
-    ames_data_preprocessed["gable_roof"] = np.where(ames_data_preprocessed["roof_style"] == "Gable", 1, 0)
-    ames_data_preprocessed["hip_roof"] = np.where(ames_data_preprocessed["roof_style"] == "Hip", 1, 0)
-    ames_data_preprocessed["masonry_veneer_brick_face"] = np.where(ames_data_preprocessed["mas_vnr_type"] == "BrkFace", 1, 0)
-    ames_data_preprocessed["masonry_veneer_none"] = np.where(ames_data_preprocessed["mas_vnr_type"] == "BrkCmn", 1, 0)
-    ames_data_preprocessed["masonry_veneer_stone"] = np.where(ames_data_preprocessed["mas_vnr_type"] == "Stone", 1, 0)
-    ames_data_preprocessed["foundation_brick"] = np.where(ames_data_preprocessed["foundation"] == "BrkTil", 1, 0)
-    ames_data_preprocessed["foundation_cinder"] = np.where(ames_data_preprocessed["foundation"] == "CBlock", 1, 0)
-    ames_data_preprocessed["foundation_concrete"] = np.where(ames_data_preprocessed["foundation"] == "PConc", 1, 0)
-    ames_data_preprocessed["electrical_standard"] = np.where(ames_data_preprocessed["electrical"] == "SBrkr", 1, 0)
-    ames_data_preprocessed["garage_attached"] = np.where(ames_data_preprocessed["garage_type"] == "Attchd", 1, 0)
-    ames_data_preprocessed["garage_detached"] = np.where(ames_data_preprocessed["garage_type"] == "Detchd", 1, 0)
-    ames_data_preprocessed["lot_inside"] = np.where(ames_data_preprocessed["lot_config"] == "Inside", 1, 0)
-    ames_data_preprocessed["lot_corner"] = np.where(ames_data_preprocessed["lot_config"] == "Corner", 1, 0)
-    ames_data_preprocessed["railroad_adjacent"] = np.where(ames_data_preprocessed["condition_1"].isin(["RRAe", "RRAn", "RRNe", "RRNn"]), 1, 0)
-    ames_data_preprocessed["main_street_adjacent"] = np.where(ames_data_preprocessed["condition_1"].isin(["Artery", "Feedr"]), 1, 0)
-    ames_data_preprocessed["positive_adjacent"] = np.where(ames_data_preprocessed["condition_1"].isin(["PosA", "PosN"]), 1, 0)
-    ames_data_preprocessed["single_family_house"] = np.where(ames_data_preprocessed["bldg_type"] == "1Fam", 1, 0)
-    ames_data_preprocessed["townhouse"] = np.where(ames_data_preprocessed["bldg_type"].isin(["Twnhs", "TwnhsE"]), 1, 0)
-    ames_data_preprocessed["exterior1_vinyl"] = np.where(ames_data_preprocessed["exterior_1st"] == "VinylSd", 1, 0)
-    ames_data_preprocessed["exterior1_metal"] = np.where(ames_data_preprocessed["exterior_1st"] == "MetalSd", 1, 0)
-    ames_data_preprocessed["exterior1_hardboard"] = np.where(ames_data_preprocessed["exterior_1st"] == "HdBoard", 1, 0)
-    ames_data_preprocessed["exterior1_wood"] = np.where(ames_data_preprocessed["exterior_1st"] == "Wd Sdng", 1, 0)
-    ames_data_preprocessed["exterior1_plywood"] = np.where(ames_data_preprocessed["exterior_1st"] == "Plywood", 1, 0)
-    ames_data_preprocessed["exterior1_cement"] = np.where(ames_data_preprocessed["exterior_1st"] == "CemntBd", 1, 0)
-    ames_data_preprocessed["exterior1_brick"] = np.where(ames_data_preprocessed["exterior_1st"] == "BrkFace", 1, 0)
-    ames_data_preprocessed["exterior1_wood_shing"] = np.where(ames_data_preprocessed["exterior_1st"] == "WdShing", 1, 0)
-    ames_data_preprocessed["exterior2_vinyl"] = np.where(ames_data_preprocessed["exterior_2nd"] == "VinylSd", 1, 0)
-    ames_data_preprocessed["exterior2_metal"] = np.where(ames_data_preprocessed["exterior_2nd"] == "MetalSd", 1, 0)
-    ames_data_preprocessed["exterior2_hardboard"] = np.where(ames_data_preprocessed["exterior_2nd"] == "HdBoard", 1, 0)
-    ames_data_preprocessed["exterior2_wood"] = np.where(ames_data_preprocessed["exterior_2nd"] == "Wd Sdng", 1, 0)
-    ames_data_preprocessed["exterior2_plywood"] = np.where(ames_data_preprocessed["exterior_2nd"] == "Plywood", 1, 0)
-    ames_data_preprocessed["exterior2_cement"] = np.where(ames_data_preprocessed["exterior_2nd"] == "CemntBd", 1, 0)
-    ames_data_preprocessed["exterior2_brick"] = np.where(ames_data_preprocessed["exterior_2nd"] == "BrkFace", 1, 0)
-    ames_data_preprocessed["exterior2_wood_shing"] = np.where(ames_data_preprocessed["exterior_2nd"] == "WdShing", 1, 0)
-    ames_data_preprocessed["porch_area"] = ames_data_preprocessed["open_porch_sf"] + ames_data_preprocessed["enclosed_porch"] + ames_data_preprocessed["3ssn_porch"] + ames_data_preprocessed["screen_porch"]
-
-    # remove the variables we no longer need
-    ames_data_preprocessed = ames_data_preprocessed.drop(
-       columns=["roof_style",
-                "mas_vnr_type",
-                "foundation",
-                "electrical",
-                "garage_type",
-                "lot_config",
-                "condition_1",
-                "bldg_type",
-                "exterior_1st",
-                "exterior_2nd",
-                "bsmt_full_bath",
-                "bsmt_half_bath",
-                "full_bath",
-                "half_bath",
-                "open_porch_sf",
-                "enclosed_porch",
-                "3ssn_porch",
-                "screen_porch",
-                # or remove just one of the sub-SF variables
-                "bsmt_unf_sf",
-                "low_qual_fin_sf"])
-  
+    recipes, drop_columns = simplify_less_recipes, simplify_less_drop_columns
+  for column, recipe in recipes.items():
+    ames_data_preprocessed[column] = build_column(recipe, ames_data_preprocessed.__getitem__,
+                                                  ames_data_preprocessed.index)
+  # remove the variables we no longer need
+  ames_data_preprocessed = ames_data_preprocessed.drop(columns=drop_columns)
   
-  #-------------------- Categorical to numeric -------------------------------#
+  return ames_data_preprocessed
+
+
+def convert_categorical_variables(ames_data_preprocessed, convert_categorical="numeric"):
+  ames_data_preprocessed = ames_data_preprocessed.copy()
   
   if convert_categorical in ["dummy", "none"]:
     # simplify the uncommon levels to ensure that the validation set doesn't 
-    # have levels that aren't in the training set
-
-    # zoning
-    zone_mapping = {
-      "FV": "other", "RH": "other", "RL": "low_density", "RM": "medium_density"
-    }
-    lot_mapping = {
-      "IR1": "irregular", "IR2": "irregular", "IR3": "irregular", "Reg": "regular"
-    }
-    functional_mapping = {
-      "Typ": "typical", "Maj1": "atypical", "Maj2": "atypical", "Min1": "atypical",
-      "Min2": "atypical", "Mod": "atypical"
-    }
-    exter_qual_mapping = {
-      "Ex": "good", "Gd": "good", "Fa": "average", "TA": "average"
-    }
-    exter_cond_mapping = {
-      "Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-    heating_qc_mapping = {
-      "Ex": "excellent", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-    house_style_mapping = {
-      "1.5Fin": "floors1.5", "1.5Unf": "floors1.5", "SFoyer": "floors1.5", "1Story": "floors1",
-      "2.5Fin": "floors2", "2.5Unf": "floors2", "2Story": "floors2", "SLvl": "floors2"
-    }
-    kitchen_qual_mapping = {
-      "Ex": "excellent", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-    paved_drive_mapping = {
-      "Y": "yes", "N": "no", "P": "no",
-    }
-    garage_finish_mapping = {
-      "Fin": "finish", "RFn": "finish", "Unf": "unfinished",
-    }
-    bsmt_qual_mapping = {
-      "Ex": "excellent", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-    heating_qc_mapping = {
-      "Ex": "excellent", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-    garage_qual_mapping = {
-      "Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "good"
-    }
-    garage_cond_mapping = {
-      "Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "good"
-    }
-    fireplace_qu_mapping = {
-      "Ex": "good", "Gd": "good", "Po": "poor", "Fa": "poor", "TA": "poor"
-    }
-  
-    ames_data_preprocessed["ms_zoning"] = ames_data_preprocessed["ms_zoning"].replace(zone_mapping)
-    ames_data_preprocessed["lot_shape"] = ames_data_preprocessed["lot_shape"].replace(lot_mapping)
-    ames_data_preprocessed["functional"] = ames_data_preprocessed["functional"].replace(functional_mapping)
-    ames_data_preprocessed["exter_qual"] = ames_data_preprocessed["exter_qual"].replace(exter_qual_mapping)
-    ames_data_preprocessed["exter_cond"] = ames_data_preprocessed["exter_cond"].replace(exter_cond_mapping)
-    ames_data_preprocessed["heating_qc"] = ames_data_preprocessed["heating_qc"].replace(heating_qc_mapping)
-    ames_data_preprocessed["house_style"] = ames_data_preprocessed["house_style"].replace(house_style_mapping)
-    ames_data_preprocessed["kitchen_qual"] = ames_data_preprocessed["kitchen_qual"].replace(kitchen_qual_mapping)
-    ames_data_preprocessed["paved_drive"] = ames_data_preprocessed["paved_drive"].replace(paved_drive_mapping)
-    ames_data_preprocessed["garage_finish"] = ames_data_preprocessed["garage_finish"].replace(garage_finish_mapping)
-    ames_data_preprocessed["bsmt_qual"] = ames_data_preprocessed["bsmt_qual"].replace(bsmt_qual_mapping)
-    ames_data_preprocessed["heating_qc"] = ames_data_preprocessed["heating_qc"].replace(heating_qc_mapping)
-    ames_data_preprocessed["garage_qual"] = ames_data_preprocessed["garage_qual"].replace(garage_qual_mapping)
-    ames_data_preprocessed["garage_cond"] = ames_data_preprocessed["garage_cond"].replace(garage_cond_mapping)
-    ames_data_preprocessed["fireplace_qu"] = ames_data_preprocessed["fireplace_qu"].replace(fireplace_qu_mapping)
-
+    # have levels that aren't in the training set (see lump_mappings)
+    for column, mapping in lump_mappings.items():
+      ames_data_preprocessed[column] = ames_data_preprocessed[column].replace(mapping)
 
 
   if convert_categorical == "numeric":
-    # Define mappings for different columns
-    ms_zoning_mapping = {
-        "RH": 3, "RM": 2, "RL": 1, "FV": 0
-    }
-    lot_shape_mapping = {
-        "Reg": 0, "IR1": 1, "IR2": 2, "IR3": 3
-    }
-    functional_mapping = {
-        "Typ": 8, "Min1": 7, "Min2": 6, "Mod": 5, "Maj1": 4, "Maj2": 3, "Sev": 2, "Sal": 1
-    }
-    house_style_mapping = {
-        "1Story": 1, "SFoyer": 1, "SLvl": 1, "1.5Fin": 1.5, "1.5Unf": 1.5,
-        "2Story": 2, "2.5Fin": 2.5, "2.5Unf": 2.5
-    }
-    paved_drive_mapping = {
-       "Y": 1, "P": 0, "N":-1
-    }
-    garage_finish_mapping = {
-      "Fin": 3, "RFn": 2, "Unf": 1, "other": 0
-    }
-    bsmt_exposure_mapping = {
-      "Gd": 4, "Av": 3, "Mn": 2, "No": 1, "other": 0
-    }
-    bsmtfin_type_mapping = {
-        "GLQ": 6, "ALQ": 5, "Rec": 4, "BLQ": 3, "LwQ": 2, "Unf": 1, "other": 0
-    }
-
-    # Apply the mappings using the replace() function
-    ames_data_preprocessed["residential_density"] = ames_data_preprocessed["ms_zoning"].replace(ms_zoning_mapping)
-    ames_data_preprocessed["irregular_lot_shape"] = ames_data_preprocessed["lot_shape"].replace(lot_shape_mapping)
-    ames_data_preprocessed["functional"] = ames_data_preprocessed["functional"].replace(functional_mapping)
-    ames_data_preprocessed["house_floors"] = ames_data_preprocessed["house_style"].replace(house_style_mapping)
-    ames_data_preprocessed["paved_drive"] = ames_data_preprocessed["paved_drive"].replace(paved_drive_mapping)
-    ames_data_preprocessed["garage_finish"] = ames_data_preprocessed["garage_finish"].replace(garage_finish_mapping)
-    ames_data_preprocessed["bsmt_exposure"] = ames_data_preprocessed["bsmt_exposure"].replace(bsmt_exposure_mapping)
-    ames_data_preprocessed["basement_finished_rating"] = ames_data_preprocessed["bsmtfin_type_1"].replace(bsmtfin_type_mapping)
-    ames_data_preprocessed["basement_finished_rating2"] = ames_data_preprocessed["bsmtfin_type_2"].replace(bsmtfin_type_mapping)
-
-    # For numeric columns, apply the mapping directly
-    numeric_rating_columns = ["exter_qual", "exter_cond", "heating_qc", "kitchen_qual",
-                              "bsmt_qual", "bsmt_cond", "garage_qual", "garage_cond", "fireplace_qu"]
-
-    for column in numeric_rating_columns:
-        mapping = {
-            "Ex": 5, "Gd": 4, "TA": 3, "Fa": 2, "Po": 1, "other": 0
-        }
-        ames_data_preprocessed[column] = ames_data_preprocessed[column].replace(mapping)
-
-    ames_data_preprocessed = ames_data_preprocessed.drop(
-       columns=["lot_shape", "ms_zoning", "bsmtfin_type_1", "house_style", "bsmtfin_type_2"])
+    # map the levels to numbers (see numeric_mappings)
+    for column, (source, mapping) in numeric_mappings.items():
+      ames_data_preprocessed[column] = ames_data_preprocessed[source].replace(mapping)
+    ames_data_preprocessed = ames_data_preprocessed.drop(columns=numeric_drop_columns)
     
 
   # create the dummy variables manually when simplified
   if convert_categorical == "simplified_dummy":
-    ames_data_preprocessed["residential_density_high"] = np.where(ames_data_preprocessed["ms_zoning"] == "RH", 1, 0)
-    ames_data_preprocessed["residential_density_mid"] = np.where(ames_data_preprocessed["ms_zoning"] == "RM", 1, 0)
-    ames_data_preprocessed["residential_density_low"] = np.where(ames_data_preprocessed["ms_zoning"] == "RL", 1, 0)
-    ames_data_preprocessed["residential_density_floating"] = np.where(ames_data_preprocessed["ms_zoning"] == "FV", 1, 0)
-    ames_data_preprocessed["irregular_lot_shape"] = np.where(ames_data_preprocessed["lot_shape"].isin(["IR1", "IR2", "IR3"]), 1, 0)
-    ames_data_preprocessed["home_functional"] = np.where(ames_data_preprocessed["functional"] == "Typ", 1, 0)
-    ames_data_preprocessed["exter_qual_good"] = np.where(ames_data_preprocessed["exter_qual"].isin(["Gd", "Ex"]), 1, 0)
-    ames_data_preprocessed["exter_cond_good"] = np.where(ames_data_preprocessed["exter_cond"].isin(["Gd", "Ex"]), 1, 0)
-    ames_data_preprocessed["heating_qc_ex"] = np.where(ames_data_preprocessed["heating_qc"] == "Ex", 1, 0)
-    ames_data_preprocessed["heating_qc_good"] = np.where(ames_data_preprocessed["heating_qc"] == "Gd", 1, 0)
-    ames_data_preprocessed["house_1half_story"] = np.where(ames_data_preprocessed["house_style"].isin(["1.5Fin", "1.5Unf"]), 1, 0)
-    ames_data_preprocessed["house_2story"] = np.where(ames_data_preprocessed["house_style"] == "2Story", 1, 0)
-    ames_data_preprocessed["house_2half_story"] = np.where(ames_data_preprocessed["house_style"].isin(["2.5Fin", "2.5Unf"]), 1, 0)
-    ames_data_preprocessed["kitchen_qual_good"] = np.where(ames_data_preprocessed["kitchen_qual"].isin(["Gd", "Ex"]), 1, 0)
-    ames_data_preprocessed["paved_drive"] = np.where(ames_data_preprocessed["paved_drive"] == "Y", 1, 0)
-    ames_data_preprocessed["garage_finish"] = np.where(ames_data_preprocessed["garage_finish"] == "Fin", 1, 0)
-    ames_data_preprocessed["garage_rough_finish"] = np.where(ames_data_preprocessed["garage_finish"] == "RFn", 1, 0)
-    ames_data_preprocessed["bsmt_qual_good"] = np.where(ames_data_preprocessed["bsmt_qual"].isin(["Ex", "Gd"]), 1, 0)
-    ames_data_preprocessed["bsmt_cond_good"] = np.where(ames_data_preprocessed["bsmt_cond"].isin(["Ex", "Gd"]), 1, 0)
-    ames_data_preprocessed["bsmt_exposure_good"] = np.where(ames_data_preprocessed["bsmt_exposure"] == "Gd", 1, 0)
-    ames_data_preprocessed["bsmt_exposure_avg"] = np.where(ames_data_preprocessed["bsmt_exposure"] == "Av", 1, 0)
-    ames_data_preprocessed["bsmt_exposure_min"] = np.where(ames_data_preprocessed["bsmt_exposure"] == "Mn", 1, 0)
-    ames_data_preprocessed["basement_finished_good"] = np.where(ames_data_preprocessed["bsmtfin_type_1"].isin(["GLQ", "ALQ"]), 1, 0)
-    ames_data_preprocessed["basement_finished_rec"] = np.where(ames_data_preprocessed["bsmtfin_type_1"] == "Rec", 1, 0)
-    ames_data_preprocessed["basement_finished_low"] = np.where(ames_data_preprocessed["bsmtfin_type_1"].isin(["LwQ", "BLQ"]), 1, 0)
-    ames_data_preprocessed["garage_qual_typical"] = np.where(ames_data_preprocessed["garage_qual"] == "TA", 1, 0)
-    ames_data_preprocessed["garage_cond_typical"] = np.where(ames_data_preprocessed["garage_cond"] == "TA", 1, 0)
-    ames_data_preprocessed["fireplace_qu_good"] = np.where(ames_data_preprocessed["fireplace_qu"].isin(["Ex", "Gd"]), 1, 0)
-
-    # replace missing values in these columns with 0
-    columns_to_fillna = [
-      "exter_cond_good", "heating_qc_ex", "heating_qc_good",
-      "house_1half_story", "house_2story", "house_2half_story",
-      "kitchen_qual_good", "paved_drive", "garage_finish",
-      "garage_rough_finish", "bsmt_qual_good", "bsmt_cond_good",
-      "bsmt_exposure_good", "bsmt_exposure_avg", "bsmt_exposure_min",
-      "basement_finished_good", "basement_finished_rec", "basement_finished_low",
-      "garage_qual_typical", "garage_cond_typical",
-      "fireplace_qu_good"
-    ]
-
-    # Apply fillna(0) to the specified columns
-    ames_data_preprocessed[columns_to_fillna] = ames_data_preprocessed[columns_to_fillna].fillna(0)
-
+    for column, recipe in simplified_dummy_recipes.items():
+      ames_data_preprocessed[column] = build_column(recipe, ames_data_preprocessed.__getitem__,
+                                                    ames_data_preprocessed.index)
     # remove variables we no longer need
-    ames_data_preprocessed = ames_data_preprocessed.drop(columns=[
-       "functional",
-        "exter_qual",
-        "exter_cond",
-        "lot_shape", 
-        "heating_qc",
-        "ms_zoning", 
-        "kitchen_qual",
-        "bsmtfin_type_1",
-        "garage_qual",
-        "garage_cond",
-        "fireplace_qu",
-        "heating_qc",
-        "bsmt_exposure",
-        "bsmt_cond",
-        "bsmt_qual",
-        "house_style",
-        "bsmtfin_type_2"
-    ])
+    ames_data_preprocessed = ames_data_preprocessed.drop(columns=simplified_dummy_drop_columns)
 
 
   # create the dummy variables using pd.get_dummies() when not simplified
@@ -428,42 +434,30 @@ def preprocess_ames_data(ames_data_clean,
 
     ames_data_preprocessed = pd.get_dummies(
       ames_data_preprocessed, 
-      columns=[
-        "functional",
-        "exter_qual",
-        "exter_cond",
-        "lot_shape",
-        "heating_qc",
-        "ms_zoning",
-        "kitchen_qual",
-        "bsmtfin_type_1",
-        "garage_qual",
-        "garage_cond",
-        "fireplace_qu",
-        "bsmt_exposure",
-        "bsmt_cond",
-        "bsmt_qual",
-        "house_style",
-        "bsmtfin_type_2"
-      ],        
+      columns=dummy_vars,
       drop_first=True
     )
-        
   
-  
-  
-  #------------------------ Handle identical values --------------------------#
-  
-  if len(column_selection) == 0:
-    # get the proportion of the the most common value for each var
-    prop_identical = ames_data_preprocessed.apply(lambda col: col.value_counts().values[0] / len(ames_data_preprocessed.index))
-    vars_to_keep_nonidentical = prop_identical < max_identical_thresh
+  return ames_data_preprocessed
+
 
-    # remove the variables above the threshold
-    ames_data_preprocessed = ames_data_preprocessed.loc[:,vars_to_keep_nonidentical]
+def remove_identical_columns(ames_data_preprocessed, max_identical_thresh, column_stats=None):
+  # get the proportion of the the most common value for each var
+  if column_stats is None:
+    prop_identical = count_top_values(ames_data_preprocessed) / len(ames_data_preprocessed.index)
+  else:
+    prop_identical = column_stats["prop_identical"]
+  vars_to_keep_nonidentical = prop_identical < max_identical_thresh
 
+  # remove the variables above the threshold
+  ames_data_preprocessed = ames_data_preprocessed.loc[:,vars_to_keep_nonidentical]
   
-  #------------------------- Transformations ---------------------------------#
+  return ames_data_preprocessed
+
+
+def transform_variables(ames_data_preprocessed, transform_response="none", log_transform_predictors=None):
+  if transform_response != "none" or log_transform_predictors != None:
+    ames_data_preprocessed = ames_data_preprocessed.copy()
   
   # conduct log transformations
   if transform_response == "log":
@@ -477,29 +471,29 @@ def preprocess_ames_data(ames_data_clean,
     # log_transform_predictors should be a vector of predictors to transform
     ames_data_preprocessed[log_transform_predictors] = np.log(ames_data_preprocessed[log_transform_predictors])
   
-  
-  #----------------------- Correlation feature selection ---------------------#
+  return ames_data_preprocessed
 
-  # select only features that are at least 0.5 correlated with response
-  if (cor_feature_selection_threshold != None) & (len(column_selection) == 0):
-    # compute pairwise correlations
-    cor_saleprice = ames_data_preprocessed.select_dtypes(include="number") \
-      .corr() \
-      .drop(index=["saleprice"])
-    # extract sale price correlations
-    cor_saleprice = cor_saleprice["saleprice"]
-    
-    # identify variables whose corr with sale price is above the threshold
-    high_cor_vars = cor_saleprice[(np.abs(cor_saleprice) >= cor_feature_selection_threshold)].index
-    high_cor_vars = list(high_cor_vars)
-    high_cor_vars.extend(["neighborhood", "saleprice"])
-    # filter to just the highly correlated vars
-    ames_data_preprocessed = ames_data_preprocessed[high_cor_vars]
-    
-  
+
+def select_correlated_columns(ames_data_preprocessed, cor_feature_selection_threshold, column_stats=None):
+  # compute the correlation of each numeric variable with sale price (rather
+  # than the full correlation matrix)
+  if column_stats is None:
+    cor_saleprice = response_correlations(ames_data_preprocessed, "saleprice")
+  else:
+    cor_saleprice = column_stats["cor_saleprice"]
+  cor_saleprice = cor_saleprice.dropna().drop(index=["saleprice"])
   
-  #--------------------------------- Tidying up ------------------------------#
+  # identify variables whose corr with sale price is above the threshold
+  high_cor_vars = cor_saleprice[(np.abs(cor_saleprice) >= cor_feature_selection_threshold)].index
+  high_cor_vars = list(high_cor_vars)
+  high_cor_vars.extend(["neighborhood", "saleprice"])
+  # filter to just the highly correlated vars
+  ames_data_preprocessed = ames_data_preprocessed[high_cor_vars]
   
+  return ames_data_preprocessed
+
+
+def tidy_columns(ames_data_preprocessed, neighborhood_dummy=True, column_selection=[]):
   # create neighborhood dummy variables
   if neighborhood_dummy == True:
     ames_data_preprocessed = pd.get_dummies(
@@ -517,5 +511,58 @@ def preprocess_ames_data(ames_data_clean,
   
   # remove unneeded columns
   ames_data_preprocessed = ames_data_preprocessed.drop(columns=["date", "order", "ms_subclass"], errors='ignore')
-    
+  
   return ames_data_preprocessed
+
+
+
+#--------------------------- Column statistics -------------------------------#
+
+# The filter stages above (remove_missing_columns(), remove_identical_columns()
+# and select_correlated_columns()) only depend on one statistic for each column,
+# so these statistics can be computed once for a data frame with
+# column_statistics(), and passed to the filter stages as `column_stats` to try
+# several thresholds without recomputing them (as perturb_ames_data() does).
+
+
+def column_statistics(ames_data_preprocessed, response="saleprice"):
+  # the proportion of missing values, the proportion of the most common value
+  # and the correlation with the response (NaN for non-numeric columns) of each
+  # column
+  n_rows = len(ames_data_preprocessed.index)
+  return pd.DataFrame({"prop_missing": pd.isna(ames_data_preprocessed).sum() / n_rows,
+                       "prop_identical": count_top_values(ames_data_preprocessed) / n_rows,
+                       "cor_" + response: response_correlations(ames_data_preprocessed, response)})
+
+
+def count_top_values(ames_data_preprocessed):
+  # the number of times that the most common (non-missing) value of each column
+  # appears (the same as col.value_counts().values[0])
+  top_counts = {}
+  for column, values in ames_data_preprocessed.items():
+    codes, _ = pd.factorize(values)
+    codes = codes[codes >= 0]
+    top_counts[column] = np.bincount(codes).max() if len(codes) > 0 else 0
+  return pd.Series(top_counts, index=ames_data_preprocessed.columns, dtype=float)
+
+
+def response_correlations(ames_data_preprocessed, response="saleprice"):
+  # the correlation of each numeric column with the response, using the rows
+  # where both are observed (the same as the response column of
+  # select_dtypes(include="number").corr(), without computing the rest of the
+  # correlation matrix). Non-numeric columns (and every column, if there is no
+  # response column) have a correlation of NaN.
+  if response not in ames_data_preprocessed.columns:
+    return pd.Series(np.nan, index=ames_data_preprocessed.columns)
+  numeric_columns = ames_data_preprocessed.select_dtypes(include="number").columns
+  x = ames_data_preprocessed[numeric_columns].to_numpy(dtype=float)
+  y = ames_data_preprocessed[response].to_numpy(dtype=float)[:, np.newaxis]
+  observed = ~np.isnan(x) & ~np.isnan(y)
+  n_observed = observed.sum(axis=0)
+  with np.errstate(invalid="ignore", divide="ignore"):
+    x_deviations = np.where(observed, x - np.where(observed, x, 0).sum(axis=0) / n_observed, 0)
+    y_deviations = np.where(observed, y - np.where(observed, y, 0).sum(axis=0) / n_observed, 0)
+    correlations = (x_deviations * y_deviations).sum(axis=0) / \
+      np.sqrt((x_deviations ** 2).sum(axis=0) * (y_deviations ** 2).sum(axis=0))
+  correlations = np.clip(correlations, -1, 1)
+  return pd.Series(correlations, index=numeric_columns).reindex(ames_data_preprocessed.columns)
@@ -0,0 +1,77 @@
+# Cross-validated regularization paths for ridge and lasso regression
+#
+# ridge_path_cv() and lasso_path_cv() compute the same table of CV scores as
+# fitting Ridge(alpha=alpha) or Lasso(alpha=alpha) with
+# cross_validate(..., cv=n_folds, scoring='neg_root_mean_squared_error') for
+# each alpha separately, but fit the whole grid of alphas for each fold at once:
+#   - ridge: the ridge coefficients for every alpha can be computed from a
+#     single SVD of the (centered) training data in each fold
+#   - lasso: the coefficients for every alpha are computed with sklearn's
+#     lasso_path(), which warm-starts the coordinate descent for each alpha
+#     from the solution for the previous (larger) alpha
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import lasso_path
+from sklearn.model_selection import KFold
+
+
+# compute the mean (across folds) of the validation RMSE for each alpha, where
+# fit_path(X_train, y_train, alphas) returns the (n_features x n_alphas)
+# coefficients fit to the centered training data
+def path_cv_scores(X, y, alphas, fit_path, n_folds=10):
+  X = np.asarray(X, dtype=float)
+  y = np.asarray(y, dtype=float)
+  alphas = np.asarray(alphas, dtype=float)
+  fold_rmse = []
+  for train_index, test_index in KFold(n_splits=n_folds).split(X):
+    # center the training data (as Ridge and Lasso do when fitting the intercept)
+    X_mean = X[train_index].mean(axis=0)
+    y_mean = y[train_index].mean()
+    coefs = fit_path(X[train_index] - X_mean, y[train_index] - y_mean, alphas)
+    # the predictions for every alpha (one column per alpha)
+    y_pred = (X[test_index] - X_mean) @ coefs + y_mean
+    fold_rmse.append(np.sqrt(np.mean((y[test_index, np.newaxis] - y_pred) ** 2, axis=0)))
+  return pd.DataFrame({'alpha': alphas,
+                       'log_alpha': np.log(alphas),
+                       'test_mse': np.mean(fold_rmse, axis=0)})
+
+
+def fit_ridge_path(X_centered, y_centered, alphas):
+  U, s, Vt = np.linalg.svd(X_centered, full_matrices=False)
+  # the ridge coefficients are V diag(s / (s^2 + alpha)) U'y
+  shrinkage = s[:, np.newaxis] / (s[:, np.newaxis] ** 2 + alphas[np.newaxis, :])
+  return Vt.T @ (shrinkage * (U.T @ y_centered)[:, np.newaxis])
+
+
+def fit_lasso_path(X_centered, y_centered, alphas):
+  # lasso_path() fits the alphas from largest to smallest
+  order = np.argsort(-alphas)
+  _, coefs, _ = lasso_path(X_centered, y_centered, alphas=alphas[order])
+  coefs_ordered = np.empty_like(coefs)
+  coefs_ordered[:, order] = coefs
+  return coefs_ordered
+
+
+
+# the CV scores for Ridge(alpha=alpha) for each alpha in `alphas`
+def ridge_path_cv(X, y, alphas, n_folds=10):
+  return path_cv_scores(X, y, alphas, fit_ridge_path, n_folds=n_folds)
+
+
+# the CV scores for Lasso(alpha=alpha) for each alpha in `alphas`
+def lasso_path_cv(X, y, alphas, n_folds=10):
+  return path_cv_scores(X, y, alphas, fit_lasso_path, n_folds=n_folds)
+
+
+
+# choose the alpha with the smallest CV score, and the largest alpha whose CV
+# score is within one standard error of the smallest CV score (the standard
+# error is computed across the alphas, as in 07_prediction_combine)
+def select_alpha(cv_scores, n_folds=10):
+  alpha_min = cv_scores.sort_values(by='test_mse').head(1).alpha.values[0]
+  mse_se = cv_scores['test_mse'].std() / np.sqrt(n_folds)
+  mse_min = cv_scores['test_mse'].min()
+  alpha_1se = cv_scores[(cv_scores['test_mse'] <= mse_min + mse_se) &
+                        (cv_scores['test_mse'] >= mse_min - mse_se)] \
+    .sort_values(by='alpha', ascending=False).head(1).alpha.values[0]
+  return alpha_min, alpha_1se
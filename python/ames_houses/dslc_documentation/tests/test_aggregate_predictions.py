@@ -0,0 +1,61 @@
+# Tests for PredictionAggregator.merge() (see functions/aggregate_predictions.py)
+#
+# Run from the dslc_documentation directory with: python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from functions.aggregate_predictions import PredictionAggregator
+
+
+def test_merge_with_shared_bin_edges():
+  rng = np.random.default_rng(0)
+  preds = rng.normal(200000, 20000, size=(40, 5))
+  bin_edges = np.linspace(100000, 300000, 1001)
+  # two workers that see different predictions, and one that hasn't seen any
+  # predictions yet (so has no bins of its own)
+  first = PredictionAggregator(bin_edges=bin_edges).update(preds[:25])
+  second = PredictionAggregator(bin_edges=bin_edges).update(preds[25:])
+  merged = PredictionAggregator(n_houses=5).merge(first).merge(second)
+  combined = PredictionAggregator(bin_edges=bin_edges).update(preds)
+
+  assert merged.n_fits == 40
+  assert np.array_equal(merged.bin_edges, bin_edges)
+  assert np.array_equal(merged.bin_counts, combined.bin_counts)
+  np.testing.assert_allclose(merged.mean, preds.mean(axis=0))
+  np.testing.assert_allclose(merged.summary().to_numpy(), combined.summary().to_numpy())
+
+
+def test_merge_adopts_the_bins_of_the_other_aggregator():
+  preds = np.arange(10, dtype=float).reshape(2, 5)
+  other = PredictionAggregator().update(preds)
+  merged = PredictionAggregator(n_houses=5).merge(other)
+  assert np.array_equal(merged.bin_edges, other.bin_edges)
+  np.testing.assert_allclose(merged.quantile(0.5), other.quantile(0.5))
+
+
+def test_merge_with_different_default_bins_fails():
+  first = PredictionAggregator().update(np.full((1, 3), 100.0))
+  second = PredictionAggregator().update(np.full((1, 3), 500.0))
+  with pytest.raises(ValueError, match="explicit bin_edges"):
+    first.merge(second)
+
+
+def test_merge_adopts_a_different_number_of_bins():
+  rng = np.random.default_rng(1)
+  preds = rng.random((5, 3))
+  bin_edges = np.linspace(0, 1, 11)
+  other = PredictionAggregator(bin_edges=bin_edges).update(preds)
+  merged = PredictionAggregator().merge(other)
+  assert merged.n_bins == 10
+  assert np.array_equal(merged.bin_counts, other.bin_counts)
+  np.testing.assert_allclose(merged.quantile(0.5), other.quantile(0.5))
+  # an aggregator without any predictions (with the default number of bins)
+  # can also be merged into it
+  merged.merge(PredictionAggregator(n_houses=3))
+  assert merged.n_fits == 5
+  assert np.array_equal(merged.bin_counts, other.bin_counts)
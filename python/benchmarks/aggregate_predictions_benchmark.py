@@ -0,0 +1,77 @@
+# Benchmark: PredictionAggregator vs a long data frame of every prediction
+#
+# Simulates the (back-transformed) test set predictions of many screened
+# perturbation x bootstrap fits, and computes the ensemble (mean) prediction and
+# the spread of the predictions (SD, 5% and 95% quantiles) of each house both by
+# concatenating one data frame per fit and using groupby("house"), as in
+# 07_prediction_combine, and by folding each fit into a PredictionAggregator.
+# Reports the time, the peak memory (measured with tracemalloc) and the
+# largest differences for an increasing number of fits.
+#
+# Run from anywhere with: python python/benchmarks/aggregate_predictions_benchmark.py
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.aggregate_predictions import PredictionAggregator
+
+n_houses = 1000
+
+
+# the predictions of each fit, generated one fit at a time
+def simulate_fits(n_fits, seed=0):
+  rng = np.random.default_rng(seed)
+  house_prices = rng.lognormal(12, 0.4, n_houses)
+  for _ in range(n_fits):
+    yield house_prices * rng.lognormal(0, 0.1, n_houses)
+
+
+def long_table_summary(n_fits):
+  pred_df = pd.concat([pd.DataFrame({"pred": pred,
+                                     "house": np.arange(n_houses),
+                                     "perturb_index": i})
+                       for i, pred in enumerate(simulate_fits(n_fits))])
+  grouped = pred_df.groupby("house")["pred"]
+  return pd.DataFrame({"mean": grouped.mean(),
+                       "sd": grouped.std(),
+                       "lower": grouped.quantile(0.05),
+                       "upper": grouped.quantile(0.95)})
+
+
+def aggregator_summary(n_fits):
+  aggregator = PredictionAggregator(n_houses)
+  for pred in simulate_fits(n_fits):
+    aggregator.update(pred)
+  return aggregator.summary(coverage=0.9), aggregator
+
+
+def measure(fun, *args):
+  tracemalloc.start()
+  start = time.perf_counter()
+  result = fun(*args)
+  elapsed = time.perf_counter() - start
+  peak = tracemalloc.get_traced_memory()[1] / 1e6
+  tracemalloc.stop()
+  return result, elapsed, peak
+
+
+print("%d houses" % n_houses)
+print("%8s %12s %12s %12s %12s %10s %14s" % ("n_fits", "long_s", "long_mb", "stream_s",
+                                             "stream_mb", "mean_diff", "quantile_bins"))
+for n_fits in [100, 1000, 5000]:
+  long_summary, long_s, long_mb = measure(long_table_summary, n_fits)
+  (summary, aggregator), stream_s, stream_mb = measure(aggregator_summary, n_fits)
+  mean_diff = np.abs(summary["mean"].to_numpy() - long_summary["mean"].to_numpy()).max()
+  # the largest quantile difference, in histogram bin widths
+  quantile_bins = max(np.abs(summary[col].to_numpy() - long_summary[col].to_numpy()).max()
+                      for col in ["lower", "upper"]) / np.diff(aggregator.bin_edges)[0]
+  print("%8d %12.2f %12.1f %12.2f %12.1f %10.1e %14.2f" % (n_fits, long_s, long_mb, stream_s,
+                                                           stream_mb, mean_diff, quantile_bins))
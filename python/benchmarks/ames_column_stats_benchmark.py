@@ -0,0 +1,123 @@
+# Benchmark: column screening statistics for preprocess_ames_data()
+#
+# 1. On a wide simulated assessor-style table (thousands of numeric and
+#    categorical columns), compares the original screening code (pd.isna().sum(),
+#    apply(value_counts) and the full select_dtypes("number").corr() matrix) with
+#    column_statistics(), and the time to re-threshold the statistics for a grid
+#    of max_identical_thresh and cor_feature_selection_threshold values.
+# 2. Times perturb_ames_data() on the Ames training data for a grid of filter
+#    thresholds (the statistics are shared by perturbations with the same
+#    upstream data frame).
+#
+# Run from anywhere with: python python/benchmarks/ames_column_stats_benchmark.py
+import os
+import sys
+import time
+import warnings
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.preprocess_ames_data import column_statistics, preprocess_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+n_rows = 5000
+n_numeric = 3000
+n_categorical = 500
+identical_thresholds = [0.65, 0.8, 0.95, 1]
+cor_thresholds = [0, 0.1, 0.3, 0.5]
+
+
+def simulate_wide_data(seed=0):
+  rng = np.random.default_rng(seed)
+  saleprice = rng.lognormal(12, 0.4, n_rows)
+  numeric = rng.normal(size=(n_rows, n_numeric)) + \
+    np.log(saleprice)[:, np.newaxis] * rng.uniform(0, 2, n_numeric)
+  # a few columns that are mostly identical, and some missing values
+  numeric[:, ::10] = np.round(numeric[:, ::10] / 4)
+  numeric[rng.random(numeric.shape) < 0.02] = np.nan
+  columns = {"saleprice": saleprice}
+  columns.update({"x%d" % j: numeric[:, j] for j in range(n_numeric)})
+  for j in range(n_categorical):
+    levels = np.array(["level_%d" % level for level in range(rng.integers(2, 20))])
+    columns["c%d" % j] = levels[rng.zipf(1.5, n_rows) % len(levels)]
+  return pd.DataFrame(columns)
+
+
+# the screening statistics, as computed by the original filter stages
+def original_statistics(data):
+  prop_missing = pd.isna(data).sum() / len(data.index)
+  prop_identical = data.apply(lambda col: col.value_counts().values[0] / len(data.index))
+  cor_saleprice = data.select_dtypes(include="number").corr().drop(index=["saleprice"])["saleprice"]
+  return prop_missing, prop_identical, cor_saleprice
+
+
+def rethreshold(prop_identical, cor_saleprice):
+  cor_saleprice = cor_saleprice.dropna().drop(index=["saleprice"], errors="ignore")
+  return [(list(prop_identical.index[prop_identical < identical]),
+           list(cor_saleprice.index[np.abs(cor_saleprice) >= cor]))
+          for identical, cor in product(identical_thresholds, cor_thresholds)]
+
+
+wide_data = simulate_wide_data()
+print("wide data: %d rows x %d columns" % wide_data.shape)
+
+start = time.perf_counter()
+prop_missing, prop_identical, cor_saleprice = original_statistics(wide_data)
+original_s = time.perf_counter() - start
+# the original filter stages recompute the statistics for every threshold pair
+original_grid_s = original_s * len(identical_thresholds) * len(cor_thresholds)
+
+start = time.perf_counter()
+column_stats = column_statistics(wide_data)
+stats_s = time.perf_counter() - start
+start = time.perf_counter()
+rethreshold(column_stats["prop_identical"], column_stats["cor_saleprice"])
+rethreshold_s = time.perf_counter() - start
+
+pd.testing.assert_series_equal(column_stats["prop_missing"], prop_missing, check_names=False)
+pd.testing.assert_series_equal(column_stats["prop_identical"], prop_identical, check_names=False)
+print("max correlation difference: %.1e" %
+      (column_stats["cor_saleprice"][cor_saleprice.index] - cor_saleprice).abs().max())
+
+n_grid = len(identical_thresholds) * len(cor_thresholds)
+print("%-42s %10s" % ("", "time_s"))
+print("%-42s %10.2f" % ("original statistics (once)", original_s))
+print("%-42s %10.2f" % ("column_statistics() (once)", stats_s))
+print("%-42s %10.2f" % ("original, %d threshold pairs (est.)" % n_grid, original_grid_s))
+print("%-42s %10.2f" % ("column_statistics() + %d re-thresholds" % n_grid, stats_s + rethreshold_s))
+
+
+# perturbations of the Ames training data that differ in their filter thresholds
+path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_train.csv")
+ames_train_clean = clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+perturb_options = pd.DataFrame(list(product([0.5, 0.8, 1],
+                                            identical_thresholds,
+                                            cor_thresholds,
+                                            ["numeric", "dummy"])),
+                               columns=("max_missing_thresh",
+                                        "max_identical_thresh",
+                                        "cor_feature_selection_threshold",
+                                        "convert_categorical"))
+options_list = perturb_options.to_dict("records")
+
+start = time.perf_counter()
+ames_jc_perturb = [preprocess_ames_data(ames_train_clean, **options) for options in options_list]
+function_s = time.perf_counter() - start
+start = time.perf_counter()
+perturbed = perturb_ames_data(ames_train_clean, perturb_options)
+engine_s = time.perf_counter() - start
+for ames_data, ames_data_function in zip(perturbed, ames_jc_perturb):
+  pd.testing.assert_frame_equal(ames_data, ames_data_function)
+
+print("\n%d Ames threshold perturbations" % len(options_list))
+print("%-42s %10.2f" % ("one preprocess_ames_data() call each", function_s))
+print("%-42s %10.2f" % ("perturb_ames_data()", engine_s))
@@ -0,0 +1,81 @@
+# Benchmark: AmesPreprocessor.transform() vs re-running preprocess_ames_data()
+#
+# Compares the two ways of preprocessing the validation and test sets:
+# calling preprocess_ames_data() again with the training columns and
+# neighborhoods (the original approach in prepare_ames_data.py), and applying
+# the plan compiled by a fitted AmesPreprocessor. Also checks that both give
+# exactly the same result.
+#
+# Run from anywhere with: python python/benchmarks/ames_preprocessor_benchmark.py
+import os
+import sys
+import timeit
+import warnings
+
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.preprocess_ames_data import preprocess_ames_data
+from functions.ames_preprocessor import AmesPreprocessor
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def load_split(name):
+  path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_%s.csv" % name)
+  return clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+
+ames_train_clean = load_split("train")
+ames_val_clean = load_split("val")
+ames_test_clean = load_split("test")
+
+# the default options, plus the judgment call selected in 07_prediction_combine
+option_sets = {
+  "default": {},
+  "selected": dict(max_identical_thresh=0.95, n_neighborhoods=20,
+                   impute_missing_categorical="mode", simplify_vars=False,
+                   transform_response="sqrt", cor_feature_selection_threshold=0,
+                   convert_categorical="numeric"),
+  "dummy": dict(convert_categorical="dummy", simplify_vars=False)
+}
+
+n_repeats = 20
+print("%-10s %-6s %12s %12s %8s" % ("options", "split", "function_ms", "transform_ms", "speedup"))
+for label, options in option_sets.items():
+  preprocessor = AmesPreprocessor(**options)
+  preprocessor.fit(ames_train_clean)
+
+  for split, ames_clean in [("val", ames_val_clean), ("test", ames_test_clean)]:
+    def run_function():
+      return preprocess_ames_data(ames_clean,
+                                  column_selection=preprocessor.column_selection,
+                                  neighborhood_levels=preprocessor.neighborhood_levels,
+                                  **options)
+    def run_transform():
+      return preprocessor.transform(ames_clean)
+
+    pd.testing.assert_frame_equal(run_transform(), run_function())
+
+    function_time = min(timeit.repeat(run_function, number=1, repeat=n_repeats))
+    transform_time = min(timeit.repeat(run_transform, number=1, repeat=n_repeats))
+    print("%-10s %-6s %12.2f %12.2f %7.1fx" % (label, split, 1000 * function_time,
+                                               1000 * transform_time,
+                                               function_time / transform_time))
+
+# scoring many new houses: a large batch made by repeating the test set
+ames_big = pd.concat([ames_test_clean] * 50)
+preprocessor = AmesPreprocessor().fit(ames_train_clean)
+function_time = min(timeit.repeat(
+  lambda: preprocess_ames_data(ames_big,
+                               column_selection=preprocessor.column_selection,
+                               neighborhood_levels=preprocessor.neighborhood_levels),
+  number=1, repeat=5))
+transform_time = min(timeit.repeat(lambda: preprocessor.transform(ames_big), number=1, repeat=5))
+print("%-10s %-6s %12.2f %12.2f %7.1fx" % ("default", "%dk" % (len(ames_big) // 1000),
+                                           1000 * function_time, 1000 * transform_time,
+                                           function_time / transform_time))
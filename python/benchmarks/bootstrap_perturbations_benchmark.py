@@ -0,0 +1,99 @@
+# Benchmark: bootstrap_perturbations() vs the df.sample() bootstrap loop
+#
+# Fits LS and RF (20 trees) to bootstrap samples of 24 perturbed Ames training
+# sets and computes the validation set predictions of every fit, both with the
+# loop from 07_prediction_combine (a resampled copy of each data frame, keeping
+# every fitted model, then predicting) and with bootstrap_perturbations()
+# (index-based samples, keeping only the predictions). Reports the time and the
+# pickled size of what each approach keeps, and then the time for 100 bootstrap
+# samples with bootstrap_perturbations(). Also checks that the index-based
+# samples are reproducible across different numbers of jobs and batch sizes.
+#
+# Run from anywhere with: python python/benchmarks/bootstrap_perturbations_benchmark.py
+import os
+import pickle
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+from functions.bootstrap_perturbations import bootstrap_perturbations
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def load_clean(split):
+  path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_%s.csv" % split)
+  return clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+
+# the original approach from 07_prediction_combine (plus computing the predictions)
+def bootstrap_loop(data_list, new_data_list, model, n_boot):
+  boot_fit = []
+  for i in range(n_boot):
+    data_boot = [df.sample(n=df.shape[0], replace=True) for df in data_list]
+    for df in data_boot:
+      boot_fit.append(model().fit(X=df.drop(columns='saleprice'), y=df['saleprice']))
+  boot_pred = [fit.predict(new_data_list[i % len(data_list)].drop(columns='saleprice'))
+               for i, fit in enumerate(boot_fit)]
+  return boot_fit, boot_pred
+
+
+perturb_options = [dict(max_identical_thresh=max_identical_thresh, n_neighborhoods=n_neighborhoods,
+                        impute_missing_categorical=impute, convert_categorical=convert,
+                        cor_feature_selection_threshold=0)
+                   for max_identical_thresh in [0.65, 0.8, 0.95]
+                   for n_neighborhoods in [10, 20]
+                   for impute in ['other', 'mode']
+                   for convert in ['numeric', 'dummy']]
+ames_train_perturb = perturb_ames_data(load_clean("train"), perturb_options)
+ames_val_perturb = perturb_ames_data(load_clean("val"), perturb_options,
+                                     train_perturbations=ames_train_perturb)
+n_data = len(ames_train_perturb)
+n_jobs = joblib.cpu_count()
+
+print("%d datasets (%dx%d to %dx%d), %d cores" % (n_data, *ames_train_perturb[0].shape,
+                                                  *ames_train_perturb[-1].shape, n_jobs))
+print("%-5s %6s %10s %10s %8s %12s %12s" % ("model", "n_boot", "loop_s", "engine_s", "speedup",
+                                             "loop_kept", "engine_kept"))
+for label, model, n_boot in [("ls", LinearRegression, 10),
+                             ("rf", lambda: RandomForestRegressor(n_estimators=20), 10)]:
+  start = time.perf_counter()
+  loop_fit, loop_pred = bootstrap_loop(ames_train_perturb, ames_val_perturb, model, n_boot)
+  loop_s = time.perf_counter() - start
+  start = time.perf_counter()
+  boot_pred = bootstrap_perturbations(ames_train_perturb, {label: model()}, response='saleprice',
+                                      new_data_list=ames_val_perturb, n_boot=n_boot,
+                                      n_jobs=n_jobs)[label]
+  engine_s = time.perf_counter() - start
+  print("%-5s %6d %10.2f %10.2f %7.1fx %10.1fMB %10.1fMB" % (
+    label, n_boot, loop_s, engine_s, loop_s / engine_s,
+    len(pickle.dumps((loop_fit, loop_pred))) / 1e6, len(pickle.dumps(boot_pred)) / 1e6))
+
+start = time.perf_counter()
+boot_pred = bootstrap_perturbations(ames_train_perturb, {"ls": LinearRegression()},
+                                    response='saleprice', new_data_list=ames_val_perturb,
+                                    n_boot=100, n_jobs=n_jobs)["ls"]
+print("%-5s %6d %10s %10.2f %8s %12s %10.1fMB" % ("ls", 100, "", time.perf_counter() - start, "",
+                                                 "", len(pickle.dumps(boot_pred)) / 1e6))
+
+# the same bootstrap samples are drawn for any number of jobs and batch size
+boot_pred_1 = bootstrap_perturbations(ames_train_perturb[:4], {"ls": LinearRegression()},
+                                      response='saleprice', new_data_list=ames_val_perturb[:4],
+                                      n_boot=20, n_jobs=1, batch_size=20)["ls"]
+boot_pred_2 = bootstrap_perturbations(ames_train_perturb[:4], {"ls": LinearRegression()},
+                                      response='saleprice', new_data_list=ames_val_perturb[:4],
+                                      n_boot=20, n_jobs=2, batch_size=3)["ls"]
+print("reproducible:", all(np.array_equal(pred_1, pred_2)
+                           for pred_1, pred_2 in zip(boot_pred_1, boot_pred_2)))
@@ -0,0 +1,95 @@
+# Benchmark: clean_food_data() vs the original join-then-filter implementation
+#
+# Simulates FoodData Central-shaped tables (the size of the April 2020 dump: 5.4M
+# nutrient amounts for 350k foods, most of them branded foods with ~14 nutrients
+# each) and cleans the branded_food data with the original implementation (two
+# left joins of the full nutrient amount data, then filtering and
+# groupby().mean().unstack()) and with clean_food_data() (filtering by data type
+# first, integer codes and sparse accumulation). Reports the time and the peak
+# memory allocated (measured with tracemalloc in a separate run), and then the
+# time to clean all six data types one at a time vs with clean_food_data_all().
+# Also checks that the results have the same foods, nutrients and missing
+# values, and reports the largest difference between the means (which can
+# differ in the last bit, since pandas sums the amounts with compensated
+# summation).
+#
+# Run from anywhere with: python python/benchmarks/clean_food_data_benchmark.py [n_foods]
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+nutrition_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "nutrition", "dslc_documentation")
+sys.path.insert(0, nutrition_dir)
+
+from functions.clean_food_data import clean_food_data, clean_food_data_all, select_data_type_options
+from synthetic_data import simulate_food_data
+
+
+# the original implementation
+def clean_food_data_orig(nutrient_amount_data, food_name_data, nutrient_name_data,
+                         select_data_type="survey_fndds_food"):
+  nutrient_amount_lite = nutrient_amount_data[["fdc_id", "nutrient_id", "amount"]]
+  food_name_lite = food_name_data[["fdc_id", "data_type", "description"]]
+  food_clean = nutrient_amount_lite.merge(food_name_lite, on="fdc_id", how="left") \
+    .merge(nutrient_name_data, on="nutrient_id", how="left")
+  food_clean = food_clean.query("data_type == @select_data_type")
+  food_index = food_clean.description.drop_duplicates()
+  food_clean = (
+    food_clean[["description", "amount", "nutrient_name"]].drop_duplicates()
+      .dropna(subset="nutrient_name")
+      .groupby(["description", "nutrient_name"])["amount"].mean()
+      .unstack()
+  )
+  food_clean.columns.name = None
+  food_clean = food_clean.reindex(index=food_index)
+  return food_clean
+
+
+def timed(fun):
+  start = time.perf_counter()
+  result = fun()
+  return time.perf_counter() - start, result
+
+
+def peak_memory(fun):
+  tracemalloc.start()
+  fun()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+n_foods = int(sys.argv[1]) if len(sys.argv) > 1 else 350000
+rng = np.random.default_rng(0)
+nutrient_amount, food, nutrient_name = simulate_food_data(n_foods, rng)
+print("%d nutrient amounts, %d foods" % (len(nutrient_amount), len(food)))
+
+orig_s, food_orig = timed(lambda: clean_food_data_orig(nutrient_amount, food, nutrient_name, "branded_food"))
+new_s, food_new = timed(lambda: clean_food_data(nutrient_amount, food, nutrient_name, "branded_food"))
+sparse_s, food_sparse = timed(lambda: clean_food_data(nutrient_amount, food, nutrient_name, "branded_food",
+                                                      sparse=True))
+orig_peak = peak_memory(lambda: clean_food_data_orig(nutrient_amount, food, nutrient_name, "branded_food"))
+new_peak = peak_memory(lambda: clean_food_data(nutrient_amount, food, nutrient_name, "branded_food"))
+sparse_peak = peak_memory(lambda: clean_food_data(nutrient_amount, food, nutrient_name, "branded_food",
+                                                  sparse=True))
+
+print("branded_food (%dx%d):" % food_new.shape)
+print("  %-26s %8s %12s" % ("", "time_s", "peak_MB"))
+print("  %-26s %8.2f %12.0f" % ("original", orig_s, orig_peak / 1e6))
+print("  %-26s %8.2f %12.0f" % ("clean_food_data", new_s, new_peak / 1e6))
+print("  %-26s %8.2f %12.0f" % ("clean_food_data(sparse)", sparse_s, sparse_peak / 1e6))
+print("  same foods/nutrients/missing values:",
+      food_orig.index.equals(food_new.index) and food_orig.columns.equals(food_new.columns)
+      and food_orig.isna().equals(food_new.isna()) and food_sparse.sparse.to_dense().equals(food_new))
+print("  max relative difference: %.1e" % np.nanmax(np.abs(food_orig.to_numpy() - food_new.to_numpy()) /
+                                                   np.maximum(np.abs(food_orig.to_numpy()), 1e-300)))
+
+orig_s, _ = timed(lambda: [clean_food_data_orig(nutrient_amount, food, nutrient_name, data_type)
+                           for data_type in select_data_type_options])
+all_s, food_all = timed(lambda: clean_food_data_all(nutrient_amount, food, nutrient_name))
+print("all six data types: original %.2fs, clean_food_data_all() %.2fs" % (orig_s, all_s))
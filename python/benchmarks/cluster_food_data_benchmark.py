@@ -0,0 +1,99 @@
+# Benchmark: kmeans_sweep() and condensed_distances() vs in-memory clustering
+#
+# Simulates a pre-processed food data frame (with a cluster structure) and runs
+# the k sweep with subsample stability fits in two ways: with KMeans on the
+# in-memory float64 data, one fit after another (refitting to each subsample),
+# and with kmeans_sweep() (MiniBatchKMeans on a memory-mapped float32 copy of the
+# data, with all of the fits run in parallel). Then compares the condensed
+# distance matrix for hierarchical clustering computed by pdist() (float64) and
+# by condensed_distances() (float32, written to a memory-mapped file) on the
+# first n_hier rows. Reports the time and the peak memory allocated (measured
+# with tracemalloc in a separate run).
+#
+# Run from anywhere with: python python/benchmarks/cluster_food_data_benchmark.py [n_foods] [n_hier]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist
+from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+nutrition_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "nutrition", "dslc_documentation")
+sys.path.insert(0, nutrition_dir)
+
+from functions.cluster_food_data import condensed_distances, kmeans_sweep, subsample_indices
+
+
+# the in-memory sweep: KMeans for each k and each subsample, one at a time
+def kmeans_sweep_in_memory(data, ks, n_subsamples, subsample_fraction=0.5, n_eval=10000, seed=0):
+  values = data.to_numpy()
+  eval_ids = np.random.default_rng(seed).choice(len(values), size=min(n_eval, len(values)), replace=False)
+  rows = []
+  for k in ks:
+    kmeans = KMeans(n_clusters=k, n_init=3, random_state=seed).fit(values)
+    eval_labels = []
+    for subsample_id in range(n_subsamples):
+      ids = subsample_indices(len(values), subsample_fraction, seed, subsample_id)
+      eval_labels.append(KMeans(n_clusters=k, n_init=3, random_state=seed).fit(values[ids])
+                         .predict(values[eval_ids]))
+    rows.append({"k": k, "inertia": kmeans.inertia_,
+                 "silhouette": silhouette_score(values[eval_ids], kmeans.labels_[eval_ids]),
+                 "stability": np.mean([adjusted_rand_score(eval_labels[i], eval_labels[j])
+                                       for i in range(n_subsamples) for j in range(i + 1, n_subsamples)])})
+  return pd.DataFrame(rows)
+
+
+def simulate_food_preprocessed(n_foods, n_nutrients, n_clusters, rng):
+  centers = rng.normal(0, 2, (n_clusters, n_nutrients))
+  values = centers[rng.integers(0, n_clusters, n_foods)] + rng.normal(0, 1, (n_foods, n_nutrients))
+  return pd.DataFrame(values, columns=["nutrient %d" % j for j in range(n_nutrients)])
+
+
+def timed(fun):
+  start = time.perf_counter()
+  result = fun()
+  return time.perf_counter() - start, result
+
+
+def peak_memory(fun):
+  tracemalloc.start()
+  fun()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+n_foods = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+n_hier = int(sys.argv[2]) if len(sys.argv) > 2 else 7000
+ks = range(2, 11)
+n_subsamples = 5
+rng = np.random.default_rng(0)
+food_preprocessed = simulate_food_preprocessed(n_foods, 65, 6, rng)
+print("%d foods, k = %d-%d, %d subsamples per k" % (n_foods, ks[0], ks[-1], n_subsamples))
+
+orig_s, summary_orig = timed(lambda: kmeans_sweep_in_memory(food_preprocessed, ks, n_subsamples))
+new_s, (summary_new, _) = timed(lambda: kmeans_sweep(food_preprocessed, ks, n_subsamples=n_subsamples))
+print("  %-22s %8s" % ("", "time_s"))
+print("  %-22s %8.1f" % ("KMeans (in memory)", orig_s))
+print("  %-22s %8.1f" % ("kmeans_sweep()", new_s))
+print(summary_orig.merge(summary_new, on="k", suffixes=("_kmeans", "_sweep")).round(3).to_string(index=False))
+
+food_hier = food_preprocessed.iloc[:n_hier]
+with tempfile.TemporaryDirectory() as tmp_dir:
+  path = os.path.join(tmp_dir, "distances.npy")
+  pdist_s, distances_orig = timed(lambda: pdist(food_hier.to_numpy()))
+  new_s, distances_new = timed(lambda: condensed_distances(food_hier, path))
+  pdist_peak = peak_memory(lambda: pdist(food_hier.to_numpy()))
+  new_peak = peak_memory(lambda: condensed_distances(food_hier, path))
+  print("condensed distances for %d foods:" % n_hier)
+  print("  %-22s %8s %10s" % ("", "time_s", "peak_MB"))
+  print("  %-22s %8.2f %10.0f" % ("pdist()", pdist_s, pdist_peak / 1e6))
+  print("  %-22s %8.2f %10.0f" % ("condensed_distances()", new_s, new_peak / 1e6))
+  print("  max relative difference: %.1e" % np.max(np.abs(distances_new - distances_orig) / distances_orig))
+  del distances_new
@@ -0,0 +1,64 @@
+# Benchmark: complete_panel() vs the original panel completion in prepare_organ_data()
+#
+# Simulates an incomplete entity x period panel (e.g., monthly registry feeds
+# for many centers, with ~30% of the entity-period rows missing) and completes
+# it with the original code (a data frame of MultiIndex.from_product() merged
+# with the data, then a groupby().transform(lambda x: x.ffill().bfill()) for the
+# region) and with complete_panel(). Reports the time of each, and checks that
+# the results are the same.
+#
+# Run from anywhere with: python python/benchmarks/complete_panel_benchmark.py [n_entities] [n_periods]
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+organ_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "..", "organ_donations", "dslc_documentation")
+sys.path.insert(0, organ_dir)
+
+from functions.complete_panel import complete_panel
+
+
+# the original implementation
+def complete_panel_orig(organs_clean):
+  country_year_combinations = pd.MultiIndex.from_product([organs_clean[col].unique() for col in ["country", "year"]],
+                                                         names=["country", "year"])
+  country_year_combinations_df = pd.DataFrame(index=country_year_combinations).reset_index()
+  organs_clean = country_year_combinations_df.merge(organs_clean, on=["country", "year"], how="left")
+  organs_clean["region"] = organs_clean.groupby("country")["region"].transform(lambda x: x.ffill().bfill())
+  return organs_clean
+
+
+def simulate_panel(n_entities, n_periods, rng):
+  regions = rng.choice(["Europe", "America", "Asia", "Africa"], n_entities)
+  rows = np.flatnonzero(rng.random(n_entities * n_periods) < 0.7)
+  entities, periods = rows // n_periods, rows % n_periods
+  panel = pd.DataFrame({"region": regions[entities],
+                        "country": np.array(["center %d" % i for i in range(n_entities)])[entities],
+                        "year": 2000 + periods})
+  for j in range(10):
+    panel["transplant_%d" % j] = rng.poisson(100, len(rows))
+  return panel
+
+
+def timed(fun):
+  start = time.perf_counter()
+  result = fun()
+  return time.perf_counter() - start, result
+
+
+n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+n_periods = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+rng = np.random.default_rng(0)
+panel = simulate_panel(n_entities, n_periods, rng)
+print("%d entities x %d periods (%d observed rows)" % (n_entities, n_periods, len(panel.index)))
+
+orig_s, panel_orig = timed(lambda: complete_panel_orig(panel))
+new_s, panel_new = timed(lambda: complete_panel(panel, entity="country", period="year", entity_vars=["region"]))
+print("%-20s %8s" % ("", "time_s"))
+print("%-20s %8.2f" % ("original", orig_s))
+print("%-20s %8.2f" % ("complete_panel()", new_s))
+print("identical:", panel_orig.equals(panel_new))
@@ -0,0 +1,69 @@
+# Benchmark: loading data frames from DataCache vs recomputing them
+#
+# Caches the cleaned Ames training data and the 432 judgment call perturbations
+# from 07_prediction_combine in a temporary directory, and reports the time to
+# compute them (cold), to load them from the cache (warm), and the size of the
+# cache compared with the in-memory size of the data frames (identical columns
+# are only stored once).
+#
+# Run from anywhere with: python python/benchmarks/data_cache_benchmark.py
+import os
+import sys
+import tempfile
+import time
+import warnings
+from itertools import product
+
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+from functions.data_cache import DataCache
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def load_clean_ames_data(path):
+  return clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+
+train_path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_train.csv")
+perturb_options = pd.DataFrame(list(product([0.65, 0.8, 0.95],
+                                            [10, 20],
+                                            ["other", "mode"],
+                                            [True, False],
+                                            ["none", "log", "sqrt"],
+                                            [0, 0.5],
+                                            ["numeric", "simplified_dummy", "dummy"])),
+                               columns=("max_identical_thresh",
+                                        "n_neighborhoods",
+                                        "impute_missing_categorical",
+                                        "simplify_vars",
+                                        "transform_response",
+                                        "cor_feature_selection_threshold",
+                                        "convert_categorical"))
+
+with tempfile.TemporaryDirectory() as cache_dir:
+  print("%-18s %10s %10s %12s %12s" % ("entry", "cold_s", "warm_s", "memory_mb", "cache_mb"))
+  cache_size = 0
+  for label, fun, args in [("ames_train_clean", load_clean_ames_data, [train_path]),
+                           ("ames_jc_perturb", perturb_ames_data, None)]:
+    ames_cache = DataCache(cache_dir)
+    if args is None:
+      args = [ames_train_clean, perturb_options]
+    times = []
+    for _ in range(2):
+      start = time.perf_counter()
+      data = ames_cache.cached(fun, *args, files=[train_path])
+      times.append(time.perf_counter() - start)
+    if label == "ames_train_clean":
+      ames_train_clean = data
+    data_list = data if isinstance(data, list) else [data]
+    memory_size = sum(df.memory_usage(deep=True).sum() for df in data_list)
+    print("%-18s %10.3f %10.3f %12.1f %12.1f" % (label, times[0], times[1], memory_size / 1e6,
+                                                 (ames_cache.size() - cache_size) / 1e6))
+    cache_size = ames_cache.size()
@@ -0,0 +1,95 @@
+# Benchmark: deduplicate_data() vs the nested DataFrame.equals() loop
+#
+# Deduplicates the 432 perturbed training sets from 07_prediction_combine, whose
+# duplicates mostly differ in their columns (which the loop detects quickly), and
+# then growing lists of data perturbations that all have the same columns (e.g.,
+# adding noise to the response), half of which are duplicates. For the latter,
+# the pairwise comparison loop scales quadratically while the content hash
+# scales linearly. Also checks that both approaches retain the same
+# perturbations.
+#
+# Run from anywhere with: python python/benchmarks/deduplicate_data_benchmark.py
+import os
+import sys
+import time
+import warnings
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+from functions.deduplicate_data import deduplicate_data
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+# the original approach from 07_prediction_combine
+def deduplicate_loop(data_list):
+  new_list = []
+  new_list_id = []
+  for i in range(len(data_list)):
+    if not any(df.equals(data_list[i]) for df in new_list):
+      new_list.append(data_list[i])
+      new_list_id.append(i)
+  return new_list, new_list_id
+
+
+path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_train.csv")
+ames_train_clean = clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+perturb_options = pd.DataFrame(list(product([0.65, 0.8, 0.95],
+                                            [10, 20],
+                                            ["other", "mode"],
+                                            [True, False],
+                                            ["none", "log", "sqrt"],
+                                            [0, 0.5],
+                                            ["numeric", "simplified_dummy", "dummy"])),
+                               columns=("max_identical_thresh",
+                                        "n_neighborhoods",
+                                        "impute_missing_categorical",
+                                        "simplify_vars",
+                                        "transform_response",
+                                        "cor_feature_selection_threshold",
+                                        "convert_categorical"))
+ames_jc_perturb = perturb_ames_data(ames_train_clean, perturb_options)
+# copies, so that no data frames are shared between perturbations
+ames_jc_copies = [ames_data.copy() for ames_data in ames_jc_perturb]
+
+
+# n perturbed versions of the default preprocessed data with noise added to the
+# response, where each noise seed is used twice
+def noise_perturbations(n):
+  ames_data = ames_jc_perturb[0]
+  rng_scale = ames_data["saleprice"].std() / 10
+  data_list = []
+  for i in range(n):
+    ames_noise = ames_data.copy()
+    noise = np.random.default_rng(i // 2).normal(0, rng_scale, len(ames_data))
+    ames_noise["saleprice"] = ames_noise["saleprice"] + noise
+    data_list.append(ames_noise)
+  return data_list
+
+
+print("%-24s %8s %8s %10s %10s %8s" % ("list", "n", "unique", "loop_s", "hash_s", "speedup"))
+for label, data_list in [("perturb_ames_data", ames_jc_perturb),
+                         ("copies", ames_jc_copies),
+                         ("response noise", noise_perturbations(250)),
+                         ("response noise", noise_perturbations(500)),
+                         ("response noise", noise_perturbations(1000))]:
+  start = time.perf_counter()
+  _, loop_ids = deduplicate_loop(data_list)
+  loop_time = time.perf_counter() - start
+
+  start = time.perf_counter()
+  unique_data, unique_ids, _ = deduplicate_data(data_list)
+  hash_time = time.perf_counter() - start
+
+  assert unique_ids == loop_ids
+  print("%-24s %8d %8d %10.2f %10.2f %7.1fx" % (label, len(data_list), len(unique_data),
+                                                loop_time, hash_time, loop_time / hash_time))
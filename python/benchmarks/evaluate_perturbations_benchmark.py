@@ -0,0 +1,126 @@
+# Benchmark: evaluate_perturbations() vs one list comprehension per model and metric
+#
+# Evaluates simulated validation set predictions with the shapes from the
+# combine notebooks: 5 models x 432 Ames perturbations x 585 houses (with the
+# log/sqrt response transformations undone first), and 3 models x 16 (and 1000)
+# shopping perturbations x 2,400 sessions. The loop versions are the per-model
+# list comprehensions and melted data frames from 07_prediction_combine and
+# 05_prediction_combine. Also checks that both give the same metrics.
+#
+# Run from anywhere with: python python/benchmarks/evaluate_perturbations_benchmark.py
+import importlib.util
+import os
+import time
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from sklearn import metrics
+
+python_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def load_module(path):
+  spec = importlib.util.spec_from_file_location("evaluate_perturbations", path)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+
+ames_eval = load_module(os.path.join(python_dir, "ames_houses", "dslc_documentation",
+                                     "functions", "evaluate_perturbations.py"))
+shopping_eval = load_module(os.path.join(python_dir, "online_shopping", "dslc_documentation",
+                                         "functions", "evaluate_perturbations.py"))
+
+rng = np.random.default_rng(0)
+
+
+def timed(fun, repeat=3):
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fun()
+    times.append(time.perf_counter() - start)
+  return min(times), result
+
+
+def melt_metric(values, perturb_options, metric):
+  return pd.DataFrame({**values, **{col: perturb_options[col] for col in perturb_options}}) \
+    .melt(id_vars=list(perturb_options.columns), var_name='model', value_name=metric)
+
+
+# the original approach from 07_prediction_combine
+def ames_loop(pred_dict, y, perturb_options):
+  transform = perturb_options['transform_response']
+  pred_dict = {model: [np.exp(pred) if transform[i] == 'log' else pred for i, pred in enumerate(preds)]
+               for model, preds in pred_dict.items()}
+  pred_dict = {model: [pred**2 if transform[i] == 'sqrt' else pred for i, pred in enumerate(preds)]
+               for model, preds in pred_dict.items()}
+  rmse = {model: [np.sqrt(np.mean((y - preds[i])**2)) for i in range(len(preds))]
+          for model, preds in pred_dict.items()}
+  mae = {model: [np.mean(np.abs(y - preds[i])) for i in range(len(preds))]
+         for model, preds in pred_dict.items()}
+  corr = {model: [np.corrcoef(y, preds[i])[0, 1] for i in range(len(preds))]
+          for model, preds in pred_dict.items()}
+  return [melt_metric(rmse, perturb_options, 'rmse'),
+          melt_metric(mae, perturb_options, 'mae'),
+          melt_metric(corr, perturb_options, 'corr')]
+
+
+# the original approach from 05_prediction_combine
+def shopping_loop(pred_dict, y, perturb_options):
+  results = []
+  for metric, fun in [('accuracy', lambda y, pred: metrics.accuracy_score(y, pred > 0.161)),
+                      ('tp_rate', lambda y, pred: metrics.recall_score(y, pred > 0.161)),
+                      ('tn_rate', lambda y, pred: metrics.recall_score(y, pred > 0.161, pos_label=0)),
+                      ('auc', metrics.roc_auc_score)]:
+    values = {model: [fun(y, preds[i]) for i in range(len(preds))]
+              for model, preds in pred_dict.items()}
+    results.append(melt_metric(values, perturb_options, metric))
+  return results
+
+
+def max_difference(loop_results, results):
+  return max(np.max(np.abs(loop_result.iloc[:, -1].to_numpy() - results[loop_result.columns[-1]].to_numpy()))
+             for loop_result in loop_results)
+
+
+print("%-9s %-16s %9s %9s %8s %10s" % ("data", "shape", "loop_s", "vector_s", "speedup", "max_diff"))
+
+# Ames: the responses and predictions are on the transformed scale of each perturbation
+ames_options = pd.DataFrame(list(product([0.65, 0.8, 0.95], [10, 20], ['other', 'mode'],
+                                         [True, False], ['none', 'log', 'sqrt'], [0, 0.5],
+                                         ['numeric', 'simplified_dummy', 'dummy'])),
+                            columns=('max_identical_thresh', 'n_neighborhoods',
+                                     'impute_missing_categorical', 'simplify_vars',
+                                     'transform_response', 'cor_feature_selection_threshold',
+                                     'convert_categorical'))
+n_houses = 585
+y = rng.lognormal(12, 0.4, n_houses)
+transform = {'none': lambda x: x, 'log': np.log, 'sqrt': np.sqrt}
+pred_dict = {model: [transform[t](y * rng.lognormal(0, 0.1, n_houses))
+                     for t in ames_options['transform_response']]
+             for model in ['ls', 'lad', 'ridge', 'lasso', 'rf']}
+loop_s, loop_results = timed(lambda: ames_loop(pred_dict, y, ames_options))
+vector_s, results = timed(lambda: ames_eval.evaluate_perturbations(pred_dict, y, ames_options))
+print("%-9s %-16s %9.3f %9.3f %7.0fx %10.1e" % ("ames", "5x%dx%d" % (len(ames_options), n_houses),
+                                                loop_s, vector_s, loop_s / vector_s,
+                                                max_difference(loop_results, results)))
+
+# shopping: the responses are the same for every perturbation
+n_sessions = 2400
+y = rng.random(n_sessions) < 0.155
+for n_perturbations in [16, 1000]:
+  shopping_options = pd.DataFrame({'perturbation': range(n_perturbations)})
+  pred_dict = {'ls': [np.clip(0.1 + 0.4 * y + rng.normal(0, 0.2, n_sessions), -0.2, 1.2)
+                      for _ in range(n_perturbations)],
+               'lr': [1 / (1 + np.exp(-(2 * y - 1.7 + rng.normal(0, 1, n_sessions))))
+                      for _ in range(n_perturbations)],
+               # random forest probabilities are multiples of 1/100, so have many ties
+               'rf': [np.round(np.clip(0.1 + 0.5 * y + rng.normal(0, 0.2, n_sessions), 0, 1), 2)
+                      for _ in range(n_perturbations)]}
+  loop_s, loop_results = timed(lambda: shopping_loop(pred_dict, y, shopping_options), repeat=1)
+  vector_s, results = timed(lambda: shopping_eval.evaluate_perturbations(pred_dict, y, shopping_options))
+  print("%-9s %-16s %9.3f %9.3f %7.0fx %10.1e" % ("shopping", "3x%dx%d" % (n_perturbations, n_sessions),
+                                                  loop_s, vector_s, loop_s / vector_s,
+                                                  max_difference(loop_results, results)))
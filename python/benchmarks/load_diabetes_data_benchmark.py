@@ -0,0 +1,66 @@
+# Benchmark: load_diabetes_data() vs the original loader
+#
+# Writes a synthetic samadult.csv-shaped survey file with 1M rows (the 15
+# columns used by the loader, plus 40 unused columns, with 1-3 families per
+# household and 1-2 sample adults per family) and loads it with the original
+# loader (reading every column, groupby().sample() and a row-wise apply() for the
+# ID) and with load_diabetes_data() (reading just the relevant columns with
+# compact types, vectorized sampling and ID construction). Also checks that both
+# give the same data frame, i.e., that the same person is sampled from each
+# household.
+#
+# Run from anywhere with: python python/benchmarks/load_diabetes_data_benchmark.py [n_rows]
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+diabetes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "exercises", "diabetes_nhanes", "dslc_documentation")
+sys.path.insert(0, diabetes_dir)
+
+from functions.load_diabetes_data import load_diabetes_data
+from synthetic_data import simulate_survey
+
+
+# the original loader
+def load_diabetes_data_orig(path):
+    diabetes_orig = pd.read_csv(path)
+    diabetes = diabetes_orig.groupby("HHX") \
+      .sample(1, random_state=24648765) \
+      .reset_index() \
+      .copy()
+    diabetes["id"] = np.arange(len(diabetes.index))
+    diabetes["house_family_person_id"] = diabetes.apply(lambda x: "_".join(x[["HHX", "FMX", "FPX"]].astype(int).astype(str)),
+                                                        axis=1)
+    for new_col, col in [("diabetes", "DIBEV1"), ("coronary_heart_disease", "CHDEV"),
+                         ("hypertension", "HYPEV"), ("heart_condition", "HRTEV"),
+                         ("cancer", "CANEV"), ("family_history_diabetes", "DIBREL")]:
+        diabetes[new_col] = (diabetes[col] == 1).astype(int)
+    diabetes = diabetes.rename(columns={"AGE_P": "age", "SMKEV": "smoker", "SEX": "sex",
+                                        "AWEIGHTP": "weight", "BMI": "bmi", "AHEIGHT": "height"})
+    return diabetes[["house_family_person_id", "diabetes", "age", "smoker", "sex",
+                     "coronary_heart_disease", "weight", "bmi", "height", "hypertension",
+                     "heart_condition", "cancer", "family_history_diabetes"]]
+
+
+n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+rng = np.random.default_rng(0)
+with tempfile.TemporaryDirectory() as tmp_dir:
+    path = os.path.join(tmp_dir, "samadult.csv")
+    simulate_survey(n_rows, rng).to_csv(path, index=False)
+    print("%d rows, %.0f MB" % (n_rows, os.path.getsize(path) / 1e6))
+
+    start = time.perf_counter()
+    diabetes = load_diabetes_data(path)
+    new_s = time.perf_counter() - start
+    start = time.perf_counter()
+    diabetes_orig = load_diabetes_data_orig(path)
+    orig_s = time.perf_counter() - start
+
+print("original:            %8.2fs" % orig_s)
+print("load_diabetes_data:  %8.2fs (%.0fx)" % (new_s, orig_s / new_s))
+print("identical:", diabetes.equals(diabetes_orig))
@@ -0,0 +1,77 @@
+# Benchmark: load_food_nutrient_data() vs pd.read_csv("food_nutrient.csv")
+#
+# Writes a simulated food_nutrient.csv file with the same columns and number of
+# rows as the April 2020 FoodData Central dump (5.4M rows, 11 columns), and
+# compares reading it with pd.read_csv() (as in the nutrition notebook) to the
+# one-time chunked conversion and the memory-mapped reloads of
+# load_food_nutrient_data(). Reports the time and the peak memory allocated
+# (measured with tracemalloc in a separate run), and checks that the loaded
+# columns are identical.
+#
+# Run from anywhere with: python python/benchmarks/load_food_nutrient_data_benchmark.py [n_rows]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+nutrition_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "nutrition", "dslc_documentation")
+sys.path.insert(0, nutrition_dir)
+
+from functions.load_food_nutrient_data import load_food_nutrient_data
+
+
+def simulate_food_nutrient(n_rows, rng):
+  return pd.DataFrame({"id": np.arange(n_rows) + 2878262,
+                       "fdc_id": np.sort(rng.integers(167512, 800000, n_rows)),
+                       "nutrient_id": rng.integers(1002, 2050, n_rows),
+                       "amount": np.round(rng.exponential(20, n_rows), 3),
+                       "data_points": np.where(rng.random(n_rows) < 0.8, np.nan, rng.integers(1, 20, n_rows)),
+                       "derivation_id": np.where(rng.random(n_rows) < 0.1, np.nan, 75.0),
+                       "min": np.nan,
+                       "max": np.nan,
+                       "median": np.nan,
+                       "footnote": np.where(rng.random(n_rows) < 0.001, "Value from a similar food", ""),
+                       "min_year_acquired": np.nan})
+
+
+def measure(fun):
+  start = time.perf_counter()
+  result = fun()
+  seconds = time.perf_counter() - start
+  return seconds, result
+
+
+def peak_memory(fun):
+  tracemalloc.start()
+  fun()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5370480
+rng = np.random.default_rng(0)
+with tempfile.TemporaryDirectory() as tmp_dir:
+  path = os.path.join(tmp_dir, "food_nutrient.csv")
+  simulate_food_nutrient(n_rows, rng).to_csv(path, index=False)
+  print("%d rows, %.0f MB" % (n_rows, os.path.getsize(path) / 1e6))
+
+  read_s, nutrient_amount = measure(lambda: pd.read_csv(path, low_memory=False))
+  read_peak = peak_memory(lambda: pd.read_csv(path, low_memory=False))
+  convert_s, _ = measure(lambda: load_food_nutrient_data(path))
+  convert_peak = peak_memory(lambda: load_food_nutrient_data(path, array_dir=os.path.join(tmp_dir, "arrays")))
+  reload_s, nutrient_amount_mmap = measure(lambda: load_food_nutrient_data(path))
+  reload_peak = peak_memory(lambda: load_food_nutrient_data(path))
+
+  print("%-34s %8s %10s" % ("", "time_s", "peak_MB"))
+  print("%-34s %8.2f %10.0f" % ("pd.read_csv()", read_s, read_peak / 1e6))
+  print("%-34s %8.2f %10.0f" % ("load_food_nutrient_data() (first)", convert_s, convert_peak / 1e6))
+  print("%-34s %8.4f %10.1f" % ("load_food_nutrient_data() (later)", reload_s, reload_peak / 1e6))
+  print("identical:", all(np.array_equal(nutrient_amount[col].to_numpy(), nutrient_amount_mmap[col].to_numpy())
+                          for col in ["fdc_id", "nutrient_id", "amount"]))
+  del nutrient_amount_mmap
@@ -0,0 +1,61 @@
+# Benchmark: lump_rare_levels() vs the per-row value_counts() lookup
+#
+# preprocess_shopping_data() used to lump rare levels of operating_systems,
+# traffic_type and browser with
+#   .apply(lambda x: x if shopping[col].value_counts()[x] >= 50 else "Other")
+# which recounts the levels for every row. This compares that approach with
+# lump_rare_levels() (which counts once) on 10k, 100k and 1M sessions resampled
+# from the training data. Since the per-row approach would take hours on the
+# larger datasets, its time is extrapolated from the first 1,000 rows beyond 10k
+# sessions (its cost per row is roughly constant for a given number of rows).
+#
+# Run from anywhere with: python python/benchmarks/lump_rare_levels_benchmark.py
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+shopping_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "online_shopping", "dslc_documentation")
+sys.path.insert(0, shopping_dir)
+
+from functions.preprocess_shopping_data import lump_rare_levels
+
+
+# the original approach from preprocess_shopping_data()
+def lump_rare_levels_apply(values, min_count=50):
+  return values.apply(lambda x: x if values.value_counts()[x] >= min_count else "Other")
+
+
+path = os.path.join(shopping_dir, "..", "data", "train_val_test", "shopping_train.csv")
+shopping_train = pd.read_csv(path)
+columns = ["OperatingSystems", "TrafficType", "Browser"]
+
+n_extrapolate = 1000
+print("%-8s %12s %12s %10s" % ("rows", "apply_s", "vectorized_s", "speedup"))
+for n_rows in [10_000, 100_000, 1_000_000]:
+  shopping = shopping_train[columns].sample(n_rows, replace=True, random_state=n_rows) \
+    .astype(str).reset_index(drop=True)
+
+  vectorized_time = min(timeit.repeat(
+    lambda: [lump_rare_levels(shopping[col]) for col in columns], number=1, repeat=5))
+
+  if n_rows <= 10_000:
+    for col in columns:
+      pd.testing.assert_series_equal(lump_rare_levels(shopping[col]),
+                                     lump_rare_levels_apply(shopping[col]))
+    apply_time = min(timeit.repeat(
+      lambda: [lump_rare_levels_apply(shopping[col]) for col in columns], number=1, repeat=1))
+    estimated = ""
+  else:
+    # time the per-row lookup for the first rows only, using the full columns' counts
+    apply_time = min(timeit.repeat(
+      lambda: [shopping[col][:n_extrapolate].apply(
+                 lambda x: x if shopping[col].value_counts()[x] >= 50 else "Other")
+               for col in columns],
+      number=1, repeat=1)) * n_rows / n_extrapolate
+    estimated = " (estimated)"
+
+  print("%-8d %12.2f %12.4f %9.0fx%s" % (n_rows, apply_time, vectorized_time,
+                                         apply_time / vectorized_time, estimated))
@@ -0,0 +1,78 @@
+# Benchmark: pca_perturbations() vs a full PCA() for each pre-processing perturbation
+#
+# Simulates a cleaned food data frame (with correlated nutrients and missing
+# values) and fits PCA for all 16 combinations of the log_transform, center,
+# scale and remove_fat options of preprocess_food_data() in two ways: by
+# pre-processing the whole data frame and fitting sklearn's PCA() for each
+# perturbation, and with pca_perturbations() (chunked pre-processing and
+# covariance accumulation, shared between the perturbations that differ only in
+# remove_fat). Reports the total time and the peak memory allocated (measured
+# with tracemalloc in a separate run), the per-perturbation report of
+# pca_perturbations(), and the largest difference between the components.
+#
+# Run from anywhere with: python python/benchmarks/pca_food_data_benchmark.py [n_foods]
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+
+nutrition_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "nutrition", "dslc_documentation")
+sys.path.insert(0, nutrition_dir)
+
+from functions.pca_food_data import pca_perturbations
+from functions.preprocess_food_data import preprocess_food_data
+
+
+def pca_perturbations_full(food_clean, perturbations, n_components):
+  return [PCA(n_components).fit(preprocess_food_data(food_clean, **perturbation))
+          for perturbation in perturbations]
+
+
+def simulate_food_clean(n_foods, n_nutrients, rng):
+  factors = rng.normal(size=(n_foods, 5)) @ rng.normal(size=(5, n_nutrients))
+  values = np.round(np.exp(0.5 * factors + 0.5 * rng.normal(size=(n_foods, n_nutrients))), 2)
+  values[rng.random(values.shape) < 0.05] = np.nan
+  return pd.DataFrame(values, columns=["fat"] + ["nutrient %d" % j for j in range(1, n_nutrients)])
+
+
+def timed(fun):
+  start = time.perf_counter()
+  result = fun()
+  return time.perf_counter() - start, result
+
+
+def peak_memory(fun):
+  tracemalloc.start()
+  fun()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+n_foods = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+n_components = 10
+rng = np.random.default_rng(0)
+food_clean = simulate_food_clean(n_foods, 65, rng)
+perturbations = [dict(zip(["log_transform", "center", "scale", "remove_fat"], options))
+                 for options in itertools.product([True, False], repeat=4)]
+print("%d foods, 65 nutrients, %d perturbations" % (n_foods, len(perturbations)))
+
+full_s, pca_full = timed(lambda: pca_perturbations_full(food_clean, perturbations, n_components))
+new_s, (pca_new, report) = timed(lambda: pca_perturbations(food_clean, perturbations, n_components))
+full_peak = peak_memory(lambda: pca_perturbations_full(food_clean, perturbations, n_components))
+new_peak = max(report["peak_mb"])
+
+print("%-24s %8s %10s" % ("", "time_s", "peak_MB"))
+print("%-24s %8.2f %10.0f" % ("PCA() per perturbation", full_s, full_peak / 1e6))
+print("%-24s %8.2f %10.0f" % ("pca_perturbations()", new_s, new_peak))
+print(report.round(3).to_string(index=False))
+# the components are only defined up to their sign
+print("max component difference: %.1e" % max(
+  np.max(np.abs(np.abs(fit.components_) - np.abs(pca["components"].to_numpy())))
+  for fit, pca in zip(pca_full, pca_new)))
@@ -0,0 +1,85 @@
+# Benchmark: perturb_ames_data() vs one preprocess_ames_data() call per perturbation
+#
+# Uses the 432 judgment call combinations from 07_prediction_combine and
+# reports the time to create the perturbed training, validation and test sets
+# both ways, as well as the number of distinct stages that were computed.
+#
+# Run from anywhere with: python python/benchmarks/perturb_ames_data_benchmark.py
+import os
+import sys
+import time
+import warnings
+from itertools import product
+
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.preprocess_ames_data import preprocess_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def load_split(name):
+  path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_%s.csv" % name)
+  return clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+
+ames_train_clean = load_split("train")
+ames_val_clean = load_split("val")
+ames_test_clean = load_split("test")
+
+perturb_options = pd.DataFrame(list(product([0.65, 0.8, 0.95],
+                                            [10, 20],
+                                            ["other", "mode"],
+                                            [True, False],
+                                            ["none", "log", "sqrt"],
+                                            [0, 0.5],
+                                            ["numeric", "simplified_dummy", "dummy"])),
+                               columns=("max_identical_thresh",
+                                        "n_neighborhoods",
+                                        "impute_missing_categorical",
+                                        "simplify_vars",
+                                        "transform_response",
+                                        "cor_feature_selection_threshold",
+                                        "convert_categorical"))
+options_list = perturb_options.to_dict("records")
+
+# one preprocess_ames_data() call per perturbation
+start = time.perf_counter()
+ames_jc_perturb = [preprocess_ames_data(ames_train_clean, **options) for options in options_list]
+function_times = {"train": time.perf_counter() - start}
+for split, ames_clean in [("val", ames_val_clean), ("test", ames_test_clean)]:
+  start = time.perf_counter()
+  for i, options in enumerate(options_list):
+    train_neighborhood_cols = ames_jc_perturb[i].filter(regex="neighborhood").columns
+    train_neighborhoods = [x.replace("neighborhood_", "") for x in train_neighborhood_cols]
+    preprocess_ames_data(ames_clean, column_selection=list(ames_jc_perturb[i].columns),
+                         neighborhood_levels=train_neighborhoods, **options)
+  function_times[split] = time.perf_counter() - start
+
+# shared stages
+engine_times = {}
+stage_counts = {}
+for split, ames_clean in [("train", ames_train_clean), ("val", ames_val_clean), ("test", ames_test_clean)]:
+  stage_cache = {}
+  start = time.perf_counter()
+  perturbed = perturb_ames_data(ames_clean, perturb_options,
+                                train_perturbations=None if split == "train" else ames_jc_perturb,
+                                stage_cache=stage_cache)
+  engine_times[split] = time.perf_counter() - start
+  stage_counts[split] = len({id(ames_data) for ames_data in stage_cache.values()})
+  if split == "train":
+    for ames_data, ames_data_function in zip(perturbed, ames_jc_perturb):
+      pd.testing.assert_frame_equal(ames_data, ames_data_function)
+
+print("%d perturbations" % len(options_list))
+print("%-6s %12s %12s %8s %14s" % ("split", "function_s", "engine_s", "speedup", "stages_computed"))
+for split in ["train", "val", "test"]:
+  print("%-6s %12.2f %12.2f %7.1fx %14d" % (split, function_times[split], engine_times[split],
+                                            function_times[split] / engine_times[split],
+                                            stage_counts[split]))
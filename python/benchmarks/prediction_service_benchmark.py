@@ -0,0 +1,170 @@
+# Benchmark: load test of the Ames prediction service (see prediction_service.py)
+#
+# Starts the service in a separate process for each --batch-sizes value
+# (max_batch_size=1 predicts every request on its own, i.e., no batching), and
+# sends --requests requests of --records-per-request raw validation set houses
+# from --concurrency concurrent clients (each with its own keep-alive
+# connection). Reports the throughput and the client-side p50/p99 latency, along
+# with the service's own metrics (GET /metrics) and the mean batch size, and
+# checks that the batched predictions are the same as the unbatched ones.
+#
+# The service uses the saved model given by --model, or fits the final LAD
+# model of 07_prediction_combine on the training data (which needs sklego).
+#
+# Run from anywhere with, e.g.,
+#   python python/benchmarks/prediction_service_benchmark.py --concurrency 64
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+data_dir = os.path.join(ames_dir, "..", "data", "train_val_test")
+
+
+def read_ames(split):
+  return pd.read_csv(os.path.join(data_dir, "ames_%s.csv" % split),
+                     na_values=["", "NA"], keep_default_na=False)
+
+
+# the validation set houses as JSON records (without the sale price)
+def validation_records():
+  ames_val = read_ames("val").drop(columns="SalePrice")
+  return [{column: value for column, value in record.items() if not pd.isna(value)}
+          for record in ames_val.to_dict("records")]
+
+
+async def http_request(reader, writer, method, path, payload=None):
+  body = b"" if payload is None else json.dumps(payload).encode()
+  writer.write(("%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                "Content-Length: %d\r\n\r\n" % (method, path, len(body))).encode("latin-1") + body)
+  await writer.drain()
+  status = int((await reader.readline()).split()[1])
+  content_length = 0
+  while True:
+    line = await reader.readline()
+    if line in (b"\r\n", b""):
+      break
+    name, _, value = line.decode("latin-1").partition(":")
+    if name.strip().lower() == "content-length":
+      content_length = int(value)
+  response = json.loads(await reader.readexactly(content_length))
+  if status != 200:
+    raise RuntimeError("%s %s failed (%d): %s" % (method, path, status, response))
+  return response
+
+
+async def call(port, method, path, payload=None):
+  reader, writer = await asyncio.open_connection("127.0.0.1", port)
+  try:
+    return await http_request(reader, writer, method, path, payload)
+  finally:
+    writer.close()
+
+
+# send n_requests requests from `concurrency` clients, returning the client
+# latencies, the predictions of each request and the total time
+async def load_test(port, requests, concurrency):
+  latencies = [None] * len(requests)
+  predictions = [None] * len(requests)
+  next_request = iter(range(len(requests)))
+
+  async def client():
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+      for i in next_request:
+        start = time.perf_counter()
+        response = await http_request(reader, writer, "POST", "/predict", {"records": requests[i]})
+        latencies[i] = time.perf_counter() - start
+        predictions[i] = response["predictions"]
+    finally:
+      writer.close()
+
+  start = time.perf_counter()
+  await asyncio.gather(*[client() for _ in range(concurrency)])
+  return np.array(latencies), predictions, time.perf_counter() - start
+
+
+async def benchmark_service(model_path, max_batch_size, max_wait_ms, requests, concurrency, n_warmup):
+  process = await asyncio.create_subprocess_exec(
+    sys.executable, "-m", "functions.prediction_service", "--model", model_path, "--port", "0",
+    "--max-batch-size", str(max_batch_size), "--max-wait-ms", str(max_wait_ms),
+    cwd=ames_dir, stdout=asyncio.subprocess.PIPE)
+  try:
+    # "Serving Ames sale price predictions on http://127.0.0.1:<port>"
+    line = (await asyncio.wait_for(process.stdout.readline(), 120)).decode()
+    if not line:
+      raise RuntimeError("the prediction service failed to start")
+    port = int(line.strip().rsplit(":", 1)[1])
+    await load_test(port, requests[:n_warmup], concurrency)
+    await call(port, "POST", "/metrics/reset")
+    latencies, predictions, total_s = await load_test(port, requests, concurrency)
+    metrics = await call(port, "GET", "/metrics")
+  finally:
+    process.terminate()
+    await process.wait()
+  return latencies, predictions, total_s, metrics
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Load test of the Ames prediction service")
+  parser.add_argument("--model", help="a saved ScoringModel (default: fit the final LAD model)")
+  parser.add_argument("--requests", type=int, default=1000)
+  parser.add_argument("--records-per-request", type=int, default=1)
+  parser.add_argument("--concurrency", type=int, default=32)
+  parser.add_argument("--batch-sizes", default="1,8,64",
+                      help="comma-separated max_batch_size values (1 = no batching)")
+  parser.add_argument("--max-wait-ms", type=float, default=2)
+  parser.add_argument("--warmup", type=int, default=100, help="the number of warm up requests")
+  args = parser.parse_args()
+
+  model_path = args.model
+  if model_path is None:
+    from functions.prediction_service import fit_selected_model
+    model_path = os.path.join(tempfile.mkdtemp(prefix="prediction_service_"), "ames_scoring_model.joblib")
+    fit_selected_model(read_ames("train")).save(model_path)
+
+  records = validation_records()
+  rng = np.random.default_rng(0)
+  requests = [[records[i] for i in rng.integers(0, len(records), args.records_per_request)]
+              for _ in range(args.requests)]
+
+  print("%d requests of %d record(s) from %d concurrent clients, max_wait_ms=%g"
+        % (args.requests, args.records_per_request, args.concurrency, args.max_wait_ms))
+  print("%-15s %12s %11s %11s %11s %11s %11s %9s" % ("max_batch_size", "requests/s", "records/s",
+                                                      "p50_ms", "p99_ms", "server_p50", "server_p99",
+                                                      "mean_batch"))
+  results = {}
+  for max_batch_size in [int(x) for x in args.batch_sizes.split(",") if x]:
+    latencies, predictions, total_s, metrics = asyncio.run(
+      benchmark_service(model_path, max_batch_size, args.max_wait_ms, requests, args.concurrency,
+                        args.warmup))
+    results[max_batch_size] = (args.requests / total_s, predictions)
+    print("%-15d %12.0f %11.0f %11.2f %11.2f %11.2f %11.2f %9.1f"
+          % (max_batch_size, args.requests / total_s,
+             args.requests * args.records_per_request / total_s,
+             np.percentile(latencies, 50) * 1e3, np.percentile(latencies, 99) * 1e3,
+             metrics["latency_ms"]["p50"], metrics["latency_ms"]["p99"],
+             metrics["batch_records"]["mean"]))
+
+  batch_sizes = sorted(results)
+  base_throughput, base_predictions = results[batch_sizes[0]]
+  for max_batch_size in batch_sizes[1:]:
+    throughput, predictions = results[max_batch_size]
+    max_diff = np.max(np.abs(np.concatenate(predictions) - np.concatenate(base_predictions)))
+    print("max_batch_size=%d: %.1fx the throughput of max_batch_size=%d, "
+          "max prediction difference %.2g"
+          % (max_batch_size, throughput / base_throughput, batch_sizes[0], max_diff))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,101 @@
+# Benchmark: prepare_activity_data() vs pd.read_csv(delim_whitespace=True)
+#
+# Writes a simulated UCI HAR training split (X_train.txt with 7352 rows of 561
+# fixed-width floats in the same format as the original file, with the real
+# features.txt, activity_labels.txt, subject_train.txt and y_train.txt) and
+# loads it with pd.read_csv(delim_whitespace=True) plus the subject IDs (as in
+# the smartphone 01_cleaning notebook), and with prepare_activity_data() the
+# first time (parsing and saving the float32 array) and later (loading the
+# memory-mapped array). Also times streaming the simulated raw inertial signal
+# windows with iter_inertial_signals(), and checks that the measurements are
+# the same.
+#
+# Run from anywhere with: python python/benchmarks/prepare_activity_data_benchmark.py [n_copies]
+# (n_copies > 1 repeats the training rows to simulate larger recordings)
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+smartphone_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "..", "exercises", "smartphone")
+sys.path.insert(0, os.path.join(smartphone_dir, "dslc_documentation"))
+
+from functions.prepare_activity_data import (inertial_signal_names, iter_inertial_signals,
+                                             load_feature_names, prepare_activity_data)
+
+# (delim_whitespace is deprecated in newer versions of pandas)
+warnings.simplefilter("ignore", FutureWarning)
+
+
+# the original loading code
+def load_activity_data_orig(data_dir, feature_names):
+    measurements_train = pd.read_csv(os.path.join(data_dir, "train", "X_train.txt"),
+                                     delim_whitespace=True, names=feature_names)
+    subject_id = pd.read_csv(os.path.join(data_dir, "train", "subject_train.txt"),
+                             delim_whitespace=True, names=["id"])
+    measurements_train["id"] = subject_id["id"]
+    col_order = ["id"] + measurements_train.columns.drop("id").tolist()
+    return measurements_train[col_order]
+
+
+def write_fixed_width(path, values):
+    # the format of the HAR files, e.g., " 2.8858451e-001 -2.0294171e-002"
+    with open(path, "w") as f:
+        for row in values:
+            f.write("".join("%16.7e" % value for value in row).replace("e-0", "e-00").replace("e+0", "e+00") + "\n")
+
+
+def simulate_split(data_dir, n_copies, rng):
+    source_dir = os.path.join(smartphone_dir, "data")
+    os.makedirs(os.path.join(data_dir, "train", "Inertial Signals"))
+    for file_name in ["features.txt", "activity_labels.txt"]:
+        shutil.copy(os.path.join(source_dir, file_name), data_dir)
+    for file_name in ["subject_train.txt", "y_train.txt"]:
+        with open(os.path.join(source_dir, "train", file_name)) as f:
+            lines = f.read()
+        with open(os.path.join(data_dir, "train", file_name), "w") as f:
+            f.write(lines * n_copies)
+    n_rows = 7352 * n_copies
+    write_fixed_width(os.path.join(data_dir, "train", "X_train.txt"), rng.uniform(-1, 1, (n_rows, 561)))
+    for signal in inertial_signal_names:
+        write_fixed_width(os.path.join(data_dir, "train", "Inertial Signals", "%s_train.txt" % signal),
+                          rng.normal(0, 0.5, (n_rows, 128)))
+    return n_rows
+
+
+def timed(fun):
+    start = time.perf_counter()
+    result = fun()
+    return time.perf_counter() - start, result
+
+
+n_copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+rng = np.random.default_rng(0)
+data_dir = tempfile.mkdtemp(prefix="har_")
+try:
+    n_rows = simulate_split(data_dir, n_copies, rng)
+    feature_names = load_feature_names(os.path.join(data_dir, "features.txt"))
+    print("%d windows, %.0f MB X_train.txt" % (n_rows, os.path.getsize(os.path.join(data_dir, "train", "X_train.txt")) / 1e6))
+
+    orig_s, activity_orig = timed(lambda: load_activity_data_orig(data_dir, feature_names))
+    first_s, _ = timed(lambda: prepare_activity_data("train", data_dir))
+    later_s, activity_new = timed(lambda: prepare_activity_data("train", data_dir))
+    stream_s, n_windows = timed(lambda: sum(len(chunk) for chunk in iter_inertial_signals("train", data_dir)))
+
+    print("%-36s %8s" % ("", "time_s"))
+    print("%-36s %8.2f" % ("pd.read_csv(delim_whitespace=True)", orig_s))
+    print("%-36s %8.2f" % ("prepare_activity_data() (first)", first_s))
+    print("%-36s %8.3f" % ("prepare_activity_data() (later)", later_s))
+    print("%-36s %8.2f" % ("iter_inertial_signals() (%d windows)" % n_windows, stream_s))
+    print("same measurements (as float32):",
+          np.array_equal(activity_orig[feature_names].to_numpy(dtype=np.float32), activity_new[feature_names].to_numpy())
+          and activity_orig["id"].equals(activity_new["id"]))
+    del activity_new
+finally:
+    shutil.rmtree(data_dir, ignore_errors=True)
@@ -0,0 +1,86 @@
+# Benchmark: preprocess_food_data() vs the original column-by-column apply()s
+#
+# Simulates a cleaned food data frame (one row per food and one column per
+# nutrient, with missing values) and pre-processes it with the original
+# implementation (a copy, then a DataFrame.apply() for each of the
+# log-transformation, centering and SD-scaling, and fillna() with the column
+# means) and with preprocess_food_data() (a single float array transformed in
+# place). Reports the time and the peak memory allocated (measured with
+# tracemalloc in a separate run), and the largest difference between the results.
+#
+# The default size is that of the FNDDS data (~7k foods and ~65 nutrients); the
+# branded food data is ~300k foods.
+#
+# Run from anywhere with: python python/benchmarks/preprocess_food_data_benchmark.py [n_foods] [n_nutrients]
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+nutrition_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "nutrition", "dslc_documentation")
+sys.path.insert(0, nutrition_dir)
+
+from functions.preprocess_food_data import preprocess_food_data
+
+
+# the original implementation
+def preprocess_food_data_orig(food_clean, log_transform=True, center=True, scale=True, remove_fat=False):
+  food_pre_processed = food_clean.copy()
+  if log_transform:
+    food_pre_processed = food_pre_processed.apply(lambda x: np.log10(x + 1) if np.issubdtype(x.dtype, np.number) else x)
+  if center:
+    food_pre_processed = food_pre_processed.apply(lambda x: x - x.mean() if np.issubdtype(x.dtype, np.number) else x)
+  if scale:
+    food_pre_processed = food_pre_processed.apply(lambda x: x / x.std() if np.issubdtype(x.dtype, np.number) else x)
+  if remove_fat:
+    food_pre_processed = food_pre_processed.drop(columns="fat")
+  food_pre_processed = food_pre_processed.fillna(food_pre_processed.mean())
+  return food_pre_processed
+
+
+def simulate_food_clean(n_foods, n_nutrients, rng):
+  values = np.round(rng.exponential(5, (n_foods, n_nutrients)), 2)
+  values[rng.random(values.shape) < 0.05] = np.nan
+  return pd.DataFrame(values,
+                      index=pd.Index(["food item number %d" % i for i in range(n_foods)], name="description"),
+                      columns=["nutrient %d" % j for j in range(n_nutrients)])
+
+
+def timed(fun, repeat=5):
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fun()
+    times.append(time.perf_counter() - start)
+  return min(times), result
+
+
+def peak_memory(fun):
+  tracemalloc.start()
+  fun()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+n_foods = int(sys.argv[1]) if len(sys.argv) > 1 else 7000
+n_nutrients = int(sys.argv[2]) if len(sys.argv) > 2 else 65
+rng = np.random.default_rng(0)
+food_clean = simulate_food_clean(n_foods, n_nutrients, rng)
+print("%d foods, %d nutrients (%.0f MB)" % (n_foods, n_nutrients, food_clean.memory_usage().sum() / 1e6))
+
+orig_s, food_orig = timed(lambda: preprocess_food_data_orig(food_clean))
+new_s, food_new = timed(lambda: preprocess_food_data(food_clean))
+orig_peak = peak_memory(lambda: preprocess_food_data_orig(food_clean))
+new_peak = peak_memory(lambda: preprocess_food_data(food_clean))
+
+print("%-24s %8s %10s" % ("", "time_s", "peak_MB"))
+print("%-24s %8.3f %10.1f" % ("original", orig_s, orig_peak / 1e6))
+print("%-24s %8.3f %10.1f" % ("preprocess_food_data()", new_s, new_peak / 1e6))
+print("same shape and missing values:", food_orig.index.equals(food_new.index)
+      and food_orig.columns.equals(food_new.columns) and food_orig.isna().equals(food_new.isna()))
+print("max absolute difference: %.1e" % np.nanmax(np.abs(food_orig.to_numpy() - food_new.to_numpy())))
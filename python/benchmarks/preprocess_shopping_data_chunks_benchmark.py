@@ -0,0 +1,76 @@
+# Benchmark: preprocess_shopping_data_chunks() vs preprocess_shopping_data()
+#
+# Writes a large session log (resampled from the validation data) to a
+# temporary csv file, and preprocesses it with the training levels and columns
+# both in memory (reading the whole file and calling preprocess_shopping_data())
+# and in chunks (writing each preprocessed chunk to disk). Reports the time
+# (including the overhead of tracing allocations) and peak memory allocated by
+# each approach, and checks that both give the same data.
+#
+# Run from anywhere with: python python/benchmarks/preprocess_shopping_data_chunks_benchmark.py
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+shopping_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "online_shopping", "dslc_documentation")
+sys.path.insert(0, shopping_dir)
+
+from functions.preprocess_shopping_data import preprocess_shopping_data
+from functions.preprocess_shopping_data_chunks import preprocess_shopping_data_chunks, \
+  shopping_dtypes
+
+
+def load_split(name):
+  return pd.read_csv(os.path.join(shopping_dir, "..", "data", "train_val_test",
+                                  "shopping_%s.csv" % name))
+
+
+shopping_train_nodummy = preprocess_shopping_data(load_split("train"), dummy=False)
+column_selection = list(preprocess_shopping_data(load_split("train")).columns)
+shopping_train_levels = dict(
+  operating_systems_levels=shopping_train_nodummy["operating_systems"].unique(),
+  browser_levels=shopping_train_nodummy["browser"].unique(),
+  traffic_type_levels=shopping_train_nodummy["traffic_type"].unique()
+)
+
+
+# run a function, returning its time and the peak memory allocated by python
+def measure(fun):
+  tracemalloc.start()
+  start = time.perf_counter()
+  fun()
+  elapsed = time.perf_counter() - start
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return elapsed, peak
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+  print("%-8s %-10s %10s %10s" % ("rows", "approach", "time_s", "peak_mb"))
+  for n_rows in [100_000, 1_000_000]:
+    input_file = os.path.join(tmp_dir, "sessions.csv")
+    output_file = os.path.join(tmp_dir, "sessions_preprocessed.csv")
+    load_split("val").sample(n_rows, replace=True, random_state=n_rows) \
+      .to_csv(input_file, index=False)
+
+    def run_in_memory():
+      shopping = pd.read_csv(input_file, dtype=shopping_dtypes)
+      preprocess_shopping_data(shopping, column_selection=column_selection,
+                               **shopping_train_levels) \
+        .to_csv(output_file, index=False)
+
+    def run_chunks():
+      preprocess_shopping_data_chunks(input_file, column_selection, chunksize=50_000,
+                                      output_file=output_file, **shopping_train_levels)
+
+    for approach, fun in [("in_memory", run_in_memory), ("chunks", run_chunks)]:
+      elapsed, peak = measure(fun)
+      print("%-8d %-10s %10.2f %10.1f" % (n_rows, approach, elapsed, peak / 1e6))
+      if approach == "in_memory":
+        shopping_in_memory = pd.read_csv(output_file)
+    pd.testing.assert_frame_equal(pd.read_csv(output_file), shopping_in_memory)
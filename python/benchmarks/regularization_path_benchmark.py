@@ -0,0 +1,71 @@
+# Benchmark: ridge_path_cv()/lasso_path_cv() vs cross_validate() for each alpha
+#
+# Computes the 10-fold CV score table over the alpha grids used by fit_ridge()
+# and fit_lasso() in 07_prediction_combine, both with one cross_validate() call
+# per alpha and with the path functions, for a few of the judgment call
+# perturbations. Reports the times, the largest relative difference between
+# the CV scores, and whether the same (minimum and 1SE) alphas are chosen.
+#
+# Run from anywhere with: python python/benchmarks/regularization_path_benchmark.py
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge, Lasso
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.model_selection import cross_validate
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.perturb_ames_data import perturb_ames_data
+from functions.regularization_path import ridge_path_cv, lasso_path_cv, select_alpha
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+# the large-alpha end of the grids doesn't always converge (in both approaches)
+warnings.filterwarnings("ignore", category=ConvergenceWarning)
+
+
+# the original approach from 07_prediction_combine
+def cv_scores_loop(model, X, y, alphas):
+  cv_scores = []
+  for alpha in alphas:
+    cv = cross_validate(estimator=model(alpha=alpha), X=X, y=y, cv=10,
+                        scoring='neg_root_mean_squared_error')
+    cv_scores.append({'alpha': alpha,
+                      'log_alpha': np.log(alpha),
+                      'test_mse': -np.mean(cv['test_score'])})
+  return pd.DataFrame(cv_scores)
+
+
+path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_train.csv")
+ames_train_clean = clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+perturb_options = [dict(convert_categorical="numeric", cor_feature_selection_threshold=0),
+                   dict(convert_categorical="dummy", simplify_vars=False,
+                        cor_feature_selection_threshold=0),
+                   dict(convert_categorical="simplified_dummy", transform_response="log",
+                        cor_feature_selection_threshold=0.5)]
+
+print("%-6s %-10s %8s %8s %8s %10s %12s" % ("model", "shape", "loop_s", "path_s", "speedup",
+                                              "max_rel", "same_alpha"))
+for ames_data in perturb_ames_data(ames_train_clean, perturb_options):
+  X = ames_data.drop(columns='saleprice')
+  X = (X - X.mean()) / X.std()
+  y = ames_data['saleprice']
+  for label, model, path_cv, alphas in [("ridge", Ridge, ridge_path_cv, np.logspace(-1, 5, 100)),
+                                        ("lasso", Lasso, lasso_path_cv, np.logspace(-2, 7, 100))]:
+    start = time.perf_counter()
+    loop_scores = cv_scores_loop(model, X, y, alphas)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    path_scores = path_cv(X, y, alphas)
+    path_time = time.perf_counter() - start
+    max_rel = np.max(np.abs(path_scores.test_mse - loop_scores.test_mse) / loop_scores.test_mse)
+    print("%-6s %-10s %8.2f %8.3f %7.0fx %10.1e %12s" % (label, "%dx%d" % X.shape, loop_time, path_time,
+                                                         loop_time / path_time, max_rel,
+                                                         select_alpha(loop_scores) == select_alpha(path_scores)))
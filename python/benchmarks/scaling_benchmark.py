@@ -0,0 +1,270 @@
+# Scaling benchmark suite for the data preparation pipelines
+#
+# Runs each pipeline on synthetic data (see synthetic_data.py) at several
+# scales (multiples of the size of the data in the repo) and records the time
+# (the best of --repeat runs) and the peak memory allocated (measured with
+# tracemalloc in a separate run) at each scale. Each (pipeline, scale) runs in a
+# fresh Python process, since the projects each have their own `functions`
+# package, and so that the measurements don't depend on what ran before.
+#
+# The results can be saved with --output and compared with an earlier run with
+# --baseline. The suite fails (exits with status 1) if a scaling curve has
+# regressed, i.e., if the log-log slope of the time or peak memory between two
+# consecutive scales is more than --slope-tolerance above the slope of the
+# baseline, or above --max-slope (clearly superlinear scaling) even without a
+# baseline. Slopes are only checked when the measurements at the larger scale
+# are at least --min-time seconds / --min-mb MB, since tiny measurements are
+# noisy.
+#
+# Run from anywhere, e.g.,
+#   python python/benchmarks/scaling_benchmark.py --output scaling.json
+#   python python/benchmarks/scaling_benchmark.py --baseline scaling.json
+#   python python/benchmarks/scaling_benchmark.py --pipelines ames,organ --scales 1,10,100,1000
+# (the 1000x scale needs tens of GB of memory for the Ames and food pipelines)
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+project_dirs = {"ames": os.path.join(benchmark_dir, "..", "ames_houses", "dslc_documentation"),
+                "shopping": os.path.join(benchmark_dir, "..", "online_shopping", "dslc_documentation"),
+                "nutrition": os.path.join(benchmark_dir, "..", "nutrition", "dslc_documentation"),
+                "organ": os.path.join(benchmark_dir, "..", "organ_donations", "dslc_documentation"),
+                "diabetes": os.path.join(benchmark_dir, "..", "exercises", "diabetes_nhanes",
+                                         "dslc_documentation")}
+
+
+#---------------------------------- Pipelines --------------------------------#
+
+# Each pipeline generates the data at a scale (which isn't timed) and returns
+# a function that runs the pipeline, along with the number of rows and columns
+# of the input data. Any files that it writes go in tmp_dir, a temporary
+# directory that is removed after the runs. The imports are inside the functions, since they depend on
+# the project directory.
+
+
+def setup_ames(scale, rng, tmp_dir, column_scale=1):
+  from synthetic_data import ames_raw_data
+  from functions.clean_ames_data import clean_ames_data
+  from functions.preprocess_ames_data import preprocess_ames_data
+  ames = ames_raw_data(scale, rng, column_scale=column_scale)
+  return lambda: preprocess_ames_data(clean_ames_data(ames)), ames.shape
+
+
+def setup_ames_wide(scale, rng, tmp_dir):
+  # the same number of houses, with scale times as many numeric columns
+  return setup_ames(1, rng, tmp_dir, column_scale=scale)
+
+
+def setup_ames_perturbations(scale, rng, tmp_dir):
+  from itertools import product
+  from synthetic_data import ames_raw_data
+  from functions.clean_ames_data import clean_ames_data
+  from functions.perturb_ames_data import perturb_ames_data
+  ames_clean = clean_ames_data(ames_raw_data(scale, rng))
+  perturb_options = [dict(zip(["max_identical_thresh", "impute_missing_categorical",
+                               "transform_response", "convert_categorical"], options))
+                     for options in product([0.65, 0.8, 0.95], ["other", "mode"], ["none", "log"],
+                                            ["numeric", "dummy"])]
+  return lambda: perturb_ames_data(ames_clean, perturb_options), ames_clean.shape
+
+
+def setup_shopping(scale, rng, tmp_dir):
+  from synthetic_data import shopping_data
+  from functions.preprocess_shopping_data import preprocess_shopping_data
+  shopping = shopping_data(scale, rng)
+  return lambda: preprocess_shopping_data(shopping), shopping.shape
+
+
+def setup_food(scale, rng, tmp_dir):
+  from synthetic_data import base_sizes, simulate_food_data
+  from functions.clean_food_data import clean_food_data
+  from functions.preprocess_food_data import preprocess_food_data
+  nutrient_amount, food, nutrient_name = simulate_food_data(int(scale * base_sizes["food"]), rng)
+  return lambda: preprocess_food_data(clean_food_data(nutrient_amount, food, nutrient_name,
+                                                      select_data_type="branded_food")), \
+    nutrient_amount.shape
+
+
+def setup_food_pca_perturbations(scale, rng, tmp_dir):
+  from itertools import product
+  from synthetic_data import base_sizes, simulate_food_data
+  from functions.clean_food_data import clean_food_data
+  from functions.pca_food_data import pca_perturbations
+  food_clean = clean_food_data(*simulate_food_data(int(scale * base_sizes["food"]), rng),
+                               select_data_type="branded_food")
+  perturbations = [dict(zip(["log_transform", "center", "scale", "remove_fat"], options))
+                   for options in product([True, False], [True], [True, False], [True, False])]
+  return lambda: pca_perturbations(food_clean, perturbations), food_clean.shape
+
+
+def setup_organ(scale, rng, tmp_dir):
+  from synthetic_data import organ_data
+  from functions.prepare_organ_data import prepare_organ_data
+  organs = organ_data(scale, rng)
+  return lambda: prepare_organ_data(organs), organs.shape
+
+
+def setup_diabetes(scale, rng, tmp_dir):
+  from synthetic_data import base_sizes, simulate_survey
+  from functions.load_diabetes_data import load_diabetes_data
+  survey = simulate_survey(int(scale * base_sizes["survey"]), rng)
+  path = os.path.join(tmp_dir, "samadult.csv")
+  survey.to_csv(path, index=False)
+  return lambda: load_diabetes_data(path), survey.shape
+
+
+# the project and setup function of each pipeline
+pipelines = {"ames": ("ames", setup_ames),
+             "ames_wide": ("ames", setup_ames_wide),
+             "ames_perturbations": ("ames", setup_ames_perturbations),
+             "shopping": ("shopping", setup_shopping),
+             "food": ("nutrition", setup_food),
+             "food_pca_perturbations": ("nutrition", setup_food_pca_perturbations),
+             "organ": ("organ", setup_organ),
+             "diabetes": ("diabetes", setup_diabetes)}
+
+
+
+#----------------------------------- Running ---------------------------------#
+
+# run a pipeline at one scale (in the worker process), returning the time and
+# peak memory
+def measure(pipeline, scale, repeat, seed):
+  project, setup = pipelines[pipeline]
+  sys.path.insert(0, benchmark_dir)
+  sys.path.insert(0, project_dirs[project])
+  warnings.filterwarnings("ignore")
+  with tempfile.TemporaryDirectory(prefix="scaling_benchmark_") as tmp_dir:
+    run, shape = setup(scale, np.random.default_rng(seed), tmp_dir)
+
+    times = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      run()
+      times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return {"pipeline": pipeline, "scale": scale, "rows": shape[0], "columns": shape[1],
+          "time_s": min(times), "peak_mb": peak / 1e6}
+
+
+# run a pipeline at one scale in a new Python process
+def measure_in_subprocess(pipeline, scale, repeat, seed):
+  completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker",
+                              "--pipelines", pipeline, "--scales", repr(scale),
+                              "--repeat", str(repeat), "--seed", str(seed)],
+                             capture_output=True, text=True)
+  if completed.returncode != 0:
+    return {"pipeline": pipeline, "scale": scale,
+            "error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+            "exit status %d" % completed.returncode}
+  return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# the log-log slope of a measurement between each pair of consecutive scales
+def scaling_slopes(results, pipeline, measurement):
+  points = sorted((result["scale"], result[measurement]) for result in results
+                  if result["pipeline"] == pipeline and measurement in result)
+  return {(scale_a, scale_b): (np.log(value_b / value_a) / np.log(scale_b / scale_a), value_b)
+          for (scale_a, value_a), (scale_b, value_b) in zip(points[:-1], points[1:])
+          if value_a > 0 and value_b > 0}
+
+
+# the scaling regressions of the results (compared with the baseline results,
+# if given), as a list of messages
+def check_scaling(results, baseline=None, slope_tolerance=0.2, max_slope=1.3,
+                  min_values={"time_s": 0.05, "peak_mb": 5}):
+  failures = []
+  for pipeline in sorted({result["pipeline"] for result in results}):
+    for measurement, min_value in min_values.items():
+      slopes = scaling_slopes(results, pipeline, measurement)
+      baseline_slopes = scaling_slopes(baseline, pipeline, measurement) if baseline else {}
+      for scales, (slope, value) in slopes.items():
+        if value < min_value:
+          continue
+        if max_slope is not None and slope > max_slope:
+          failures.append("%s %s: slope %.2f from %gx to %gx is above %.2f"
+                          % (pipeline, measurement, slope, scales[0], scales[1], max_slope))
+        if scales in baseline_slopes and slope > baseline_slopes[scales][0] + slope_tolerance:
+          failures.append("%s %s: slope %.2f from %gx to %gx, was %.2f in the baseline"
+                          % (pipeline, measurement, slope, scales[0], scales[1],
+                             baseline_slopes[scales][0]))
+  return failures
+
+
+def parse_list(value, type):
+  return [type(x) for x in value.split(",") if x]
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Scaling benchmarks for the data preparation pipelines")
+  parser.add_argument("--pipelines", default=",".join(pipelines),
+                      help="comma-separated pipelines (default: all of %s)" % ", ".join(pipelines))
+  parser.add_argument("--scales", default="1,10,100",
+                      help="comma-separated multiples of the data size (default: 1,10,100)")
+  parser.add_argument("--repeat", type=int, default=3, help="the number of timed runs at each scale")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--output", help="write the results to this JSON file")
+  parser.add_argument("--baseline", help="compare the scaling curves with these (JSON) results")
+  parser.add_argument("--slope-tolerance", type=float, default=0.2)
+  parser.add_argument("--max-slope", type=float, default=1.3)
+  parser.add_argument("--min-time", type=float, default=0.05)
+  parser.add_argument("--min-mb", type=float, default=5)
+  parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+  pipeline_names = parse_list(args.pipelines, str)
+  scales = parse_list(args.scales, float)
+  for pipeline in pipeline_names:
+    if pipeline not in pipelines:
+      parser.error("unknown pipeline %s (expected one of %s)" % (pipeline, ", ".join(pipelines)))
+
+  if args.worker:
+    print(json.dumps(measure(pipeline_names[0], scales[0], args.repeat, args.seed)))
+    return 0
+
+  results = []
+  print("%-24s %8s %10s %8s %10s %10s" % ("pipeline", "scale", "rows", "columns", "time_s", "peak_mb"))
+  for pipeline in pipeline_names:
+    for scale in scales:
+      result = measure_in_subprocess(pipeline, scale, args.repeat, args.seed)
+      results.append(result)
+      if "error" in result:
+        print("%-24s %8g  failed: %s" % (pipeline, scale, result["error"]))
+      else:
+        print("%-24s %8g %10d %8d %10.3f %10.1f" % (pipeline, scale, result["rows"], result["columns"],
+                                                    result["time_s"], result["peak_mb"]))
+
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump({"python": platform.python_version(),
+                 "machine": platform.machine(),
+                 "results": results}, f, indent=1)
+
+  baseline = None
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)["results"]
+  failures = check_scaling(results, baseline, slope_tolerance=args.slope_tolerance,
+                           max_slope=args.max_slope,
+                           min_values={"time_s": args.min_time, "peak_mb": args.min_mb})
+  failures += ["%s at %gx failed: %s" % (result["pipeline"], result["scale"], result["error"])
+               for result in results if "error" in result]
+  for failure in failures:
+    print("REGRESSION: " + failure)
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
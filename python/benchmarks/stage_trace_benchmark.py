@@ -0,0 +1,95 @@
+# Benchmark: the overhead of the stage instrumentation (see stage_trace.py)
+#
+# Reports the cost of the (disabled) recorder calls in each preprocess_ames_data()
+# call, and the time to preprocess the Ames training data for a grid of
+# judgment call perturbations without tracing, tracing the time only, and
+# tracing the time and memory. Then uses the trace to show the mean time and
+# peak memory of each stage for each convert_categorical option, and writes
+# the trace in the Chrome trace event format.
+#
+# Run from anywhere with: python python/benchmarks/stage_trace_benchmark.py
+import os
+import sys
+import tempfile
+import time
+import warnings
+from itertools import product
+
+import pandas as pd
+
+ames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "ames_houses", "dslc_documentation")
+sys.path.insert(0, ames_dir)
+
+from functions.clean_ames_data import clean_ames_data
+from functions.preprocess_ames_data import preprocess_ames_data
+from functions.stage_trace import record_stages, trace_stages
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+path = os.path.join(ames_dir, "..", "data", "train_val_test", "ames_train.csv")
+ames_train_clean = clean_ames_data(pd.read_csv(path, na_values=["", "NA"], keep_default_na=False))
+
+perturb_options = pd.DataFrame(list(product([0.65, 0.8, 0.95],
+                                            [10, 20],
+                                            ["other", "mode"],
+                                            [True, False],
+                                            [0, 0.5],
+                                            ["numeric", "simplified_dummy", "dummy"])),
+                               columns=("max_identical_thresh",
+                                        "n_neighborhoods",
+                                        "impute_missing_categorical",
+                                        "simplify_vars",
+                                        "cor_feature_selection_threshold",
+                                        "convert_categorical"))
+options_list = perturb_options.to_dict("records")
+
+# the recorder calls made by one (untraced) preprocess_ames_data() call
+n_repeats = 100000
+start = time.perf_counter()
+for _ in range(n_repeats):
+  stages = record_stages("preprocess_ames_data", ames_train_clean, **options_list[0])
+  for stage in range(9):
+    stages.mark("stage", ames_train_clean)
+  stages.finish(ames_train_clean)
+disabled_us = (time.perf_counter() - start) / n_repeats * 1e6
+
+
+def preprocess_grid():
+  for options in options_list:
+    preprocess_ames_data(ames_train_clean, **options)
+
+
+start = time.perf_counter()
+preprocess_grid()
+untraced_s = time.perf_counter() - start
+with trace_stages(trace_memory=False):
+  start = time.perf_counter()
+  preprocess_grid()
+  time_only_s = time.perf_counter() - start
+with trace_stages() as trace:
+  start = time.perf_counter()
+  preprocess_grid()
+  memory_s = time.perf_counter() - start
+
+print("disabled recorder calls: %.1f us per preprocess_ames_data() call "
+      "(%.1f ms per call)" % (disabled_us, untraced_s / len(options_list) * 1e3))
+print("%d perturbations" % len(options_list))
+print("%-24s %10s" % ("", "time_s"))
+print("%-24s %10.2f" % ("not traced", untraced_s))
+print("%-24s %10.2f" % ("traced (time)", time_only_s))
+print("%-24s %10.2f" % ("traced (time + memory)", memory_s))
+
+stage_summary = trace.to_frame() \
+  .groupby(["stage", "convert_categorical"], sort=False) \
+  .agg(time_ms=("time_s", lambda x: x.mean() * 1e3),
+       peak_mb=("peak_bytes", lambda x: x.mean() / 1e6),
+       columns_out=("columns_out", "mean")) \
+  .unstack("convert_categorical")
+pd.set_option("display.width", 200)
+print()
+print(stage_summary.round(2))
+
+trace_path = os.path.join(tempfile.gettempdir(), "preprocess_ames_data_trace.json")
+trace.to_chrome_trace(trace_path)
+print("\nChrome trace written to %s" % trace_path)
@@ -0,0 +1,184 @@
+# Synthetic versions of the project datasets at any scale
+#
+# Each generator returns data with the same columns, types and missing value
+# patterns as the original (raw) data, with `scale` times as many rows (or
+# entities), so that the data preparation functions can be benchmarked at
+# 10x, 100x, 1000x, ... the size of the data that ships with the repo. The
+# generators run offline: they either resample the rows of the data in the repo
+# (jittering the continuous columns, so that the rows aren't exact copies) or,
+# for the datasets that aren't in the repo (the food and survey data), simulate
+# data with the same schema.
+#   ames_raw_data(): AmesHousing.txt (2930 houses), optionally with
+#     `column_scale` times as many numeric columns
+#   shopping_data(): online_shoppers_intention.csv (12330 sessions)
+#   organ_data(): global-organ-donation_2018.csv (~190 countries x 18 years),
+#     scaled by adding copies of the countries
+#   simulate_food_data(): the FoodData Central food, nutrient and
+#     food_nutrient tables (n_foods foods, mostly branded foods)
+#   simulate_survey(): the NHIS samadult.csv survey file (n_rows adults)
+import os
+
+import numpy as np
+import pandas as pd
+
+python_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# the number of rows of the (raw) data at scale 1
+base_sizes = {"ames": 2930, "shopping": 12330, "organ": 3165, "food": 10000, "survey": 30000}
+
+
+# multiply the positive values of a numeric column by random noise (keeping
+# integer columns integer)
+def jitter(values, rng, sd=0.05):
+  noisy = values * rng.lognormal(0, sd, len(values))
+  if pd.api.types.is_integer_dtype(values.dtype):
+    return np.round(noisy).astype(values.dtype)
+  return noisy
+
+
+# sample n_rows rows (with replacement) of a data frame
+def resample_rows(data, n_rows, rng):
+  return data.iloc[rng.integers(0, len(data.index), n_rows)].reset_index(drop=True)
+
+
+
+#------------------------------- Ames housing --------------------------------#
+
+ames_jitter_columns = ["Lot Frontage", "Lot Area", "Mas Vnr Area", "BsmtFin SF 1",
+                       "BsmtFin SF 2", "Bsmt Unf SF", "Total Bsmt SF", "1st Flr SF",
+                       "2nd Flr SF", "Gr Liv Area", "Garage Area", "Wood Deck SF",
+                       "Open Porch SF", "SalePrice"]
+
+
+def ames_raw_data(scale=1, rng=None, column_scale=1):
+  # scale: the number of houses, as a multiple of the 2930 houses of AmesHousing.txt
+  # column_scale: the number of numeric columns, as a multiple of the 39 numeric
+  #   columns (the extra columns are jittered copies of the area columns,
+  #   e.g., "Lot Area 2", which are kept as numeric predictors)
+  rng = np.random.default_rng(0) if rng is None else rng
+  ames_orig = pd.read_table(os.path.join(python_dir, "ames_houses", "data", "AmesHousing.txt"),
+                            sep="\t", header=0, na_values=["", "NA"], keep_default_na=False)
+  n_rows = int(round(scale * len(ames_orig.index)))
+  ames = resample_rows(ames_orig, n_rows, rng)
+  ames["Order"] = np.arange(1, n_rows + 1)
+  ames["PID"] = 100000000 + np.arange(n_rows)
+  for col in ames_jitter_columns:
+    ames[col] = jitter(ames[col], rng)
+
+  n_numeric = (ames_orig.dtypes != object).sum()
+  n_extra = int(round((column_scale - 1) * n_numeric))
+  extra_columns = {}
+  for i in range(n_extra):
+    col = ames_jitter_columns[i % len(ames_jitter_columns)]
+    extra_columns["%s %d" % (col, i // len(ames_jitter_columns) + 2)] = jitter(ames[col], rng, sd=0.2)
+  if extra_columns:
+    # the extra columns go before SalePrice (the last column)
+    ames = pd.concat([ames.iloc[:, :-1], pd.DataFrame(extra_columns), ames[["SalePrice"]]], axis=1)
+  return ames
+
+
+
+#------------------------------ Online shopping ------------------------------#
+
+def shopping_data(scale=1, rng=None):
+  # scale: the number of sessions, as a multiple of the 12330 sessions of
+  #   online_shoppers_intention.csv
+  rng = np.random.default_rng(0) if rng is None else rng
+  shopping_orig = pd.read_csv(os.path.join(python_dir, "online_shopping", "data",
+                                           "online_shoppers_intention.csv"))
+  shopping = resample_rows(shopping_orig, int(round(scale * len(shopping_orig.index))), rng)
+  for col in ["Administrative_Duration", "Informational_Duration", "ProductRelated_Duration",
+              "PageValues"]:
+    # (the negative durations are kept, since they are replaced by
+    # preprocess_shopping_data())
+    shopping[col] = shopping[col].where(shopping[col] <= 0, jitter(shopping[col], rng))
+  return shopping
+
+
+
+#------------------------------ Organ donations ------------------------------#
+
+def organ_data(scale=1, rng=None, drop_prop=0.05):
+  # scale: the number of countries, as a multiple of the countries of
+  #   global-organ-donation_2018.csv (copy k of a country is named, e.g.,
+  #   "Spain 2", and has jittered counts)
+  # drop_prop: the proportion of the country-year rows of the copies that are
+  #   removed (so that there are gaps in the panel to complete)
+  rng = np.random.default_rng(0) if rng is None else rng
+  organs_orig = pd.read_csv(os.path.join(python_dir, "organ_donations", "data",
+                                         "global-organ-donation_2018.csv"))
+  n_copies = max(1, int(round(scale)))
+  count_cols = organs_orig.columns[3:]
+  copies = [organs_orig]
+  for k in range(2, n_copies + 1):
+    organs = organs_orig.copy()
+    organs["COUNTRY"] = organs["COUNTRY"] + " %d" % k
+    for col in count_cols:
+      organs[col] = np.round(jitter(organs[col], rng, sd=0.1), 1 if col == "POPULATION" else 0)
+    copies.append(organs[rng.random(len(organs.index)) >= drop_prop])
+  return pd.concat(copies, ignore_index=True)
+
+
+
+#---------------------------------- Food data --------------------------------#
+
+food_data_types = ["survey_fndds_food", "branded_food", "foundation_food", "sr_legacy_food",
+                   "sub_sample_food", "agricultural_acquisition", "sample_food"]
+
+
+def simulate_food_data(n_foods, rng):
+  # returns the nutrient amount (food_nutrient.csv), food name (food.csv) and
+  # nutrient name tables, with ~90% branded foods (which have ~14 nutrients
+  # each), and the other foods with ~60 nutrients each
+  nutrient_name = pd.read_csv(os.path.join(python_dir, "nutrition", "data", "nutrient_name.csv"))
+  data_types = rng.choice(food_data_types, n_foods,
+                          p=[0.02, 0.9, 0.01, 0.02, 0.02, 0.01, 0.02])
+  food = pd.DataFrame({"fdc_id": rng.permutation(10 * n_foods)[:n_foods],
+                       "data_type": data_types,
+                       # some descriptions are shared by several foods
+                       "description": ["%s food item number %d" % (data_type, i)
+                                       for data_type, i in zip(data_types, rng.integers(0, int(0.8 * n_foods), n_foods))],
+                       "publication_date": "2019-04-01"})
+  n_nutrients = np.where(data_types == "branded_food", 14, 60)
+  fdc_id = np.repeat(food["fdc_id"].to_numpy(), n_nutrients)
+  nutrient_ids = np.concatenate([nutrient_name["nutrient_id"].to_numpy(), [2000, 1106, 1114]])
+  nutrient_id = np.concatenate([rng.choice(nutrient_ids, n, replace=False) for n in np.unique(n_nutrients)
+                                for _ in range(np.sum(n_nutrients == n))])
+  # put the rows back in food order
+  nutrient_id = nutrient_id[np.argsort(np.argsort(np.repeat(n_nutrients, n_nutrients), kind="stable"), kind="stable")]
+  nutrient_amount = pd.DataFrame({"id": np.arange(len(fdc_id)),
+                                  "fdc_id": fdc_id,
+                                  "nutrient_id": nutrient_id,
+                                  "amount": np.round(rng.exponential(5, len(fdc_id)) * (rng.random(len(fdc_id)) < 0.7), 2),
+                                  "data_points": np.nan,
+                                  "derivation_id": 75.0})
+  return nutrient_amount, food, nutrient_name
+
+
+
+#-------------------------------- Survey data --------------------------------#
+
+def simulate_survey(n_rows, rng, n_other_columns=40):
+  # households with 1-3 families, each with 1-2 sample adults (so many
+  # households have more than one person to sample from), with the 15 columns
+  # used by load_diabetes_data() and n_other_columns unused columns
+  n_households = n_rows // 2
+  families = rng.integers(1, 4, n_households)
+  hhx = np.repeat(np.arange(1, n_households + 1), families)
+  fmx = np.arange(len(hhx)) - np.repeat(np.cumsum(families) - families, families) + 1
+  persons = rng.integers(1, 3, len(hhx))
+  hhx = np.repeat(hhx, persons)
+  fmx = np.repeat(fmx, persons)
+  fpx = np.arange(len(hhx)) - np.repeat(np.cumsum(persons) - persons, persons) + 1
+  n = min(n_rows, len(hhx))
+  survey = pd.DataFrame({"FPX": fpx[:n], "FMX": fmx[:n], "HHX": hhx[:n]})
+  for col in ["DIBEV1", "CHDEV", "HYPEV", "HRTEV", "CANEV", "DIBREL", "SMKEV"]:
+    survey[col] = rng.choice([1, 2, 7, 9], n, p=[0.1, 0.85, 0.03, 0.02])
+  survey["SEX"] = rng.integers(1, 3, n)
+  survey["AGE_P"] = rng.integers(18, 86, n)
+  survey["AWEIGHTP"] = rng.integers(100, 300, n)
+  survey["AHEIGHT"] = rng.integers(59, 77, n)
+  survey["BMI"] = rng.integers(1500, 4500, n)
+  for i in range(n_other_columns):
+    survey["OTHER_%02d" % i] = np.where(rng.random(n) < 0.3, np.nan, rng.integers(1, 10, n))
+  return survey
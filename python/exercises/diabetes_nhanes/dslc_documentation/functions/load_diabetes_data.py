@@ -1,21 +1,73 @@
 
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
+
+# the columns of samadult.csv that are used, and their types (the ID columns
+# are always present, and the other columns are read as floats since they can
+# be missing, using float32 for the integer-coded columns)
+diabetes_dtypes = {"HHX": "int32",
+                   "FMX": "int16",
+                   "FPX": "int16",
+                   "DIBEV1": "float32",
+                   "CHDEV": "float32",
+                   "HYPEV": "float32",
+                   "HRTEV": "float32",
+                   "CANEV": "float32",
+                   "DIBREL": "float32",
+                   "AGE_P": "float32",
+                   "SMKEV": "float32",
+                   "SEX": "float32",
+                   "AWEIGHTP": "float32",
+                   "BMI": "float64",
+                   "AHEIGHT": "float32"}
+
+
+def sample_one_per_group(groups, random_state):
+    # Return the positions of one randomly chosen row from each group, in the same
+    # order and with the same result as
+    # data.groupby(groups).sample(1, random_state=random_state), but without
+    # splitting the data into a data frame for every group.
+    #
+    # groupby().sample() draws np.random.RandomState(random_state).choice(group_size,
+    # 1, replace=False) for each group in turn (in sorted order of the groups),
+    # which doesn't use any random numbers for groups with only one row, so only
+    # the groups with more than one row need to draw from the random state.
+    codes, _ = pd.factorize(groups, sort=True)
+    keep = codes >= 0
+    # the row positions of each group (in their original order), one group after another
+    order = np.flatnonzero(keep)[np.argsort(codes[keep], kind="stable")]
+    group_sizes = np.bincount(codes[keep])
+    group_starts = np.cumsum(group_sizes) - group_sizes
+    # the position of the chosen row within each group
+    offsets = np.zeros(len(group_sizes), dtype=np.intp)
+    random_state = np.random.RandomState(random_state)
+    for group in np.flatnonzero(group_sizes > 1):
+        offsets[group] = random_state.choice(group_sizes[group], size=1, replace=False)[0]
+    return order[group_starts + offsets]
+
+
+def restore_integers(values):
+    # convert a float column back to integers if it has no missing or fractional
+    # values (giving the same type as pd.read_csv() would have)
+    if values.notna().all() and (values == np.round(values)).all():
+        return values.astype("int64")
+    return values.astype("float64")
+
 
 def load_diabetes_data(path = "../data/samadult.csv"):
-    # load in the original data
-    diabetes_orig = pd.read_csv(path)
+    # load in the original data (just the relevant columns)
+    diabetes_orig = pd.read_csv(path, usecols=list(diabetes_dtypes), dtype=diabetes_dtypes)
 
     # take just one person from each household
-    diabetes = diabetes_orig.groupby("HHX") \
-      .sample(1, random_state=24648765) \
+    diabetes = diabetes_orig.take(sample_one_per_group(diabetes_orig["HHX"], 24648765)) \
       .reset_index() \
       .copy()
     # add an id column
     diabetes["id"] = np.arange(len(diabetes.index))
     # create the house_family_person_id column by joining together three ID columns
-    diabetes["house_family_person_id"] = diabetes.apply(lambda x: "_".join(x[["HHX", "FMX", "FPX"]].astype(int).astype(str)), 
-                                                        axis=1)
+    diabetes["house_family_person_id"] = diabetes["HHX"].astype(str) + "_" + \
+      diabetes["FMX"].astype(str) + "_" + diabetes["FPX"].astype(str)
     # create the diabetes column
     diabetes["diabetes"] = (diabetes["DIBEV1"] == 1).astype(int)
     # create coronary heart disease column
@@ -35,6 +87,8 @@ def load_diabetes_data(path = "../data/samadult.csv"):
                                       "AWEIGHTP": "weight",
                                       "BMI": "bmi",
                                       "AHEIGHT": "height"})
+    for col in ["age", "smoker", "sex", "weight", "bmi", "height"]:
+        diabetes[col] = restore_integers(diabetes[col])
 
     # select just the relevant columns
     diabetes = diabetes[["house_family_person_id",
@@ -52,3 +106,21 @@ def load_diabetes_data(path = "../data/samadult.csv"):
                         "family_history_diabetes"]]
     return(diabetes)
 
+
+def load_diabetes_data_years(paths, n_jobs=-1):
+    # Load several years of the NHIS sample adult survey, e.g.,
+    # load_diabetes_data_years({2015: "../data/samadult_2015.csv",
+    #                           2016: "../data/samadult_2016.csv"})
+    # where `paths` is a dict of the samadult.csv file for each year. Each file is
+    # loaded with load_diabetes_data() (which only reads the relevant columns) in a
+    # separate process (using `n_jobs` processes), and the results are combined
+    # into a single data frame with a year column. Note that the household IDs
+    # are only unique within each year.
+    years = list(paths)
+    diabetes_years = Parallel(n_jobs=n_jobs)(
+        delayed(load_diabetes_data)(paths[year]) for year in years)
+    diabetes = pd.concat([diabetes_year.assign(year=year)
+                          for year, diabetes_year in zip(years, diabetes_years)],
+                         ignore_index=True)
+    # put the year column first
+    return(diabetes[["year"] + [col for col in diabetes.columns if col != "year"]])
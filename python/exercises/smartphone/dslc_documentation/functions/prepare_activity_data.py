@@ -1,6 +1,146 @@
 # Cleaning function for the smartphone activity data
+import json
+import os
+from itertools import zip_longest
 
-# Define a function for  and pre-process the activity data
-def prepare_activity_data(activity_data): 
-    # fill in the details
-    return activity_data
\ No newline at end of file
+import numpy as np
+import pandas as pd
+
+# the raw sensor signals in the "Inertial Signals" folder of each split (each
+# row of each file is a window of 128 readings)
+inertial_signal_names = ["body_acc_x", "body_acc_y", "body_acc_z",
+                         "body_gyro_x", "body_gyro_y", "body_gyro_z",
+                         "total_acc_x", "total_acc_y", "total_acc_z"]
+
+
+def load_feature_names(path="../data/features.txt"):
+    # load the feature names, adding an integer to the duplicated names to
+    # differentiate them (e.g., the second "fBodyAcc-bandsEnergy()-1,8" becomes
+    # "fBodyAcc-bandsEnergy()-1,8_2")
+    column_names = pd.read_csv(path, sep=" ", names=["i", "var"])
+    duplicate_counter = column_names.groupby("var").cumcount() + 1
+    return column_names["var"].where(duplicate_counter == 1,
+                                     column_names["var"] + "_" + duplicate_counter.astype(str)).tolist()
+
+
+def describe_file(path):
+    # a description of a file, which is used to check whether it has changed
+    file_stat = os.stat(path)
+    return {"size": file_stat.st_size, "mtime": file_stat.st_mtime}
+
+
+def parse_float_lines(lines, n_columns, dtype=np.float32):
+    # parse lines of whitespace-separated floats (such as the fixed-width lines of
+    # X_train.txt) into a (number of lines x n_columns) array
+    values = np.fromstring(b"".join(lines).decode("ascii"), dtype=dtype, sep=" ")
+    if values.size != len(lines) * n_columns:
+        raise ValueError("Expected %d values on each line" % n_columns)
+    return values.reshape(len(lines), n_columns)
+
+
+def iter_float_chunks(path, n_columns, chunksize=1000, dtype=np.float32):
+    # parse a text file of whitespace-separated floats chunksize lines at a time
+    with open(path, "rb") as f:
+        while True:
+            lines = [line for _, line in zip(range(chunksize), f) if line.strip()]
+            if not lines:
+                break
+            yield parse_float_lines(lines, n_columns, dtype=dtype)
+
+
+def convert_measurements(path, array_dir, feature_names, chunksize=1000):
+    # parse a measurements file (e.g., X_train.txt) chunksize lines at a time into
+    # a float32 .npy file in array_dir (in column-major order, so that each
+    # feature is contiguous), along with the feature names
+    os.makedirs(array_dir, exist_ok=True)
+    with open(path, "rb") as f:
+        n_rows = sum(1 for line in f if line.strip())
+    array_path = os.path.join(array_dir, "measurements.npy")
+    measurements = np.lib.format.open_memmap(array_path + ".tmp", mode="w+", dtype=np.float32,
+                                             shape=(n_rows, len(feature_names)), fortran_order=True)
+    start = 0
+    for chunk in iter_float_chunks(path, len(feature_names), chunksize=chunksize):
+        measurements[start:(start + len(chunk))] = chunk
+        start += len(chunk)
+    measurements.flush()
+    del measurements
+    os.replace(array_path + ".tmp", array_path)
+
+    # the metadata is written last, so that a partial conversion is never loaded
+    metadata = {"source": describe_file(path),
+                "n_rows": n_rows,
+                "feature_names": list(feature_names)}
+    with open(os.path.join(array_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+    return metadata
+
+
+def load_measurements(path="../data/train/X_train.txt", feature_names=None, array_dir=None,
+                      chunksize=1000):
+    # Load a measurements file (e.g., X_train.txt) as a data frame with a column
+    # for each feature. The first time that a file is loaded, it is parsed into a
+    # float32 .npy file in array_dir (by default, a folder next to the file), and
+    # later calls load the .npy file as a memory map (without parsing or copying
+    # it), as long as the file and the feature names haven't changed.
+    if feature_names is None:
+        feature_names = load_feature_names(os.path.join(os.path.dirname(path), "..", "features.txt"))
+    feature_names = list(feature_names)
+    if array_dir is None:
+        array_dir = os.path.splitext(path)[0] + "_arrays"
+
+    metadata = None
+    try:
+        with open(os.path.join(array_dir, "metadata.json")) as f:
+            metadata = json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+    if metadata is None or metadata["source"] != describe_file(path) or \
+       metadata["feature_names"] != feature_names:
+        metadata = convert_measurements(path, array_dir, feature_names, chunksize=chunksize)
+
+    measurements = np.load(os.path.join(array_dir, "measurements.npy"), mmap_mode="r")
+    # the (column-major) array is the single block of the data frame, so it isn't copied
+    return pd.DataFrame(measurements, columns=metadata["feature_names"], copy=False)
+
+
+def prepare_activity_data(split="train", data_dir="../data", array_dir=None):
+    # Load the measurements of a split ("train" or "val") with the subject ID
+    # (id) and activity label (activity) of each window as the first two columns.
+    # The measurements are loaded with load_measurements() (so that they are only
+    # parsed the first time), and the id and activity columns are added to the
+    # data frame without copying the measurements.
+    feature_names = load_feature_names(os.path.join(data_dir, "features.txt"))
+    activity_data = load_measurements(os.path.join(data_dir, split, "X_%s.txt" % split),
+                                      feature_names=feature_names, array_dir=array_dir)
+
+    subject_id = np.loadtxt(os.path.join(data_dir, split, "subject_%s.txt" % split), dtype=np.int64, ndmin=1)
+    activity_code = np.loadtxt(os.path.join(data_dir, split, "y_%s.txt" % split), dtype=np.int64, ndmin=1)
+    if not len(subject_id) == len(activity_code) == len(activity_data.index):
+        raise ValueError("The %s subject, activity and measurement files have different numbers of rows" % split)
+    activity_labels = pd.read_csv(os.path.join(data_dir, "activity_labels.txt"), sep=" ",
+                                  names=["code", "activity"])
+    activity = pd.Categorical.from_codes(
+        pd.Index(activity_labels["code"]).get_indexer(activity_code),
+        categories=activity_labels["activity"])
+
+    # insert() adds the columns as new blocks, rather than copying the measurements
+    activity_data.insert(0, "id", subject_id)
+    activity_data.insert(1, "activity", activity)
+    return activity_data
+
+
+def iter_inertial_signals(split="train", data_dir="../data", signals=inertial_signal_names,
+                          chunksize=1000):
+    # Read the raw sensor signal windows of a split ("Inertial Signals" folder)
+    # chunksize windows at a time, without loading the whole files. Yields a
+    # float32 array with dimensions (windows x readings x signals) for each chunk.
+    signal_dir = os.path.join(data_dir, split, "Inertial Signals")
+    paths = [os.path.join(signal_dir, "%s_%s.txt" % (signal, split)) for signal in signals]
+    with open(paths[0], "rb") as f:
+        n_readings = len(next(f).split())
+    readers = [iter_float_chunks(path, n_readings, chunksize=chunksize) for path in paths]
+    # (zip_longest, so that the extra rows of a longer file aren't silently dropped)
+    for chunks in zip_longest(*readers):
+        if any(chunk is None for chunk in chunks) or len(set(len(chunk) for chunk in chunks)) > 1:
+            raise ValueError("The %s inertial signal files have different numbers of rows" % split)
+        yield np.stack(chunks, axis=-1)
@@ -1,40 +1,192 @@
 # Cleaning function for the food data
+import numpy as np
 import pandas as pd
+from scipy import sparse as sp
+
+from functions.stage_trace import record_stages
+
+select_data_type_options = ["survey_fndds_food", "branded_food", "foundation_food",
+                            "sr_legacy_food", "sub_sample_food", "agricultural_acquisition"]
+
 
 # Clean the food data
 def clean_food_data(nutrient_amount_data,
                     food_name_data,
                     nutrient_name_data,
-                    select_data_type="survey_fndds_food"):
-  
-  select_data_type_options = ["survey_fndds_food", "branded_food", "foundation_food",
-                              "sr_legacy_food", "sub_sample_food", "agricultural_acquisition"]
+                    select_data_type="survey_fndds_food",
+                    sparse=False):
+
   if select_data_type not in select_data_type_options:
     raise ValueError("Invalid select_data_type. Expected one of: %s" % select_data_type_options)
-  
-  # filter the nutrient and food ID datasets to the relevant columns and
-  nutrient_amount_lite = nutrient_amount_data[["fdc_id", "nutrient_id", "amount"]]
+
+  return clean_food_data_all(nutrient_amount_data, food_name_data, nutrient_name_data,
+                             select_data_types=[select_data_type],
+                             sparse=sparse)[select_data_type]
+
+
+
+# Clean the food data for several data types at once, returning a dict with the
+# cleaned data for each data type in select_data_types (the same as calling
+# clean_food_data() for each one, but the nutrient amount data is only
+# processed once)
+#
+# Rather than joining the food descriptions and nutrient names (strings) onto
+# every row of the (very large) nutrient amount data and then filtering, each
+# row is matched to the foods of the selected data types first, and the
+# descriptions and nutrient names are replaced by integer codes. The wide data
+# (one row per food description and one column per nutrient name, with the
+# mean of the distinct amounts for each pair) is then accumulated from the
+# codes as a sparse (CSR) matrix. If `sparse` is True, the columns of the cleaned
+# data frames are sparse (missing values are not stored).
+def clean_food_data_all(nutrient_amount_data,
+                        food_name_data,
+                        nutrient_name_data,
+                        select_data_types=select_data_type_options,
+                        sparse=False):
+
+  for select_data_type in select_data_types:
+    if select_data_type not in select_data_type_options:
+      raise ValueError("Invalid select_data_type. Expected one of: %s" % select_data_type_options)
+
+  # record the time and memory of each stage (only inside trace_stages(), see
+  # stage_trace.py)
+  stages = record_stages("clean_food_data", nutrient_amount_data,
+                         select_data_types=list(select_data_types),
+                         sparse=sparse)
+
+  food_codes, descriptions, nutrient_names = encode_food_data(nutrient_amount_data,
+                                                              food_name_data,
+                                                              nutrient_name_data,
+                                                              select_data_types)
+  stages.mark("encode_food_data", food_codes)
+  food_clean = {}
+  for data_type_code, select_data_type in enumerate(select_data_types):
+    food_codes_type = food_codes
+    if len(select_data_types) > 1:
+      food_codes_type = food_codes[food_codes["data_type"] == data_type_code]
+    # (the intermediate arrays of pivot_food_codes() are freed before the wide
+    # data frame is created)
+    amount_means, food_index, columns = pivot_food_codes(food_codes_type, descriptions,
+                                                         nutrient_names)
+    stages.mark("pivot_food_codes (%s)" % select_data_type, amount_means)
+    food_clean[select_data_type] = sparse_to_frame(amount_means, food_index, columns, sparse)
+    stages.mark("sparse_to_frame (%s)" % select_data_type, food_clean[select_data_type])
+  return stages.finish(food_clean)
+
+
+
+# Replace the food and nutrient ids of the nutrient amount data with integer
+# codes for the data type and description of each food and the name of each
+# nutrient, keeping just the rows for foods of the selected data types (in their
+# original order). Returns the codes, along with the descriptions and the
+# (alphabetically sorted) nutrient names that they refer to.
+def encode_food_data(nutrient_amount_data, food_name_data, nutrient_name_data,
+                     select_data_types):
+
+  # the foods of the selected data types
   food_name_lite = food_name_data[["fdc_id", "data_type", "description"]]
-  
-  # join the tables to create one dataset
-  food_clean = nutrient_amount_lite.merge(food_name_lite, on="fdc_id", how="left") \
-    .merge(nutrient_name_data, on="nutrient_id", how="left") 
-  
-  # filter to just fndds foods (default)
-  food_clean = food_clean.query("data_type == @select_data_type")
-  food_index = food_clean.description.drop_duplicates()
-
-  # convert to wide tidy form
-  food_clean = (
-    food_clean[["description", "amount", "nutrient_name"]].drop_duplicates() 
-      .dropna(subset="nutrient_name") \
-      # deal with duplicate description/nutrient_name entries
-      .groupby(["description", "nutrient_name"])["amount"].mean() 
-      .unstack()
-  )
-  # remove column index name
-  food_clean.columns.name = None
-  # remove alphabetical ordering of index
-  food_clean = food_clean.reindex(index=food_index)
-  
-  return food_clean
\ No newline at end of file
+  food_name_lite = food_name_lite[food_name_lite["data_type"].isin(select_data_types)]
+  food_data_type_codes = pd.Index(select_data_types).get_indexer(food_name_lite["data_type"])
+  food_description_codes, descriptions = pd.factorize(food_name_lite["description"],
+                                                      use_na_sentinel=False)
+
+  # nutrient names that are shared by several nutrient ids get the same code, and
+  # missing nutrient names get the code -1
+  nutrient_name_codes, nutrient_names = pd.factorize(nutrient_name_data["nutrient_name"], sort=True)
+
+  # match each row of the nutrient amount data to its food, and filter to the
+  # foods of the selected data types
+  food_rows = pd.Index(food_name_lite["fdc_id"]).get_indexer(nutrient_amount_data["fdc_id"])
+  keep = food_rows >= 0
+  food_rows = food_rows[keep]
+  nutrient_rows = pd.Index(nutrient_name_data["nutrient_id"]) \
+    .get_indexer(nutrient_amount_data["nutrient_id"].to_numpy()[keep])
+
+  food_codes = pd.DataFrame({
+    "data_type": food_data_type_codes[food_rows].astype(np.int8),
+    "description": food_description_codes[food_rows].astype(np.int32),
+    "nutrient_name": np.where(nutrient_rows >= 0, nutrient_name_codes[nutrient_rows], -1).astype(np.int32),
+    "amount": nutrient_amount_data["amount"].to_numpy(dtype=float)[keep]})
+  return food_codes, descriptions, nutrient_names
+
+
+
+# Convert the codes of a single data type to wide form, with a row for each
+# description (in order of appearance) and a column for each nutrient name (in
+# alphabetical order), containing the mean of the distinct amounts for each
+# description/nutrient name pair. Returns a sparse (CSR) matrix of the means,
+# along with the descriptions and nutrient names of its rows and columns.
+def pivot_food_codes(food_codes, descriptions, nutrient_names):
+
+  # the descriptions in order of appearance (including those with no named nutrients)
+  description_codes = pd.unique(food_codes["description"].to_numpy())
+  row_positions = np.full(len(descriptions), -1, dtype=np.int32)
+  row_positions[description_codes] = np.arange(len(description_codes))
+  food_index = pd.Index(descriptions[description_codes], name="description")
+
+  # remove the rows with missing nutrient names or descriptions
+  missing_description = pd.isna(descriptions)
+  food_codes = food_codes[(food_codes["nutrient_name"] >= 0) &
+                          ~missing_description[food_codes["description"].to_numpy()]]
+
+  # the nutrient names that appear (in alphabetical order, since the codes are sorted)
+  nutrient_codes = np.unique(food_codes["nutrient_name"].to_numpy())
+  col_positions = np.full(len(nutrient_names), -1, dtype=np.int32)
+  col_positions[nutrient_codes] = np.arange(len(nutrient_codes))
+  columns = pd.Index(nutrient_names[nutrient_codes])
+
+  # the (row, column) entry of each amount in COO form, sorted by row, column and
+  # amount
+  rows = row_positions[food_codes["description"].to_numpy()]
+  cols = col_positions[food_codes["nutrient_name"].to_numpy()]
+  amounts = food_codes["amount"].to_numpy()
+  order = np.lexsort((amounts, cols, rows))
+  rows, cols, amounts = rows[order], cols[order], amounts[order]
+
+  # remove the duplicate description/nutrient name/amount entries (missing amounts
+  # are duplicates of each other, as in drop_duplicates())
+  new_entry = np.ones(len(rows), dtype=bool)
+  new_entry[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+  new_amount = np.ones(len(rows), dtype=bool)
+  new_amount[1:] = (amounts[1:] != amounts[:-1]) & ~(np.isnan(amounts[1:]) & np.isnan(amounts[:-1]))
+  keep = new_entry | new_amount
+  rows, cols, amounts, new_entry = rows[keep], cols[keep], amounts[keep], new_entry[keep]
+
+  # accumulate the sum and the number of (non-missing) amounts of each entry into
+  # CSR form (entries with only missing amounts have a mean of NaN)
+  entry_starts = np.flatnonzero(new_entry)
+  observed = ~np.isnan(amounts)
+  amount_sums = np.zeros(len(entry_starts))
+  amount_counts = np.zeros(len(entry_starts))
+  if len(entry_starts) > 0:
+    amount_sums = np.add.reduceat(np.where(observed, amounts, 0), entry_starts)
+    amount_counts = np.add.reduceat(observed.astype(float), entry_starts)
+  row_counts = np.bincount(rows[entry_starts], minlength=len(food_index))
+  with np.errstate(invalid="ignore"):
+    amount_means = sp.csr_matrix((amount_sums / amount_counts,
+                                  cols[entry_starts],
+                                  np.concatenate([[0], np.cumsum(row_counts)])),
+                                 shape=(len(food_index), len(columns)))
+
+  return amount_means, food_index, columns
+
+
+
+# Convert a sparse matrix to a data frame in which the entries that aren't
+# stored are missing values, either with dense columns or with sparse columns
+def sparse_to_frame(matrix, index, columns, sparse=False):
+  if not sparse:
+    values = np.full(matrix.shape, np.nan)
+    matrix = matrix.tocoo()
+    values[matrix.row, matrix.col] = matrix.data
+    return pd.DataFrame(values, index=index, columns=columns)
+
+  # build each sparse column from the CSC form (one dense column at a time)
+  matrix = matrix.tocsc()
+  sparse_columns = {}
+  for j, col in enumerate(columns):
+    values = np.full(matrix.shape[0], np.nan)
+    start, end = matrix.indptr[j], matrix.indptr[j + 1]
+    values[matrix.indices[start:end]] = matrix.data[start:end]
+    sparse_columns[col] = pd.arrays.SparseArray(values, fill_value=np.nan)
+  return pd.DataFrame(sparse_columns, index=index)
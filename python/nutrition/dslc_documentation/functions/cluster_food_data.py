@@ -0,0 +1,186 @@
+# Clustering functions for the (pre-processed) food data
+#
+# These functions cluster the output of preprocess_food_data() (or any other
+# numeric data frame or array, such as the output of preprocess_ames_data()):
+#   - the data is written once to a float32 .npy file (in chunks of rows), which
+#     is loaded as a memory map by each of the parallel workers, rather than
+#     being copied to each worker
+#   - k-means uses MiniBatchKMeans, which only needs a small batch of rows at a
+#     time, so that the ~300k-food branded table can be clustered quickly
+#   - the sweep over k and the stability fits (to random subsamples of the
+#     rows) are all separate tasks that are run in parallel
+#   - hierarchical clustering uses a precomputed condensed (float32) distance
+#     matrix, which is computed in blocks of rows into a memory-mapped file, and
+#     the tree is cut at every k. Note that scipy's linkage() copies the
+#     distances into an in-memory float64 array, so building the tree needs
+#     n(n - 1)/2 * 8 bytes of RAM on top of the (float32, possibly
+#     memory-mapped) distances: ~0.4 GB for 10k rows, but ~1.6 GB for 20k rows.
+#     This is only feasible for up to ~10k rows, e.g., the FNDDS and SR legacy
+#     tables
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import cdist
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+
+# write a data frame (or array) to a float32 .npy file, chunksize rows at a
+# time, and return it as a (read-only) memory map
+def write_float32_array(data, path, chunksize=100000):
+  if isinstance(data, pd.DataFrame):
+    data = data.to_numpy(copy=False)
+  array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=data.shape)
+  for start in range(0, data.shape[0], chunksize):
+    array[start:(start + chunksize)] = data[start:(start + chunksize)]
+  array.flush()
+  del array
+  return np.load(path, mmap_mode="r")
+
+
+
+# the rows of random subsample `subsample_id` (sorted, so that the rows are read
+# from the memory map in order), generated from (seed, subsample_id) so that the
+# subsamples don't depend on how the work is split up
+def subsample_indices(n_obs, subsample_fraction, seed, subsample_id):
+  rng = np.random.default_rng([seed, subsample_id])
+  return np.sort(rng.choice(n_obs, size=int(round(subsample_fraction * n_obs)), replace=False))
+
+
+
+# fit k-means with k clusters (in a worker) to all of the rows (if subsample_id
+# is None) or to a subsample of the rows, returning the cluster labels of all of
+# the rows (only if subsample_id is None) and of the evaluation rows, along with
+# the inertia and the silhouette score on the evaluation rows
+def kmeans_task(data_path, k, subsample_id, eval_ids, subsample_fraction, seed,
+                batch_size, n_init):
+  data = np.load(data_path, mmap_mode="r")
+  if subsample_id is None:
+    fit_data = data
+  else:
+    fit_data = data[subsample_indices(data.shape[0], subsample_fraction, seed, subsample_id)]
+  kmeans = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=n_init,
+                           random_state=np.random.default_rng([seed, k]).integers(2 ** 31))
+  kmeans.fit(fit_data)
+  eval_data = data[eval_ids]
+  eval_labels = kmeans.predict(eval_data).astype(np.int32)
+
+  result = {"k": k, "subsample_id": subsample_id, "eval_labels": eval_labels}
+  if subsample_id is None:
+    result["labels"] = kmeans.labels_.astype(np.int32)
+    result["inertia"] = kmeans.inertia_
+    result["silhouette"] = silhouette_score(eval_data, eval_labels) \
+      if len(np.unique(eval_labels)) > 1 else np.nan
+  return result
+
+
+
+# the mean adjusted Rand index between each pair of clusterings (the rows of
+# labels), which is 1 if the clusterings are all the same
+def mean_pairwise_ari(labels):
+  aris = [adjusted_rand_score(labels[i], labels[j])
+          for i in range(len(labels)) for j in range(i + 1, len(labels))]
+  return np.mean(aris) if aris else np.nan
+
+
+
+# fit mini-batch k-means for each k in ks in parallel, and evaluate the
+# stability of the clusters for each k by also fitting k-means to n_subsamples
+# random subsamples of the rows (each with subsample_fraction of the rows). Each
+# subsample fit is used to cluster the same random "evaluation" rows, and the
+# stability is the mean adjusted Rand index between each pair of these
+# clusterings. Returns a data frame with the inertia, the silhouette score (on
+# the evaluation rows) and the stability for each k, and a dict with the cluster
+# labels of every row for each k.
+#   data: a data frame (e.g., the output of preprocess_food_data()) or array, or
+#     the path of a float32 .npy file (see write_float32_array())
+#   n_eval: the number of evaluation rows
+#   batch_size, n_init: passed to MiniBatchKMeans()
+#   seed: the random seed for the subsamples, the evaluation rows and k-means
+#   n_jobs: the number of parallel workers
+#   temp_folder: where the float32 copy of the data is written (if data isn't
+#     already a path)
+def kmeans_sweep(data, ks=range(2, 31), n_subsamples=10, subsample_fraction=0.5,
+                 n_eval=10000, batch_size=4096, n_init=3, seed=0, n_jobs=-1,
+                 temp_folder=None):
+  data_folder = None
+  try:
+    if isinstance(data, (str, os.PathLike)):
+      data_path = data
+    else:
+      data_folder = tempfile.mkdtemp(prefix="cluster_food_data_", dir=temp_folder)
+      data_path = os.path.join(data_folder, "data.npy")
+      write_float32_array(data, data_path)
+    n_obs = np.load(data_path, mmap_mode="r").shape[0]
+    eval_ids = np.sort(np.random.default_rng([seed, n_obs]).choice(n_obs, size=min(n_eval, n_obs),
+                                                                   replace=False))
+
+    results = Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+      delayed(kmeans_task)(data_path, k, subsample_id, eval_ids, subsample_fraction,
+                           seed, batch_size, n_init)
+      for k in ks
+      for subsample_id in [None] + list(range(n_subsamples)))
+    fits = {}
+    subsample_labels = {k: [None] * n_subsamples for k in ks}
+    for result in results:
+      if result["subsample_id"] is None:
+        fits[result["k"]] = result
+      else:
+        subsample_labels[result["k"]][result["subsample_id"]] = result["eval_labels"]
+  finally:
+    if data_folder is not None:
+      shutil.rmtree(data_folder, ignore_errors=True)
+
+  summary = pd.DataFrame({"k": list(ks),
+                          "inertia": [fits[k]["inertia"] for k in ks],
+                          "silhouette": [fits[k]["silhouette"] for k in ks],
+                          "stability": [mean_pairwise_ari(subsample_labels[k]) for k in ks]})
+  return summary, {k: fits[k]["labels"] for k in ks}
+
+
+
+# compute the condensed Euclidean distance matrix of the rows of data (as
+# returned by scipy's pdist(), but in float32), block_size rows at a time. If
+# path is given, the distances are written to a memory-mapped .npy file.
+def condensed_distances(data, path=None, block_size=1024):
+  if isinstance(data, pd.DataFrame):
+    data = data.to_numpy(copy=False)
+  n_obs = data.shape[0]
+  n_distances = n_obs * (n_obs - 1) // 2
+  if path is None:
+    distances = np.empty(n_distances, dtype=np.float32)
+  else:
+    distances = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n_distances,))
+
+  for start in range(0, n_obs, block_size):
+    end = min(start + block_size, n_obs)
+    block = cdist(data[start:end], data[start:]).astype(np.float32)
+    for i in range(start, end):
+      # the distances from row i to rows i + 1, ..., n_obs - 1
+      offset = i * n_obs - i * (i + 1) // 2
+      distances[offset:(offset + n_obs - i - 1)] = block[i - start, (i - start + 1):]
+
+  if path is not None:
+    distances.flush()
+    del distances
+    distances = np.load(path, mmap_mode="r")
+  return distances
+
+
+
+# hierarchical clustering from a condensed distance matrix (see
+# condensed_distances()), cutting the tree into k clusters for each k in ks.
+# Returns a dict with the cluster labels (starting from 0) for each k.
+# linkage() converts the distances to a C-contiguous float64 array, i.e., a
+# copy in memory at twice the size of the float32 distances (even if they are
+# memory-mapped), so keep to ~10k rows or fewer.
+#   method: the linkage method, passed to scipy's linkage() (e.g., "ward",
+#     "average" or "complete")
+def hierarchical_sweep(distances, ks=range(2, 31), method="ward"):
+  tree = linkage(distances, method=method)
+  return {k: (fcluster(tree, t=k, criterion="maxclust") - 1).astype(np.int32) for k in ks}
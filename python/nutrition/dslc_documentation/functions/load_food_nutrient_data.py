@@ -0,0 +1,84 @@
+# Load the nutrient amount data (food_nutrient.csv) from memory-mapped arrays
+#
+# Parsing the full food_nutrient.csv file (with all of its columns) is slow and
+# uses a lot of memory, but only the fdc_id, nutrient_id and amount columns are
+# used by clean_food_data(). The first time that load_food_nutrient_data() is
+# called for a csv file, the file is read in chunks (so that only one chunk of
+# the csv file is in memory at a time), and these three columns are appended to
+# a binary file each. Later calls load the columns from the binary files as
+# memory maps (without parsing or copying them), as long as the csv file hasn't
+# changed since it was converted.
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# the types of the columns that are kept (the amounts are kept as float64 so
+# that they are exactly the same as when the csv file is read with pd.read_csv())
+food_nutrient_dtypes = {"fdc_id": "int32",
+                        "nutrient_id": "int32",
+                        "amount": "float64"}
+
+
+# a description of the csv file, which is used to check whether it has changed
+def describe_file(path):
+  file_stat = os.stat(path)
+  return {"size": file_stat.st_size, "mtime": file_stat.st_mtime}
+
+
+
+# convert the relevant columns of a food_nutrient.csv file to a binary file
+# for each column in array_dir, reading chunksize rows at a time
+def convert_food_nutrient_data(path, array_dir, chunksize=1000000, dtype=food_nutrient_dtypes):
+  os.makedirs(array_dir, exist_ok=True)
+  column_files = {col: open(os.path.join(array_dir, col + ".bin.tmp"), "wb") for col in dtype}
+  n_rows = 0
+  try:
+    for chunk in pd.read_csv(path, usecols=list(dtype), dtype=dtype, chunksize=chunksize):
+      for col, column_file in column_files.items():
+        chunk[col].to_numpy(dtype=dtype[col]).tofile(column_file)
+      n_rows += len(chunk.index)
+  finally:
+    for column_file in column_files.values():
+      column_file.close()
+  for col in dtype:
+    os.replace(os.path.join(array_dir, col + ".bin.tmp"), os.path.join(array_dir, col + ".bin"))
+
+  # the metadata is written last, so that a partial conversion is never loaded
+  metadata = {"source": describe_file(path),
+              "n_rows": n_rows,
+              "dtype": dtype}
+  with open(os.path.join(array_dir, "metadata.json"), "w") as f:
+    json.dump(metadata, f)
+  return metadata
+
+
+
+# load the fdc_id, nutrient_id and amount columns of a food_nutrient.csv file as
+# a data frame whose columns are memory maps of the converted binary files in
+# array_dir (by default, a folder next to the csv file), converting the csv
+# file first if it hasn't been converted (or has changed since it was)
+def load_food_nutrient_data(path="../data/food_nutrient.csv", array_dir=None,
+                            chunksize=1000000, dtype=food_nutrient_dtypes):
+  if array_dir is None:
+    array_dir = os.path.splitext(path)[0] + "_arrays"
+
+  metadata = None
+  try:
+    with open(os.path.join(array_dir, "metadata.json")) as f:
+      metadata = json.load(f)
+  except (FileNotFoundError, ValueError):
+    pass
+  if metadata is None or metadata["source"] != describe_file(path) or metadata["dtype"] != dtype:
+    metadata = convert_food_nutrient_data(path, array_dir, chunksize=chunksize, dtype=dtype)
+
+  columns = {}
+  for col, col_dtype in metadata["dtype"].items():
+    if metadata["n_rows"] == 0:
+      columns[col] = np.zeros(0, dtype=col_dtype)
+    else:
+      columns[col] = np.memmap(os.path.join(array_dir, col + ".bin"), dtype=col_dtype,
+                               mode="r", shape=(metadata["n_rows"],))
+  # copy=False keeps each column as a separate (memory-mapped) array
+  return pd.DataFrame(columns, copy=False)
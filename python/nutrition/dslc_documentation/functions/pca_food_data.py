@@ -0,0 +1,193 @@
+# Principal component analysis of the pre-processed food data, in chunks
+#
+# Rather than pre-processing the whole cleaned food data frame and running PCA
+# on the full pre-processed matrix (for every pre-processing perturbation):
+#   - the pre-processing means and SDs are computed from the cleaned data in
+#     chunks of rows, and each chunk is then pre-processed with
+#     preprocess_food_data(chunk, stats=...), so that only one chunk of the
+#     pre-processed data is in memory at a time
+#   - the column means and the covariance matrix of the pre-processed data are
+#     accumulated over the chunks (this is a one-pass, incremental fit, since
+#     there are only ~65 nutrient columns), and the principal components are the
+#     eigenvectors of the covariance matrix (as for sklearn's PCA())
+#   - the perturbations that differ only in `remove_fat` share the covariance
+#     matrix, since removing the fat column just removes its row and column
+#     (the other columns are pre-processed the same way either way)
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from functions.preprocess_food_data import is_numeric_column, preprocess_food_data
+
+
+# the rows of a data frame, chunksize rows at a time
+def iter_chunks(data, chunksize):
+  for start in range(0, len(data.index), chunksize):
+    yield data.iloc[start:(start + chunksize)]
+
+
+
+# combine the counts, means and (co)variance sums (the sums of the squared
+# deviations from the means, or of their products) of two sets of rows (Chan et
+# al.'s pairwise update)
+def combine_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+  count = count_a + count_b
+  with np.errstate(invalid="ignore", divide="ignore"):
+    delta = np.where(count > 0, mean_b - mean_a, 0)
+    weight = np.where(count > 0, count_a * count_b / count, 0)
+    mean = np.where(count > 0, mean_a + delta * count_b / count, 0)
+  if np.ndim(m2_b) == 2:
+    m2 = m2_a + m2_b + np.outer(delta, delta) * weight
+  else:
+    m2 = m2_a + m2_b + delta ** 2 * weight
+  return count, mean, m2
+
+
+
+# the means and SDs of the (log-transformed) numeric columns of the cleaned food
+# data, ignoring missing values, computed chunksize rows at a time. Returns a
+# data frame in the same form as the stats returned by
+# preprocess_food_data(..., return_stats=True).
+def food_preprocessing_stats(food_clean, log_transform=True, chunksize=50000):
+  numeric_cols = [col for col in food_clean.columns if is_numeric_column(food_clean[col])]
+  count, mean, m2 = np.zeros(len(numeric_cols)), np.zeros(len(numeric_cols)), np.zeros(len(numeric_cols))
+  for chunk in iter_chunks(food_clean, chunksize):
+    values = chunk[numeric_cols].to_numpy(dtype=float, copy=True)
+    if log_transform:
+      values += 1
+      np.log10(values, out=values)
+    missing = np.isnan(values)
+    chunk_count = values.shape[0] - missing.sum(axis=0)
+    values[missing] = 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+      chunk_mean = np.where(chunk_count > 0, values.sum(axis=0) / chunk_count, 0)
+    deviations = np.where(missing, 0, values - chunk_mean)
+    chunk_m2 = np.einsum("ij,ij->j", deviations, deviations)
+    count, mean, m2 = combine_moments(count, mean, m2, chunk_count, chunk_mean, chunk_m2)
+
+  with np.errstate(invalid="ignore", divide="ignore"):
+    sd = np.sqrt(m2 / (count - 1))
+  mean[count == 0] = np.nan
+  sd[count < 2] = np.nan
+  return pd.DataFrame({"mean": mean, "sd": sd}, index=pd.Index(numeric_cols))
+
+
+
+# the number of rows, the column means and the covariance matrix of the
+# pre-processed food data (as returned by preprocess_food_data(food_clean, ...,
+# stats=stats)), accumulated chunksize rows at a time
+def food_covariance(food_clean, stats, log_transform=True, center=True, scale=True,
+                    remove_fat=False, chunksize=50000):
+  count, mean, m2 = 0, 0, 0
+  for chunk in iter_chunks(food_clean, chunksize):
+    food_chunk = preprocess_food_data(chunk, log_transform=log_transform, center=center,
+                                      scale=scale, remove_fat=remove_fat, stats=stats)
+    food_chunk = food_chunk[[col for col in food_chunk.columns if is_numeric_column(food_chunk[col])]]
+    values = food_chunk.to_numpy(dtype=float)
+    chunk_mean = values.mean(axis=0)
+    deviations = values - chunk_mean
+    count, mean, m2 = combine_moments(count, mean, m2, len(values), chunk_mean,
+                                      deviations.T @ deviations)
+  columns = food_chunk.columns
+  return count, pd.Series(mean, index=columns), pd.DataFrame(m2 / (count - 1), index=columns, columns=columns)
+
+
+
+# the principal components of a covariance matrix (see food_covariance()),
+# without the columns in drop_columns. Returns a dict with the column means,
+# the components (one row for each component, with the sign chosen so that the
+# largest loading of each component is positive, as in sklearn's PCA()), and the
+# variance (and proportion of the total variance) explained by each component.
+def pca_from_covariance(mean, covariance, n_components=None, drop_columns=()):
+  mean = mean.drop(index=list(drop_columns))
+  covariance = covariance.drop(index=list(drop_columns), columns=list(drop_columns))
+  if n_components is None:
+    n_components = len(mean)
+
+  eigenvalues, eigenvectors = np.linalg.eigh(covariance.to_numpy())
+  order = np.argsort(eigenvalues)[::-1][:n_components]
+  components = eigenvectors[:, order].T
+  signs = np.sign(components[np.arange(n_components), np.argmax(np.abs(components), axis=1)])
+  components *= signs[:, np.newaxis]
+  explained_variance = np.maximum(eigenvalues[order], 0)
+
+  return {"mean": mean,
+          "components": pd.DataFrame(components, columns=mean.index,
+                                     index=["PC%d" % (i + 1) for i in range(n_components)]),
+          "explained_variance": explained_variance,
+          "explained_variance_ratio": explained_variance / np.trace(covariance.to_numpy())}
+
+
+
+# the principal component scores of the cleaned food data (pre-processed with
+# preprocess_food_data(food_clean, ..., stats=stats)), computed chunksize rows
+# at a time. The stats (see food_preprocessing_stats()) and the pre-processing
+# options must be the same as those used to compute the covariance matrix.
+def transform_food_pca(food_clean, pca, stats, log_transform=True, center=True, scale=True,
+                       remove_fat=False, chunksize=50000):
+  components = pca["components"]
+  scores = []
+  for chunk in iter_chunks(food_clean, chunksize):
+    food_chunk = preprocess_food_data(chunk, log_transform=log_transform, center=center,
+                                      scale=scale, remove_fat=remove_fat, stats=stats)
+    values = food_chunk[components.columns].to_numpy(dtype=float) - pca["mean"].to_numpy()
+    scores.append(pd.DataFrame(values @ components.to_numpy().T, index=food_chunk.index,
+                               columns=components.index))
+  return pd.concat(scores)
+
+
+
+# fit PCA to the cleaned food data pre-processed with each combination of the
+# pre-processing options in `perturbations` (a list of dicts of
+# preprocess_food_data() arguments, e.g., {"log_transform": True, "center": True,
+# "scale": True, "remove_fat": False}), sharing the pre-processing stats between
+# perturbations with the same log_transform, and the covariance matrix between
+# perturbations that differ only in remove_fat. Returns a list with the PCA
+# (see pca_from_covariance()) of each perturbation, and a data frame with the
+# time and the peak memory allocated (measured with tracemalloc) to fit each
+# perturbation, and whether its stats and covariance matrix were computed or
+# taken from the cache.
+def pca_perturbations(food_clean, perturbations, n_components=None, chunksize=50000):
+  stats_cache = {}
+  covariance_cache = {}
+  pca_list = []
+  timings = []
+  tracing = tracemalloc.is_tracing()
+  if not tracing:
+    tracemalloc.start()
+  try:
+    for perturbation in perturbations:
+      options = {"log_transform": True, "center": True, "scale": True, "remove_fat": False}
+      options.update(perturbation)
+      tracemalloc.reset_peak()
+      start = time.perf_counter()
+
+      stats_cached = options["log_transform"] in stats_cache
+      if not stats_cached:
+        stats_cache[options["log_transform"]] = food_preprocessing_stats(
+          food_clean, log_transform=options["log_transform"], chunksize=chunksize)
+      stats = stats_cache[options["log_transform"]]
+
+      # the covariance matrix with the fat column (which is dropped afterwards if
+      # remove_fat is True)
+      covariance_key = (options["log_transform"], options["center"], options["scale"])
+      covariance_cached = covariance_key in covariance_cache
+      if not covariance_cached:
+        covariance_cache[covariance_key] = food_covariance(
+          food_clean, stats, log_transform=options["log_transform"], center=options["center"],
+          scale=options["scale"], chunksize=chunksize)
+      _, mean, covariance = covariance_cache[covariance_key]
+
+      pca_list.append(pca_from_covariance(mean, covariance, n_components=n_components,
+                                          drop_columns=["fat"] if options["remove_fat"] else []))
+      timings.append(dict(options,
+                          stats_cached=stats_cached,
+                          covariance_cached=covariance_cached,
+                          time_s=time.perf_counter() - start,
+                          peak_mb=tracemalloc.get_traced_memory()[1] / 1e6))
+  finally:
+    if not tracing:
+      tracemalloc.stop()
+  return pca_list, pd.DataFrame(timings)
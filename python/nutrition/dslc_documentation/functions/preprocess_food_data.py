@@ -3,30 +3,100 @@ import pandas as pd
 import numpy as np
 
 # Clean the food data
-def preprocess_food_data(food_clean, 
+#
+# The numeric columns are extracted once as a single float array, and the log-
+# transformation, centering, SD-scaling and mean imputation are all applied to
+# that array in place (the other columns are added back without being copied).
+#
+# If `return_stats` is True, the means and SDs of the (log-transformed) numeric
+# columns are also returned, as a data frame with a "mean" and an "sd" column
+# and a row for each numeric column. These can be passed as `stats` to
+# pre-process another dataset using these means and SDs (rather than its own),
+# e.g., to put the external validation data on the same scale:
+#
+#   food_fndds_preprocessed, food_fndds_stats = preprocess_food_data(food_fndds_clean, return_stats=True)
+#   food_legacy_preprocessed = preprocess_food_data(food_legacy_clean, stats=food_fndds_stats)
+#
+# The missing values are imputed with the (transformed) mean of each column,
+# which is 0 when the columns are centered.
+def preprocess_food_data(food_clean,
                          log_transform=True,
                          center=True,
                          scale=True,
-                         remove_fat=False):
-  
-  food_pre_processed = food_clean.copy()
+                         remove_fat=False,
+                         stats=None,
+                         return_stats=False):
 
+  if remove_fat:
+    food_clean = food_clean.drop(columns="fat")
+
+  # a (column-major) copy of the numeric columns
+  numeric_cols = [col for col in food_clean.columns if is_numeric_column(food_clean[col])]
+  food_numeric = food_clean if len(numeric_cols) == len(food_clean.columns) else food_clean[numeric_cols]
+  values = np.array(food_numeric.to_numpy(dtype=float), order="F", copy=True)
+
+  # the log-transformation (the same computation as np.log10(x + 1))
   if log_transform:
-    food_pre_processed = food_pre_processed.apply(lambda x: np.log10(x + 1) if np.issubdtype(x.dtype, np.number) else x)
-  
-  
+    values += 1
+    np.log10(values, out=values)
+
+  # the means of each (log-transformed) column, ignoring missing values (which
+  # are set to 0 until they are imputed)
+  missing = np.isnan(values)
+  values[missing] = 0
+  counts = values.shape[0] - missing.sum(axis=0)
+  if stats is None:
+    with np.errstate(invalid="ignore"):
+      means = values.sum(axis=0) / counts
+  else:
+    missing_cols = [col for col in numeric_cols if col not in stats.index]
+    if missing_cols:
+      raise ValueError("stats has no mean and SD for the columns: %s" % missing_cols)
+    means = stats.loc[numeric_cols, "mean"].to_numpy(dtype=float)
+    sds = stats.loc[numeric_cols, "sd"].to_numpy(dtype=float)
+
   # perform centering
   if center:
-    food_pre_processed = food_pre_processed.apply(lambda x: x - x.mean() if np.issubdtype(x.dtype, np.number) else x)
-  
+    values -= means
+    values[missing] = 0
+
+  # the SDs of each column, from the squared deviations from the means
+  if stats is None:
+    deviations = values if center else np.where(missing, 0, values - means)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      sds = np.sqrt(np.einsum("ij,ij->j", deviations, deviations) / (counts - 1))
+    sds[counts < 2] = np.nan
+
   # perform SD-scaling
   if scale:
-    food_pre_processed = food_pre_processed.apply(lambda x: x / x.std() if np.issubdtype(x.dtype, np.number) else x)
-  
-  if remove_fat:
-    food_pre_processed = food_pre_processed.drop(columns="fat")
-  
+    with np.errstate(invalid="ignore", divide="ignore"):
+      values /= sds
+
+  # the mean of each column after centering and scaling
+  imputed_values = means - means if center else means.copy()
+  if scale:
+    with np.errstate(invalid="ignore", divide="ignore"):
+      imputed_values /= sds
+
   # do some mean imputation
-  food_pre_processed = food_pre_processed.fillna(food_pre_processed.mean())
-  
-  return food_pre_processed
\ No newline at end of file
+  values[missing] = np.broadcast_to(imputed_values, values.shape)[missing]
+
+  # add the non-numeric columns back (in their original order)
+  if len(numeric_cols) == len(food_clean.columns):
+    food_pre_processed = pd.DataFrame(values, index=food_clean.index, columns=food_clean.columns)
+  else:
+    numeric_positions = {col: j for j, col in enumerate(numeric_cols)}
+    food_pre_processed = pd.DataFrame(
+      {col: values[:, numeric_positions[col]] if col in numeric_positions else food_clean[col]
+       for col in food_clean.columns},
+      index=food_clean.index, copy=False)
+
+  if return_stats:
+    return food_pre_processed, pd.DataFrame({"mean": means, "sd": sds}, index=pd.Index(numeric_cols))
+  return food_pre_processed
+
+
+
+# whether a column is numeric (including sparse numeric columns, but not booleans)
+def is_numeric_column(x):
+  return pd.api.types.is_numeric_dtype(x.dtype) and not pd.api.types.is_bool_dtype(x.dtype)
@@ -0,0 +1,77 @@
+# Functions for removing duplicate data frames from a list of perturbed datasets
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# compute a content hash of a data frame from its column names, dtypes, index
+# and values (two data frames with the same hash are almost surely equal)
+def hash_data(data):
+    data_hash = hashlib.sha1()
+    data_hash.update(repr(list(data.columns)).encode())
+    data_hash.update(repr(list(data.dtypes)).encode())
+    data_hash.update(pd.util.hash_pandas_object(data.index).to_numpy().tobytes())
+    # hash the values of all columns with the same dtype at once
+    dtypes = data.dtypes
+    for dtype in pd.unique(dtypes):
+        values = data.loc[:, (dtypes == dtype).to_numpy()]
+        if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+            # numeric, boolean and date columns are hashed directly from their bytes
+            data_hash.update(np.ascontiguousarray(values.to_numpy(dtype=dtype)).tobytes())
+        else:
+            # string, categorical and other columns are hashed element-wise by pandas
+            data_hash.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return data_hash.hexdigest()
+
+
+
+# remove duplicate data frames from a list
+# returns:
+#   unique_data: the list of unique data frames (the first occurrence of each)
+#   unique_ids: the positions of the unique data frames in the original list
+#     (e.g., for filtering the perturbation options: perturb_options.iloc[unique_ids])
+#   canonical_ids: for every data frame in the original list, the position of
+#     the first data frame that it is equal to
+def deduplicate_data(data_list):
+    unique_data = []
+    unique_ids = []
+    canonical_ids = []
+
+    # data frames that are the same object (e.g., perturbations that share
+    # all of their preprocessing stages) are duplicates without being compared
+    object_ids = {}
+    # the unique data frames with each set of columns, dtypes and shape (only
+    # these can be equal to a new data frame)
+    schema_ids = {}
+    # content hashes, which are only computed for data frames that share their
+    # schema with more than one unique data frame
+    hashes = {}
+
+    def get_hash(i):
+        if i not in hashes:
+            hashes[i] = hash_data(data_list[i])
+        return hashes[i]
+
+    for i, data in enumerate(data_list):
+        if id(data) in object_ids:
+            canonical_ids.append(object_ids[id(data)])
+            continue
+
+        schema = (tuple(data.columns), tuple(data.dtypes), data.shape)
+        candidate_ids = schema_ids.setdefault(schema, [])
+        matching_ids = candidate_ids
+        if len(candidate_ids) > 1:
+            matching_ids = [j for j in candidate_ids if get_hash(j) == get_hash(i)]
+        # confirm any match so that a hash collision can never merge two datasets
+        canonical_id = next((j for j in matching_ids if data_list[j].equals(data)), None)
+        if canonical_id is None:
+            canonical_id = i
+            candidate_ids.append(i)
+            unique_data.append(data)
+            unique_ids.append(i)
+
+        object_ids[id(data)] = canonical_id
+        canonical_ids.append(canonical_id)
+
+    return unique_data, unique_ids, canonical_ids
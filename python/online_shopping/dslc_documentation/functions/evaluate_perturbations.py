@@ -0,0 +1,78 @@
+# Evaluate the predictions of many models fit to many perturbed datasets at once
+#
+# Rather than computing each metric with one list comprehension per model, the
+# predicted purchase probabilities for a split are stacked into a single
+# (n_models x n_perturbations x n_sessions) array, and each metric is computed
+# for every (model, perturbation) pair with a single NumPy reduction over the
+# last axis (the AUC is computed from the ranks of the predictions, which gives
+# the same value as metrics.roc_auc_score()).
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+
+def stack_predictions(pred_dict):
+    # Stack a dict of predictions, e.g., {'ls': ls_pred, 'rf': rf_pred}, where each
+    # value is a list with the predictions for each perturbation, into a single
+    # (n_models x n_perturbations x n_sessions) array
+    n_obs = {len(pred) for preds in pred_dict.values() for pred in preds}
+    if len(n_obs) > 1:
+        raise ValueError('the predictions must all be for the same sessions, '
+                         'but have lengths %s' % sorted(n_obs))
+    return np.stack([np.stack([np.asarray(pred, dtype=float) for pred in preds])
+                     for preds in pred_dict.values()])
+
+
+def classification_metrics(y, preds, threshold=0.161):
+    # Compute the accuracy, true positive rate, true negative rate and AUC of every
+    # set of predictions, where
+    #   y: the observed (boolean) purchase responses, either an array of length
+    #     n_sessions, or any array that can be broadcast against preds (e.g., a
+    #     (n_perturbations x n_sessions) array with the responses for each
+    #     perturbation)
+    #   preds: a (... x n_sessions) array of predicted purchase probabilities
+    #   threshold: the probability above which a purchase is predicted
+    # Returns a dict of (...) arrays, one for each metric
+    preds = np.asarray(preds, dtype=float)
+    y = np.broadcast_to(np.asarray(y, dtype=bool), preds.shape)
+    pred_binary = preds > threshold
+    n_pos = y.sum(axis=-1)
+    n_neg = y.shape[-1] - n_pos
+    # the AUC is the probability that a random purchase session is ranked above a
+    # random non-purchase session (ties count as 1/2)
+    ranks = rankdata(preds, axis=-1)
+    auc = (np.sum(ranks * y, axis=-1) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+    return {'accuracy': np.mean(pred_binary == y, axis=-1),
+            'tp_rate': np.sum(pred_binary & y, axis=-1) / n_pos,
+            'tn_rate': np.sum(~pred_binary & ~y, axis=-1) / n_neg,
+            'auc': auc}
+
+
+def metrics_frame(metrics, model_names, perturb_options):
+    # Create a tidy data frame with a row for each (model, perturbation) pair,
+    # containing the perturbation options, the model name and each metric (in the
+    # same order as melting a data frame with a column for each model), where
+    # `metrics` is a dict of (n_models x n_perturbations) arrays
+    n_models = len(model_names)
+    n_perturbations = perturb_options.shape[0]
+    results = perturb_options.iloc[np.tile(np.arange(n_perturbations), n_models)] \
+        .reset_index(drop=True)
+    results['model'] = np.repeat(list(model_names), n_perturbations)
+    for metric, values in metrics.items():
+        results[metric] = np.asarray(values).ravel()
+    return results
+
+
+def evaluate_perturbations(pred_dict, y, perturb_options, threshold=0.161):
+    # Evaluate the predictions of each model for each perturbation, where
+    #   pred_dict: a dict of lists of predicted purchase probabilities, e.g.,
+    #     {'ls': ls_pred, 'rf': rf_pred}, where ls_pred[i] are the predictions of
+    #     the LS fit to the ith perturbation
+    #   y: the observed purchase responses (see classification_metrics())
+    #   perturb_options: the perturbation options (one row per perturbation)
+    #   threshold: the probability above which a purchase is predicted
+    # Returns a tidy data frame with the perturbation options, the model, and the
+    # accuracy, tp_rate, tn_rate and auc of each fit
+    preds = stack_predictions(pred_dict)
+    metrics = classification_metrics(y, preds, threshold=threshold)
+    return metrics_frame(metrics, pred_dict.keys(), perturb_options)
@@ -3,10 +3,50 @@ import numpy as np
 
 
 from functions.preprocess_shopping_data import preprocess_shopping_data
+from functions.data_cache import DataCache
+
+
+# the loaded and preprocessed data frames are cached in ../data/cache, so that
+# they are only recomputed when the data files or the preprocessing code change
+shopping_cache = DataCache("../data/cache")
+preprocessing_files = ["functions/prepare_shopping_data.py", "functions/preprocess_shopping_data.py"]
+
+
+# preprocess the training data (with and without dummy variables), and then the
+# validation and test data using the columns and levels of the training data
+def preprocess_train_val_test(shopping_train, shopping_val, shopping_test):
+    shopping_train_preprocessed_nodummy = preprocess_shopping_data(shopping_train, dummy=False)
+    shopping_train_preprocessed = preprocess_shopping_data(shopping_train)
+    shopping_train_levels = get_train_levels(shopping_train_preprocessed_nodummy)
+    shopping_val_preprocessed = preprocess_shopping_data(
+        shopping_val,
+        column_selection=list(shopping_train_preprocessed.columns),
+        **shopping_train_levels
+    )
+    shopping_test_preprocessed = preprocess_shopping_data(
+        shopping_test,
+        column_selection=list(shopping_train_preprocessed.columns),
+        remove_extreme=True,
+        **shopping_train_levels
+    )
+    return [shopping_train_preprocessed_nodummy, shopping_train_preprocessed,
+            shopping_val_preprocessed, shopping_test_preprocessed]
+
+
+# the levels of the categorical variables in the training set, which are used
+# to lump the levels of the validation and test sets (and of any new data,
+# e.g., using preprocess_shopping_data_chunks())
+def get_train_levels(shopping_train_preprocessed_nodummy):
+    return dict(
+        operating_systems_levels=shopping_train_preprocessed_nodummy['operating_systems'].unique(),
+        browser_levels=shopping_train_preprocessed_nodummy['browser'].unique(),
+        traffic_type_levels=shopping_train_preprocessed_nodummy['traffic_type'].unique()
+    )
 
 
 ## load in the original data
-shopping_orig = pd.read_csv('../data/online_shoppers_intention.csv')
+shopping_orig = shopping_cache.cached(pd.read_csv, '../data/online_shoppers_intention.csv',
+                                      files=['../data/online_shoppers_intention.csv'])
 
 
 ## The following code would define the training, validation, and test set equivalent to what was done in R:
@@ -28,29 +68,16 @@ shopping_orig = pd.read_csv('../data/online_shoppers_intention.csv')
 ## Since we want to use the same training, validation, test set that was used in the book, we will 
 ## instead load the versions of the training, validation, and test sets that were computed in R
 ## so that our results match the book as closely as possible
-shopping_train = pd.read_csv("../data/train_val_test/shopping_train.csv")
-shopping_val = pd.read_csv("../data/train_val_test/shopping_val.csv")
-shopping_test = pd.read_csv("../data/train_val_test/shopping_test.csv")
-
-# clean the original data
-shopping_train_preprocessed_nodummy = preprocess_shopping_data(shopping_train, dummy=False)
-shopping_train_preprocessed = preprocess_shopping_data(shopping_train)
-
-# create preprocessed validation set
-shopping_val_preprocessed = preprocess_shopping_data(
-    shopping_val,
-    column_selection=list(shopping_train_preprocessed.columns),
-    operating_systems_levels=shopping_train_preprocessed_nodummy['operating_systems'].unique(),
-    browser_levels=shopping_train_preprocessed_nodummy['browser'].unique(),
-    traffic_type_levels=shopping_train_preprocessed_nodummy['traffic_type'].unique()
-)
-
-# create preprocessed test set
-shopping_test_preprocessed = preprocess_shopping_data(
-    shopping_test,
-    column_selection=list(shopping_train_preprocessed.columns),
-    operating_systems_levels=shopping_train_preprocessed_nodummy['operating_systems'].unique(),
-    browser_levels=shopping_train_preprocessed_nodummy['browser'].unique(),
-    traffic_type_levels=shopping_train_preprocessed_nodummy['traffic_type'].unique(),
-    remove_extreme=True
-)
\ No newline at end of file
+shopping_train = shopping_cache.cached(pd.read_csv, "../data/train_val_test/shopping_train.csv",
+                                       files=["../data/train_val_test/shopping_train.csv"])
+shopping_val = shopping_cache.cached(pd.read_csv, "../data/train_val_test/shopping_val.csv",
+                                     files=["../data/train_val_test/shopping_val.csv"])
+shopping_test = shopping_cache.cached(pd.read_csv, "../data/train_val_test/shopping_test.csv",
+                                      files=["../data/train_val_test/shopping_test.csv"])
+
+# clean the original data, and create the preprocessed validation and test sets
+shopping_train_preprocessed_nodummy, shopping_train_preprocessed, \
+    shopping_val_preprocessed, shopping_test_preprocessed = \
+    shopping_cache.cached(preprocess_train_val_test, shopping_train, shopping_val, shopping_test,
+                          files=preprocessing_files)
+shopping_train_levels = get_train_levels(shopping_train_preprocessed_nodummy)
@@ -1,6 +1,27 @@
 import pandas as pd
 import numpy as np
 
+from functions.stage_trace import record_stages
+
+
+# replace the values of a categorical series that are not in `levels` with "Other"
+# (if `levels` is not provided, the levels that occur at least `min_count` times
+# are kept). The levels are counted once, and the replacement is a single
+# vectorized lookup rather than a lookup per row.
+def lump_rare_levels(values, levels=None, min_count=50):
+    if levels is None:
+        level_counts = values.value_counts()
+        levels = level_counts.index[level_counts >= min_count]
+    return values.where(values.isin(levels), "Other")
+
+
+# get the minimum level count for a column from a single number or a dict of numbers
+def get_min_level_count(min_level_count, col):
+    if isinstance(min_level_count, dict):
+        return min_level_count.get(col, 50)
+    return min_level_count
+
+
 def preprocess_shopping_data(shopping_data,
                             replace_negative_na=True,
                             numeric_to_cat=True,
@@ -15,7 +36,27 @@ def preprocess_shopping_data(shopping_data,
                             operating_systems_levels=None,
                             browser_levels=None,
                             traffic_type_levels=None,
-                            column_selection=None):
+                            column_selection=None,
+                            min_level_count=50):
+    # min_level_count: the minimum number of occurrences for a level of
+    #   operating_systems, browser or traffic_type to not be lumped into "Other"
+    #   (ignored for columns whose levels are provided). Either a single number
+    #   or a dict with a number for each column, e.g., {"browser": 100}.
+
+    # record the time and memory of each stage (only inside trace_stages(), see
+    # stage_trace.py)
+    stages = record_stages("preprocess_shopping_data", shopping_data,
+                           replace_negative_na=replace_negative_na,
+                           numeric_to_cat=numeric_to_cat,
+                           remove_missing=remove_missing,
+                           impute_missing=impute_missing,
+                           durations_to_minutes=durations_to_minutes,
+                           visitor_binary=visitor_binary,
+                           dummy=dummy,
+                           month_numeric=month_numeric,
+                           log_page=log_page,
+                           remove_extreme=remove_extreme,
+                           column_selection=column_selection is not None)
     
     shopping = shopping_data.copy()
 
@@ -40,65 +81,70 @@ def preprocess_shopping_data(shopping_data,
     
     # convert weekend to numeric
     shopping['Weekend'] = shopping['Weekend'].astype(int)
+    stages.mark("rename", shopping)
     
     # replace negative duration values with NA
     if replace_negative_na:
         shopping[["Administrative_Duration", "Informational_Duration", "Product_Related_Duration"]] = shopping[["Administrative_Duration", "Informational_Duration", "Product_Related_Duration"]].apply(lambda x: x.where(x >= 0))
+        stages.mark("replace_negative_na", shopping)
     
     # convert operating systems, browser, traffic type and region numeric features to categorical 
     if numeric_to_cat:
         shopping[["Operating_Systems", "Browser", "Traffic_Type", "Region"]] = shopping[["Operating_Systems", "Browser", "Traffic_Type", "Region"]].astype(str)
+        stages.mark("numeric_to_cat", shopping)
     
     # convert durations to minutes
     if durations_to_minutes:
         shopping[["Administrative_Duration", "Informational_Duration", "Product_Related_Duration"]] = shopping[["Administrative_Duration", "Informational_Duration", "Product_Related_Duration"]].apply(lambda x: x/60)
+        stages.mark("durations_to_minutes", shopping)
     
     # convert visitor type to binary numeric (ignoring "other")
     if visitor_binary:
         shopping['Visitor_Type'] = shopping['Visitor_Type'].map({'Returning_Visitor': 1, 'New_Visitor': 0, 'Other': 0})
+        stages.mark("visitor_binary", shopping)
     
     # remove rows with missing values or impute them with 0
     if remove_missing:
         shopping = shopping.dropna()
     elif impute_missing:
         shopping = shopping.fillna(0)
+    stages.mark("missing_values", shopping)
         
     # combine rare levels of categorical variables
-    # match to the provided levels (for validation and test sets)
-    # operating systems:
-    if operating_systems_levels is not None:
-        shopping['Operating_Systems'] = shopping['Operating_Systems'].apply(lambda x: x if x in operating_systems_levels else "Other")
-    else:
-        # just lump any levels with fewer than 50 occurences into "Other"
-        shopping['Operating_Systems'] = shopping['Operating_Systems'].apply(lambda x: x if shopping['Operating_Systems'].value_counts()[x] >= 50 else "Other")
-    # traffic type:
-    if traffic_type_levels is not None:
-        shopping['Traffic_Type'] = shopping['Traffic_Type'].apply(lambda x: x if x in traffic_type_levels else "Other")
-    else:
-        shopping['Traffic_Type'] = shopping['Traffic_Type'].apply(lambda x: x if shopping['Traffic_Type'].value_counts()[x] >= 50 else "Other")
-    # browser:
-    if browser_levels is not None:
-        shopping['Browser'] = shopping['Browser'].apply(lambda x: x if x in browser_levels else "Other")
-    else:
-        shopping['Browser'] = shopping['Browser'].apply(lambda x: x if shopping['Browser'].value_counts()[x] >= 50 else "Other")
+    # match to the provided levels (for validation and test sets), or
+    # just lump any levels with fewer than min_level_count occurences into "Other"
+    shopping['Operating_Systems'] = lump_rare_levels(shopping['Operating_Systems'],
+                                                     levels=operating_systems_levels,
+                                                     min_count=get_min_level_count(min_level_count, 'operating_systems'))
+    shopping['Traffic_Type'] = lump_rare_levels(shopping['Traffic_Type'],
+                                                levels=traffic_type_levels,
+                                                min_count=get_min_level_count(min_level_count, 'traffic_type'))
+    shopping['Browser'] = lump_rare_levels(shopping['Browser'],
+                                           levels=browser_levels,
+                                           min_count=get_min_level_count(min_level_count, 'browser'))
+    stages.mark("lump_rare_levels", shopping)
     
     # convert month to numeric
     if month_numeric:
         shopping['Month'] = shopping['Month'].map({'Feb': 2, 'Mar': 3, 'May': 5, 'June': 6, 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12})
+        stages.mark("month_numeric", shopping)
     
     # create dummy variables for categorical features
     if dummy:
         shopping = pd.get_dummies(shopping, drop_first=True)
+        stages.mark("dummy", shopping)
     
     # remove extreme product-related duration observations
     if remove_extreme:
         shopping = shopping[(shopping['Product_Related_Duration'] < 400) & (shopping['Product_Related_Duration'] <= 720 * 60)]
+        stages.mark("remove_extreme", shopping)
         
     # convert boolean variables to integer variables
     bool_columns = shopping.columns[shopping.dtypes == bool]
     # do not convert purchase to integer
     bool_columns = bool_columns[bool_columns != 'purchase']
     shopping[bool_columns] = shopping[bool_columns].astype(int)    
+    stages.mark("bool_to_int", shopping)
         
     # log-transform predictors
     if log_page:
@@ -107,6 +153,7 @@ def preprocess_shopping_data(shopping_data,
             shopping[['Administrative', 'Informational', 'Product_Related', 'Administrative_Duration', 'Informational_Duration', 'Product_Related_Duration']] = np.log(shopping[['Administrative', 'Informational', 'Product_Related', 'Administrative_Duration', 'Informational_Duration', 'Product_Related_Duration']] + 1)
             shopping[['Exit_Rates']] = np.log(shopping[['Exit_Rates']] + 0.0001)
             shopping[['Bounce_Rates']] = np.log(shopping[['Bounce_Rates']] + 0.00001)
+            stages.mark("log_page", shopping)
     
     # clean column names
     shopping.columns = shopping.columns.str.replace(' ', '_').str.lower()
@@ -125,5 +172,6 @@ def preprocess_shopping_data(shopping_data,
         shopping = shopping[column_selection]
         
     shopping = shopping.reset_index(drop=True)
+    stages.mark("tidy_columns", shopping)
     
-    return shopping
+    return stages.finish(shopping)
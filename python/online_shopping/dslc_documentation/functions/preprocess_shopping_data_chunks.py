@@ -0,0 +1,95 @@
+import pandas as pd
+
+from functions.preprocess_shopping_data import preprocess_shopping_data
+
+
+# the column types of the online_shoppers_intention.csv data, which are
+# specified when reading each chunk so that they don't depend on which values
+# happen to appear in the chunk (the page counts are floats since they can be
+# missing, e.g., in the training, validation and test sets)
+shopping_dtypes = {'Administrative': 'float64',
+                   'Administrative_Duration': 'float64',
+                   'Informational': 'float64',
+                   'Informational_Duration': 'float64',
+                   'ProductRelated': 'float64',
+                   'ProductRelated_Duration': 'float64',
+                   'BounceRates': 'float64',
+                   'ExitRates': 'float64',
+                   'PageValues': 'float64',
+                   'SpecialDay': 'float64',
+                   'Month': 'object',
+                   'OperatingSystems': 'int64',
+                   'Browser': 'int64',
+                   'Region': 'int64',
+                   'TrafficType': 'int64',
+                   'VisitorType': 'object',
+                   'Weekend': 'bool',
+                   'Revenue': 'bool'}
+
+
+def preprocess_shopping_data_chunks(shopping_file,
+                                    column_selection,
+                                    operating_systems_levels,
+                                    browser_levels,
+                                    traffic_type_levels,
+                                    chunksize=100000,
+                                    output_file=None,
+                                    dummy=True,
+                                    dtype=shopping_dtypes,
+                                    **kwargs):
+    # Preprocess a (possibly larger than memory) online_shoppers_intention.csv-shaped
+    # file in chunks of `chunksize` rows, using the levels and columns learned from
+    # the preprocessed training data (as for the validation and test sets in
+    # prepare_shopping_data.py). The column types of the file are given by `dtype`,
+    # and the other preprocessing arguments (`kwargs`) are passed on to
+    # preprocess_shopping_data().
+    #
+    # Returns a generator of the preprocessed chunks, whose columns are exactly
+    # `column_selection`. Concatenating the chunks gives the same data frame as
+    # preprocessing the whole file at once. If `output_file` is provided, the
+    # chunks are instead written to this csv file as they are computed (so that
+    # only one chunk is in memory at a time), and nothing is returned.
+    #
+    # Note that pd.get_dummies() can't be applied to each chunk separately with
+    # drop_first=True, since the first level of a chunk isn't necessarily the
+    # first level of the training data (and a chunk may not contain every level).
+    # Instead, a dummy variable is created for every level in the chunk, and the
+    # dummy variables that aren't in `column_selection` are dropped (dummy
+    # variables for levels that aren't in the chunk are filled with 0).
+    chunks = pd.read_csv(shopping_file, dtype=dtype, chunksize=chunksize)
+    shopping_chunks = preprocess_chunks(chunks, column_selection, operating_systems_levels,
+                                        browser_levels, traffic_type_levels, dummy, **kwargs)
+    if output_file is None:
+        return shopping_chunks
+    else:
+        for i, shopping_chunk in enumerate(shopping_chunks):
+            shopping_chunk.to_csv(output_file, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+
+
+def preprocess_chunks(chunks,
+                      column_selection,
+                      operating_systems_levels,
+                      browser_levels,
+                      traffic_type_levels,
+                      dummy,
+                      **kwargs):
+    # the index of the next row (so that the index continues across chunks)
+    n_rows = 0
+    for chunk in chunks:
+        shopping = preprocess_shopping_data(chunk,
+                                            dummy=False,
+                                            operating_systems_levels=operating_systems_levels,
+                                            browser_levels=browser_levels,
+                                            traffic_type_levels=traffic_type_levels,
+                                            **kwargs)
+        if dummy:
+            shopping = pd.get_dummies(shopping)
+            shopping.columns = shopping.columns.str.replace(' ', '_').str.lower()
+            # convert boolean variables to integer variables (except purchase)
+            bool_columns = shopping.columns[(shopping.dtypes == bool) & (shopping.columns != 'purchase')]
+            shopping[bool_columns] = shopping[bool_columns].astype(int)
+
+        shopping = shopping.reindex(columns=column_selection, fill_value=0)
+        shopping.index = pd.RangeIndex(n_rows, n_rows + len(shopping))
+        n_rows += len(shopping)
+        yield shopping
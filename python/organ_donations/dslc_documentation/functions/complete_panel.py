@@ -0,0 +1,106 @@
+# Complete a panel dataset so that it has a row for every entity and period
+#
+# complete_panel(data, entity="country", period="year") returns the same data
+# frame as
+#
+#   combinations = pd.MultiIndex.from_product([data[col].unique() for col in ["country", "year"]],
+#                                             names=["country", "year"])
+#   pd.DataFrame(index=combinations).reset_index().merge(data, on=["country", "year"], how="left")
+#
+# (with a row for every country-year combination, in order of appearance, and
+# missing values in the rows that were added), but rather than building a data
+# frame of every combination and merging the data onto it, the position of each
+# row in the (entity, period) grid is computed from integer codes, and each
+# column is taken directly into the grid.
+#
+# The entity and the period can each be one or several columns, e.g.,
+# entity=["country", "source"] and period="month" for monthly data from several
+# registry feeds, and `periods` can be used to give the full set of periods
+# (e.g., every month in a range, including those that don't appear in the data).
+# The `entity_vars` (e.g., "region") are constant within each entity, and their
+# missing values (including in the rows that were added) are filled from a
+# lookup table of the first observed value for each entity.
+import numpy as np
+import pandas as pd
+
+
+# integer codes for the (combinations of) values of one or several columns, in
+# order of appearance, and a data frame of the unique (combinations of) values
+def factorize_columns(data, cols):
+  col_codes = []
+  for col in cols:
+    codes, _ = pd.factorize(data[col], use_na_sentinel=False)
+    col_codes.append(codes)
+  if len(cols) == 1:
+    codes = col_codes[0]
+  else:
+    codes, _ = pd.factorize(np.ravel_multi_index(col_codes, [codes.max(initial=0) + 1 for codes in col_codes]))
+  # the first row with each code
+  first_rows = np.full(codes.max(initial=-1) + 1, len(codes))
+  np.minimum.at(first_rows, codes, np.arange(len(codes)))
+  return codes, data[cols].iloc[first_rows].reset_index(drop=True)
+
+
+
+# the values of a column at the rows in indexer, with missing values for -1
+# (integer columns become float columns if there are any)
+def take_rows(values, indexer):
+  array = values.to_numpy() if isinstance(values.dtype, np.dtype) else values.array
+  return pd.api.extensions.take(array, indexer, allow_fill=True)
+
+
+
+def complete_panel(data, entity="country", period="year", entity_vars=[], periods=None):
+  entity_cols = [entity] if isinstance(entity, str) else list(entity)
+  period_cols = [period] if isinstance(period, str) else list(period)
+  key_cols = entity_cols + period_cols
+
+  entity_codes, entities = factorize_columns(data, entity_cols)
+  if periods is None:
+    period_codes, periods = factorize_columns(data, period_cols)
+  else:
+    periods = pd.DataFrame(periods, columns=period_cols) if not isinstance(periods, pd.DataFrame) \
+      else periods[period_cols].reset_index(drop=True)
+    period_index = pd.MultiIndex.from_frame(periods) if len(period_cols) > 1 else pd.Index(periods[period_cols[0]])
+    data_periods = pd.MultiIndex.from_frame(data[period_cols]) if len(period_cols) > 1 else pd.Index(data[period_cols[0]])
+    period_codes = period_index.get_indexer(data_periods)
+    if (period_codes < 0).any():
+      raise ValueError("The data has periods that aren't in `periods`")
+  n_entities, n_periods = len(entities.index), len(periods.index)
+
+  # the position of each row in the grid (rows with the same entity and period
+  # are kept in their original order, as in merge())
+  grid_positions = entity_codes.astype(np.int64) * n_periods + period_codes
+  order = np.argsort(grid_positions, kind="stable")
+  rows_per_position = np.maximum(np.bincount(grid_positions, minlength=n_entities * n_periods), 1)
+  # the row of the data for each row of the completed panel (-1 for added rows)
+  indexer = np.full(rows_per_position.sum(), -1, dtype=np.int64)
+  panel_starts = np.cumsum(rows_per_position) - rows_per_position
+  is_first = np.ones(len(order), dtype=bool)
+  is_first[1:] = grid_positions[order][1:] != grid_positions[order][:-1]
+  # the rank of each row within its grid position
+  rank = np.arange(len(order)) - np.maximum.accumulate(np.where(is_first, np.arange(len(order)), 0))
+  indexer[panel_starts[grid_positions[order]] + rank] = order
+  panel_positions = np.repeat(np.arange(n_entities * n_periods), rows_per_position)
+
+  columns = {}
+  for col in entity_cols:
+    columns[col] = entities[col].array.take(panel_positions // n_periods)
+  for col in period_cols:
+    columns[col] = periods[col].array.take(panel_positions % n_periods)
+  for col in data.columns:
+    if col not in key_cols:
+      columns[col] = take_rows(data[col], indexer)
+  panel = pd.DataFrame(columns)
+
+  # fill the entity variables from the first observed value of each entity
+  panel_entity_codes = panel_positions // n_periods
+  for col in entity_vars:
+    observed = data[col].notna().to_numpy()
+    observed_rows = np.flatnonzero(observed)
+    first_rows = np.full(n_entities, len(data.index))
+    np.minimum.at(first_rows, entity_codes[observed_rows], observed_rows)
+    lookup = take_rows(data[col], np.where(first_rows < len(data.index), first_rows, -1))
+    missing = (indexer < 0) | ~observed[indexer]
+    panel.loc[missing, col] = lookup[panel_entity_codes[missing]]
+  return panel
@@ -1,25 +1,101 @@
+import numpy as np
+import pandas as pd
+
+impute_method_options = ["previous", "average", "linear", "median"]
+
+
 def impute_feature(data, feature, group, impute_method="average"):
+    # impute the missing values of a single feature (see impute_features())
+    imputed = impute_features(data, [feature], group, impute_method=impute_method)
+    return imputed[feature].rename("feature_imputed")
+
+
+def impute_features(data, features, group, impute_method="average"):
+    # Impute the missing values of several features at once within each group
+    # (e.g., each country), where the rows of each group are in order (e.g., by
+    # year). Returns a data frame with an imputed column for each feature.
+    #   "previous": the previous observed value in the group
+    #   "average": the average of the previous and next observed values in the
+    #     group (or whichever of these exists)
+    #   "linear": linear interpolation between the previous and next observed
+    #     values in the group (by position), or whichever of these exists
+    #   "median": the median of the observed values in the group
+    # Any values that still can't be imputed (e.g., a group with no observed
+    # values) are imputed with 0.
+    #
+    # Rather than filling a copy of the data frame with groupby().ffill() and
+    # bfill() for each feature, the features are extracted as one float array, and
+    # the rows are sorted by group (keeping their order within each group) so that
+    # the position of the previous and next observed value of every entry can be
+    # found with a running maximum/minimum that is reset at each group boundary.
     impute_method = impute_method.lower()
-    
-    if impute_method == "previous":
-        data = (data.assign(feature_imputed=data[feature]) # create a new variable called feature_imputed that is equal to feature
-                    .groupby(group) # group by 
-                    .fillna(method='ffill') # impute using forward fill
-                    .fillna(0)) # impute remaining missing values with 0
-        return data["feature_imputed"]
-    elif impute_method == "average":
-        # create two temporary variables each equal to feature
-        data = data.assign(imputed_feature_tmp_prev=data[feature], imputed_feature_tmp_next=data[feature])
-        # fill the first variable using forward fill
-        data["imputed_feature_tmp_prev"] = data.groupby(group)["imputed_feature_tmp_prev"].fillna(method='ffill')
-        # fill the second variable using backward fill
-        data["imputed_feature_tmp_next"] = data.groupby(group)["imputed_feature_tmp_next"].fillna(method='bfill')
-        # then define feature_imputed column to be the mean of the forward and backward filled values
-        data['feature_imputed'] = data[['imputed_feature_tmp_next', 'imputed_feature_tmp_prev']].mean(axis=1, skipna=True)
-        # impute any remaining missing values with 0
-        data['feature_imputed'].fillna(0, inplace=True)
-        # remove the two temporary variables
-        data = data.drop(columns=['imputed_feature_tmp_prev', 'imputed_feature_tmp_next'])
-        return data["feature_imputed"]
+    if impute_method not in impute_method_options:
+        raise ValueError("Invalid impute_method. Expected one of: %s" % impute_method_options)
+
+    # the group of each row (rows with a missing group are each their own group)
+    codes = data.groupby(group, sort=False).ngroup().to_numpy()
+    ungrouped = codes < 0
+    codes[ungrouped] = codes.max(initial=-1) + 1 + np.arange(ungrouped.sum())
+    # the rows of each group (in their original order), one group after another
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    n_rows = len(order)
+    is_start = np.ones(n_rows, dtype=bool)
+    is_start[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    group_starts = np.flatnonzero(is_start)
+    group_ends = np.append(group_starts[1:], n_rows) - 1
+    group_sizes = group_ends - group_starts + 1
+    # the first and last (sorted) position of the group of each row
+    row_starts = np.repeat(group_starts, group_sizes)[:, np.newaxis]
+    row_ends = np.repeat(group_ends, group_sizes)[:, np.newaxis]
+
+    values = data[features].to_numpy(dtype=float)[order]
+    observed = ~np.isnan(values)
+    positions = np.arange(n_rows)[:, np.newaxis]
+
+    if impute_method == "median":
+        imputed = values.copy()
+        for j in range(values.shape[1]):
+            medians = group_medians(values[:, j], sorted_codes, group_starts, group_sizes)
+            imputed[~observed[:, j], j] = np.repeat(medians, group_sizes)[~observed[:, j]]
     else:
-        raise ValueError
\ No newline at end of file
+        # the position of the previous observed value in the same group (or -1)
+        previous = np.maximum.accumulate(np.where(observed, positions, -1), axis=0)
+        previous[previous < row_starts] = -1
+        previous_values = np.where(previous >= 0, np.take_along_axis(values, np.maximum(previous, 0), axis=0), np.nan)
+        if impute_method == "previous":
+            imputed = previous_values
+        else:
+            # the position of the next observed value in the same group (or n_rows)
+            following = np.minimum.accumulate(np.where(observed, positions, n_rows)[::-1], axis=0)[::-1]
+            following[following > row_ends] = n_rows
+            next_values = np.where(following < n_rows,
+                                   np.take_along_axis(values, np.minimum(following, n_rows - 1), axis=0), np.nan)
+            if impute_method == "average":
+                weight = 0.5
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    weight = (positions - previous) / (following - previous)
+            imputed = np.where(np.isnan(previous_values), next_values,
+                               np.where(np.isnan(next_values), previous_values,
+                                        (1 - weight) * previous_values + weight * next_values))
+            imputed[observed] = values[observed]
+
+    imputed[np.isnan(imputed)] = 0
+    # put the rows back in their original order
+    result = np.empty_like(imputed)
+    result[order] = imputed
+    return pd.DataFrame(result, index=data.index, columns=features)
+
+
+def group_medians(values, sorted_codes, group_starts, group_sizes):
+    # the median of the observed values of each group (NaN if there are none),
+    # where the rows are sorted by group
+    observed = ~np.isnan(values)
+    # sort the values within each group (with the missing values last)
+    order = np.lexsort((values, sorted_codes))
+    n_observed = np.add.reduceat(observed.astype(np.intp), group_starts) if len(group_starts) > 0 else np.zeros(0, dtype=int)
+    sorted_values = values[order]
+    lower = sorted_values[group_starts + np.maximum(n_observed - 1, 0) // 2]
+    upper = sorted_values[group_starts + np.minimum(n_observed // 2, group_sizes - 1)]
+    return np.where(n_observed > 0, (lower + upper) / 2, np.nan)
@@ -1,11 +1,20 @@
 import pandas as pd
-from functions.impute_feature import impute_feature
+from functions.complete_panel import complete_panel
+from functions.impute_feature import impute_features, impute_method_options
+from functions.stage_trace import record_stages
 
 
 def prepare_organ_data(organs_original,
                        impute_method = "average",
-                       per_mil_vars = True): 
+                       per_mil_vars = True,
+                       impute_vars = ["population", "total_deceased_donors"]): 
   
+  # record the time and memory of each stage (only inside trace_stages(), see
+  # stage_trace.py)
+  stages = record_stages("prepare_organ_data", organs_original,
+                         impute_method = impute_method,
+                         per_mil_vars = per_mil_vars,
+                         impute_vars = list(impute_vars))
   
   # define a cleaned version of the original organs data
   # rename the original rows
@@ -34,34 +43,36 @@ def prepare_organ_data(organs_original,
     'Pancreas Tx': 'total_pancreas_tx',
     'Kidney Pancreas Tx': 'total_kidney_pancreas_tx',
     'Small Bowel Tx': 'total_small_bowel_tx'}).copy()
+  stages.mark("rename", organs_clean)
 
-  # add the rows with missing country-year combinations
-  country_year_combinations = pd.MultiIndex.from_product([organs_clean[col].unique() for col in ["country", "year"]], 
-                                                         names=["country", "year"])
-  # put these combinations into a data frame
-  country_year_combinations_df = pd.DataFrame(index=country_year_combinations).reset_index()
-  organs_clean = country_year_combinations_df.merge(organs_clean, on=["country", "year"], how="left")
-
-  # For newly added rows, fill region with the unique values from the pre-existing rows  
-  organs_clean["region"] = organs_clean.groupby("country")["region"].transform(lambda x: x.ffill().bfill())
+  # add the rows with missing country-year combinations, and for the newly added
+  # rows, fill region with the value from the pre-existing rows of the country
+  # complete_panel() is a custom function defined in complete_panel.py
+  organs_clean = complete_panel(organs_clean,
+                                entity = "country",
+                                period = "year",
+                                entity_vars = ["region"])
+  stages.mark("complete_panel", organs_clean)
 
   # multiply the population variable by 1 million
   organs_clean["population"] = organs_clean["population"] * 1000000
+  stages.mark("population", organs_clean)
   
   # add imputed features using the specified imputation method
-  # impute_feature() is a custom function defined in imputeFeature.R
-  # Note that we are only imputing the total_deceased_donors variable and the 
-  # population variable (missing values were introduced when we 
-  # "completed" the data). You could impute more variables if you wanted to.
-  if impute_method in ["average", "previous"]:
-    organs_clean["population_imputed"] = impute_feature(organs_clean, 
-                                                        feature = "population",
-                                                        group = "country",
-                                                        impute_method = impute_method)
-    organs_clean["total_deceased_donors_imputed"] = impute_feature(organs_clean, 
-                                                                  feature = "total_deceased_donors",
-                                                                  group = "country",
-                                                                  impute_method = impute_method)
+  # impute_features() is a custom function defined in impute_feature.py, which
+  # imputes all of the `impute_vars` at once
+  # Note that by default we are only imputing the total_deceased_donors variable
+  # and the population variable (missing values were introduced when we
+  # "completed" the data). You could impute more variables if you wanted to
+  # (e.g., all of the transplant count variables).
+  if impute_method in impute_method_options:
+    organs_imputed = impute_features(organs_clean,
+                                     features = impute_vars,
+                                     group = "country",
+                                     impute_method = impute_method)
+    for var in impute_vars:
+      organs_clean[var + "_imputed"] = organs_imputed[var]
+    stages.mark("impute_features", organs_clean)
   
   
   # rearrange the columns 
@@ -69,6 +80,7 @@ def prepare_organ_data(organs_original,
                                'total_deceased_donors', 'total_deceased_donors_imputed'] + list(organs_clean.columns)
   column_order = pd.unique(column_order)
   organs_clean = organs_clean.reindex(columns=column_order)
+  stages.mark("reorder_columns", organs_clean)
   
-  return organs_clean
+  return stages.finish(organs_clean)
 
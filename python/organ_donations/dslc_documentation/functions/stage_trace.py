@@ -0,0 +1,211 @@
+# Opt-in timing and memory instrumentation for the stages of a function
+#
+# The preprocessing functions (e.g., preprocess_ames_data()) mark the end of
+# each of their stages with a StageRecorder:
+#
+#   stages = record_stages("preprocess_ames_data", ames_data_clean, **options)
+#   ames_data_preprocessed = remove_missing_columns(...)
+#   stages.mark("remove_missing_columns", ames_data_preprocessed)
+#   ...
+#   return stages.finish(ames_data_preprocessed)
+#
+# Nothing is recorded unless the function is called inside trace_stages():
+#
+#   with trace_stages() as trace:
+#     preprocess_ames_data(ames_train_clean, convert_categorical="dummy")
+#   trace.to_frame()
+#   trace.to_chrome_trace("preprocess_trace.json")
+#
+# For each stage (the code between two marks) and for the whole call, the trace
+# records the wall time, the number of rows and columns of the data before and
+# after, and (if trace_memory is True) the peak memory allocated by Python
+# during the stage above the memory allocated at its start, and the net memory
+# allocated by the stage (both measured with tracemalloc, which slows down the
+# code while it is tracing). When no trace is active, record_stages() returns a
+# recorder whose mark() and finish() do nothing, so the overhead is a few
+# function calls per stage.
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# the active trace (None if the stages aren't being traced)
+current_trace = None
+
+
+# the (rows, columns) of a data frame (or array), or (None, None)
+def data_shape(data):
+  shape = getattr(data, "shape", None)
+  if shape is None:
+    return None, None
+  return shape[0], shape[1] if len(shape) > 1 else None
+
+
+
+class StageTrace:
+
+  def __init__(self, trace_memory=True):
+    # trace_memory: whether to measure the memory allocated by each stage
+    self.trace_memory = trace_memory
+    self.records = []
+    self.n_calls = 0
+    self.active_recorders = []
+    self.start_time = time.perf_counter()
+
+
+  # the memory currently allocated, after updating the peak memory of every
+  # active recorder and resetting the peak (so that the peaks of nested
+  # recorders are all correct)
+  def reset_peak(self):
+    if not self.trace_memory:
+      return 0
+    current, peak = tracemalloc.get_traced_memory()
+    for recorder in self.active_recorders:
+      recorder.stage_peak = max(recorder.stage_peak, peak)
+      recorder.call_peak = max(recorder.call_peak, peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+  # a data frame with a row for each stage of each call (and a row for each
+  # whole call, whose stage is "total"), including the options of each call
+  def to_frame(self):
+    records = [{**{key: value for key, value in record.items() if key != "options"},
+                **record["options"]}
+               for record in self.records]
+    return pd.DataFrame(records)
+
+
+  # the records as JSON (written to path, if given)
+  def to_json(self, path=None):
+    trace_json = json.dumps(self.records, indent=1, default=str)
+    if path is not None:
+      with open(path, "w") as f:
+        f.write(trace_json)
+    return trace_json
+
+
+  # the records in the Chrome trace event format (written to path, if given),
+  # which can be viewed in chrome://tracing or https://ui.perfetto.dev. The
+  # stages of each call are nested inside the call.
+  def to_chrome_trace(self, path=None):
+    events = []
+    for record in self.records:
+      args = {key: value for key, value in record.items()
+              if key not in ["function", "stage", "start_s", "time_s", "options"]}
+      args.update(record["options"])
+      events.append({"name": record["function"] if record["stage"] == "total" else record["stage"],
+                     "cat": record["function"],
+                     "ph": "X",
+                     "ts": record["start_s"] * 1e6,
+                     "dur": record["time_s"] * 1e6,
+                     "pid": 0,
+                     "tid": record["depth"],
+                     "args": args})
+    chrome_trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+    if path is not None:
+      with open(path, "w") as f:
+        json.dump(chrome_trace, f, default=str)
+    return chrome_trace
+
+
+
+class StageRecorder:
+
+  def __init__(self, trace, function, data, options):
+    self.trace = trace
+    self.function = function
+    self.options = options
+    trace.n_calls += 1
+    self.call = trace.n_calls
+    self.depth = len(trace.active_recorders)
+    self.call_start = self.stage_start = time.perf_counter()
+    self.call_shape = self.stage_shape = data_shape(data)
+    self.call_memory = self.stage_memory = trace.reset_peak()
+    self.call_peak = self.stage_peak = self.call_memory
+    trace.active_recorders.append(self)
+
+
+  def record(self, stage, start, shape_in, data, memory_start, peak, depth):
+    now = time.perf_counter()
+    memory = self.trace.reset_peak()
+    peak = max(peak, self.stage_peak if stage != "total" else self.call_peak)
+    rows_out, columns_out = data_shape(data)
+    self.trace.records.append({"function": self.function,
+                               "call": self.call,
+                               "stage": stage,
+                               "depth": depth,
+                               "start_s": start - self.trace.start_time,
+                               "time_s": now - start,
+                               "rows_in": shape_in[0],
+                               "columns_in": shape_in[1],
+                               "rows_out": rows_out,
+                               "columns_out": columns_out,
+                               "peak_bytes": peak - memory_start if self.trace.trace_memory else None,
+                               "allocated_bytes": memory - memory_start if self.trace.trace_memory else None,
+                               "options": self.options})
+    return now, memory
+
+
+  # record the stage that ends here (since the previous mark), given the data
+  # after the stage
+  def mark(self, stage, data=None):
+    now, memory = self.record(stage, self.stage_start, self.stage_shape, data,
+                              self.stage_memory, self.stage_peak, self.depth + 1)
+    self.stage_start = now
+    self.stage_shape = data_shape(data)
+    self.stage_memory = self.stage_peak = memory
+    return data
+
+
+  # record the whole call, given the data that it returns (which is returned)
+  def finish(self, data=None):
+    self.record("total", self.call_start, self.call_shape, data,
+                self.call_memory, self.call_peak, self.depth)
+    self.trace.active_recorders.remove(self)
+    return data
+
+
+
+class NullStageRecorder:
+
+  def mark(self, stage, data=None):
+    return data
+
+
+  def finish(self, data=None):
+    return data
+
+
+null_recorder = NullStageRecorder()
+
+
+# a recorder for a call of `function` whose input is `data` (the options are
+# recorded with each stage, e.g., the judgment calls of the call), which does
+# nothing unless the call is inside trace_stages()
+def record_stages(function, data=None, **options):
+  if current_trace is None:
+    return null_recorder
+  return StageRecorder(current_trace, function, data, options)
+
+
+
+# trace the stages of the instrumented functions that are called inside the
+# with block, yielding a StageTrace with the records (several calls, e.g., one
+# for each perturbation, can be traced at once)
+@contextmanager
+def trace_stages(trace_memory=True):
+  global current_trace
+  previous_trace = current_trace
+  started_tracing = trace_memory and not tracemalloc.is_tracing()
+  if started_tracing:
+    tracemalloc.start()
+  current_trace = StageTrace(trace_memory=trace_memory)
+  try:
+    yield current_trace
+  finally:
+    current_trace = previous_trace
+    if started_tracing:
+      tracemalloc.stop()